@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging as log
+import os
+import time
+import zipfile
+
+from config import SNAPSHOT_DIR, SNAPSHOT_KEEP
+from sync_state import (
+    diff_lessons,
+    headers_to_group_pathways,
+    headers_to_tables,
+    tables_to_headers,
+)
+from timetable import Timetable
+
+
+class SnapshotArchive:
+    """
+    Versioned, compressed snapshots of parsed headers and timetables.
+
+    Every snapshot is a zip file with `meta.json`, `headers.json` (rows of
+    `headers_to_tables`) and one member per group, so a single group is read
+    without loading the rest.
+    `meta.json` maps group names to members and keeps their SHA-256,
+    snapshots are compared by these hashes without reading the lessons.
+    Professor timetables of the teachers page are kept the same way
+    under `teachers/`.
+    """
+
+    META = "meta.json"
+    HEADERS = "headers.json"
+
+    def __init__(self, directory=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def snapshots(self) -> list[str]:
+        """Snapshot paths from the oldest to the newest."""
+        if not os.path.isdir(self.directory):
+            return []
+        return [
+            os.path.join(self.directory, filename)
+            for filename in sorted(os.listdir(self.directory))
+            if filename.startswith("snapshot_") and filename.endswith(".zip")
+        ]
+
+    def latest(self):
+        snapshots = self.snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def resolve(self, snapshot: str) -> str:
+        """Accepts a path, a file name in the archive or "latest"."""
+        if snapshot == "latest":
+            snapshot = self.latest()
+            if snapshot is None:
+                raise FileNotFoundError(f"No snapshots in {self.directory}")
+        elif not os.path.exists(snapshot):
+            snapshot = os.path.join(self.directory, snapshot)
+        return snapshot
+
+    @staticmethod
+    def member_name(index: int, kind="groups") -> str:
+        return f"{kind}/{index:05}.json"
+
+    def save(
+        self,
+        timetables: list[Timetable],
+        headers: dict[str, dict[str, dict]],
+        page_fingerprint: str = None,
+        teachers: list[Timetable] = None,
+    ) -> str:
+        """
+        Groups listed in headers but not parsed in this run (unchanged tables)
+        are copied from the latest snapshot, so are professor timetables
+        if `teachers` is None.
+
+        Returns:
+            str: path of the new snapshot.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self.latest()
+        parsed = {timetable.group: timetable for timetable in timetables}
+        group_names = list(headers_to_group_pathways(headers))
+        group_names += [group for group in parsed if group not in group_names]
+
+        meta = {
+            "created": time.time(),
+            "page_fingerprint": page_fingerprint,
+            "groups": {},
+            "missing": [],
+            "teachers": {},
+        }
+        tmp_path = os.path.join(self.directory, "snapshot.zip.tmp")
+
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            previous_archive = zipfile.ZipFile(previous) if previous else None
+            previous_groups = (
+                json.loads(previous_archive.read(self.META))["groups"]
+                if previous_archive
+                else {}
+            )
+
+            for index, group in enumerate(group_names):
+                member = self.member_name(index)
+                if group in parsed:
+                    data = json.dumps(
+                        parsed[group].store.records(), ensure_ascii=False
+                    ).encode()
+                elif group in previous_groups:
+                    data = previous_archive.read(previous_groups[group]["member"])
+                else:
+                    meta["missing"].append(group)
+                    continue
+
+                archive.writestr(member, data)
+                meta["groups"][group] = {
+                    "member": member,
+                    "sha256": hashlib.sha256(data).hexdigest(),
+                }
+
+            if teachers is not None:
+                for index, timetable in enumerate(teachers):
+                    member = self.member_name(index, "teachers")
+                    data = json.dumps(
+                        timetable.store.records(), ensure_ascii=False
+                    ).encode()
+                    archive.writestr(member, data)
+                    meta["teachers"][timetable.group] = {
+                        "member": member,
+                        "sha256": hashlib.sha256(data).hexdigest(),
+                    }
+            elif previous_archive:
+                previous_meta = json.loads(previous_archive.read(self.META))
+                for professor, teacher_meta in previous_meta.get(
+                    "teachers", {}
+                ).items():
+                    archive.writestr(
+                        teacher_meta["member"],
+                        previous_archive.read(teacher_meta["member"]),
+                    )
+                    meta["teachers"][professor] = teacher_meta
+
+            if previous_archive:
+                previous_archive.close()
+
+            # JSON keys are strings, a None degree would come back as "null"
+            headers_data = json.dumps(headers_to_tables(headers), ensure_ascii=False)
+            version = hashlib.sha256(headers_data.encode())
+            for group, group_meta in meta["groups"].items():
+                version.update(f"{group}:{group_meta['sha256']}".encode())
+            meta["version"] = version.hexdigest()
+
+            archive.writestr(self.HEADERS, headers_data)
+            archive.writestr(self.META, json.dumps(meta, ensure_ascii=False))
+
+        created = time.strftime("%Y%m%dT%H%M%S", time.gmtime(meta["created"]))
+        created += f"{int(meta['created'] % 1 * 1e6):06}"
+        path = os.path.join(
+            self.directory, f"snapshot_{created}_{meta['version'][:12]}.zip"
+        )
+        os.replace(tmp_path, path)
+
+        if meta["missing"]:
+            log.warning(f"{len(meta['missing'])} groups are missing in snapshot {path}")
+        log.info(f"Snapshot saved to {path}")
+        self.prune()
+
+        return path
+
+    def load_meta(self, snapshot: str) -> dict:
+        with zipfile.ZipFile(self.resolve(snapshot)) as archive:
+            return json.loads(archive.read(self.META))
+
+    def load_group(self, snapshot: str, group: str) -> Timetable:
+        with zipfile.ZipFile(self.resolve(snapshot)) as archive:
+            member = json.loads(archive.read(self.META))["groups"][group]["member"]
+            return Timetable.from_dict({group: json.loads(archive.read(member))})
+
+    def load_teacher(self, snapshot: str, professor: str) -> Timetable:
+        with zipfile.ZipFile(self.resolve(snapshot)) as archive:
+            teachers = json.loads(archive.read(self.META)).get("teachers", {})
+            member = teachers[professor]["member"]
+            return Timetable.from_dict({professor: json.loads(archive.read(member))})
+
+    def load(self, snapshot: str) -> tuple[list[Timetable], dict]:
+        with zipfile.ZipFile(self.resolve(snapshot)) as archive:
+            meta = json.loads(archive.read(self.META))
+            headers = json.loads(archive.read(self.HEADERS))
+            # snapshots of older versions keep nested headers
+            if isinstance(headers, list):
+                headers = tables_to_headers(headers)
+            timetables = [
+                Timetable.from_dict(
+                    {group: json.loads(archive.read(group_meta["member"]))}
+                )
+                for group, group_meta in meta["groups"].items()
+            ]
+
+        return timetables, headers
+
+    def diff(self, old_snapshot: str, new_snapshot: str) -> dict:
+        """Compares groups by hashes, lessons are read only for changed groups."""
+        with zipfile.ZipFile(
+            self.resolve(old_snapshot)
+        ) as old_archive, zipfile.ZipFile(self.resolve(new_snapshot)) as new_archive:
+            old_groups = json.loads(old_archive.read(self.META))["groups"]
+            new_groups = json.loads(new_archive.read(self.META))["groups"]
+
+            changed = {}
+            for group, group_meta in new_groups.items():
+                old_group_meta = old_groups.get(group)
+                if (
+                    old_group_meta is None
+                    or old_group_meta["sha256"] == group_meta["sha256"]
+                ):
+                    continue
+
+                old_lessons = json.loads(old_archive.read(old_group_meta["member"]))
+                new_lessons = json.loads(new_archive.read(group_meta["member"]))
+                change = diff_lessons(
+                    [{"id": i, **lesson} for i, lesson in enumerate(old_lessons)],
+                    new_lessons,
+                )
+                changed[group] = {
+                    "created": len(change["create"]),
+                    "updated": len(change["update"]),
+                    "deleted": len(change["delete"]),
+                }
+
+        return {
+            "added": [group for group in new_groups if group not in old_groups],
+            "removed": [group for group in old_groups if group not in new_groups],
+            "changed": changed,
+        }
+
+    def prune(self, keep: int = None) -> list[str]:
+        """Removes the oldest snapshots, `keep` <= 0 keeps everything."""
+        keep = self.keep if keep is None else keep
+        snapshots = self.snapshots()
+        if keep <= 0 or len(snapshots) <= keep:
+            return []
+
+        removed = snapshots[:-keep]
+        for snapshot in removed:
+            os.remove(snapshot)
+        log.info(f"{len(removed)} old snapshots removed.")
+
+        return removed
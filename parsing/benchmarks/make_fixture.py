@@ -0,0 +1,130 @@
+"""
+Generates a synthetic groups page with the same structure as the real one.
+
+Usage: python make_fixture.py 2000 > fixtures/groups_2000.html
+"""
+
+import argparse
+import random
+import sys
+
+SUBJECTS = [
+    "Mathematics (MAT101)",
+    "Physics (PHY110)",
+    "Programming (CS120)",
+    "History (HIS201)",
+    "English (ENG105)",
+    "Databases (CS230)",
+]
+LESSON_TYPES = ["Lecture", "Practice", "Laboratory"]
+PROFESSORS = ["J. Smith", "ნ. ბერიძე", "А. Иванов", "M. Jones", "გ. კაპანაძე"]
+CLASSROOMS = ["I-101", "II-205", "VI-412", "III-003"]
+PATHWAYS = [
+    "Bachelor's Program - Informatics",
+    "ბაკალავრი პროგრამა - ინფორმატიკა",
+    "Магистр Программа - Информатика",
+    "Doctoral Studies",
+]
+
+
+def make_cell(rng: random.Random, group: str) -> str:
+    kind = rng.random()
+
+    # several subgroups in one cell are published as a nested table
+    if kind < 0.15:
+        lessons = [
+            (
+                rng.choice(SUBJECTS) + rng.choice(LESSON_TYPES),
+                rng.choice(PROFESSORS),
+                rng.choice(CLASSROOMS),
+            )
+            for _ in range(2)
+        ]
+        rows = "".join(
+            "<tr>" + "".join(f"<td>{lesson[i]}</td>" for lesson in lessons) + "</tr>"
+            for i in range(3)
+        )
+        return f"<table>{rows}</table>"
+
+    parts = []
+    if kind < 0.35:
+        parts.append(f"{group}.{rng.randint(1, 3)}-{rng.randint(1, 2)}")
+    parts.append(rng.choice(SUBJECTS) + " " + rng.choice(LESSON_TYPES))
+    parts.append(rng.choice(PROFESSORS))
+    parts.append(rng.choice(CLASSROOMS))
+
+    return "<br/>".join(parts)
+
+
+def make_table(rng: random.Random, table_id: str, group: str) -> str:
+    html = [
+        f'<table id="{table_id}" border="1">\n'
+        f'<thead><tr><th colspan="7">{group}</th></tr></thead>\n<tbody>\n'
+    ]
+    occupied = {}
+
+    for hour in range(9, 17):
+        html.append(f"<tr><th>{hour - 8}-{hour:02}:00</th>")
+        for day in range(6):
+            if occupied.get(day, 0) > 0:
+                occupied[day] -= 1
+                html.append("<!-- span -->")
+                continue
+
+            value = rng.random()
+            if value < 0.45:
+                html.append("<td>---</td>")
+            elif value < 0.55:
+                html.append("<td></td>")
+            else:
+                rowspan = rng.choice([1, 1, 2]) if hour < 16 else 1
+                attrs = ""
+                if rowspan > 1:
+                    attrs = f' rowspan="{rowspan}"'
+                    occupied[day] = rowspan - 1
+                html.append(f"<td{attrs}>{make_cell(rng, group)}</td>")
+        html.append("</tr>\n")
+
+    html.append("</tbody>\n</table>\n")
+    return "".join(html)
+
+
+def make_page(groups_amount: int, seed=0, first_number=101) -> str:
+    rng = random.Random(seed)
+    groups = []
+    header = ["<ul>\n"]
+    per_pathway = max(1, groups_amount // len(PATHWAYS))
+
+    for i, pathway in enumerate(PATHWAYS):
+        if i < len(PATHWAYS) - 1:
+            amount = per_pathway
+        else:
+            amount = groups_amount - per_pathway * (len(PATHWAYS) - 1)
+
+        header.append(f"<li>{pathway}\n<ul>\n")
+        for _ in range(amount):
+            number = first_number + len(groups)
+            group = f"{number}{chr(65 + i)}"
+            table_id = f"{number}{i}_DETAILED"
+            groups.append((table_id, group))
+            header.append(f'<li><a href="#{table_id}"> {group} </a></li>\n')
+        header.append("</ul>\n</li>\n")
+    header.append("</ul>\n")
+
+    tables = "".join(
+        make_table(rng, table_id, group) + "<br/>\n" for table_id, group in groups
+    )
+
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Groups</title></head>\n'
+        "<body>\n" + "".join(header) + tables + "</body></html>\n"
+    )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("groups", type=int)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    sys.stdout.write(make_page(args.groups, args.seed))
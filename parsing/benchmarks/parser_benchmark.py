@@ -0,0 +1,311 @@
+"""
+Measures time and peak memory of every parser stage on recorded HTML fixtures.
+
+Usage:
+    python parser_benchmark.py --save-baseline     # record baseline.json
+    python parser_benchmark.py --threshold 0.25    # fail on a >25% regression
+
+The committed baseline.json was recorded with the default arguments. Every
+run also times a fixed calibration workload, baseline timings are scaled by
+the ratio of the calibration times before they are compared, so the check
+works on machines faster or slower than the one which recorded it.
+
+The synthetic scaled-up page (--scale groups) is generated with make_fixture.py.
+Peak memory per stage is measured with tracemalloc, which does not see C
+allocations of lxml trees, so peak RSS of every stage is reported as well.
+Tables are released from the soup as they are processed, like in the parser.
+"""
+
+import argparse
+import json
+import logging as log
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+for name, value in {
+    "USER_AGENT": "",
+    "ACCEPT": "",
+    "TAG_STRONG_GROUPS": "",
+    "TAG_STRONG_TEACHERS": "",
+    "TAG_STRONG_INFORMATICS": "",
+    "URL_LEQTORI": "",
+    "URL_REST": "",
+    "MAX_CONNECTIONS": "10",
+    "FORCE_TO_COLLECT": "true",
+    "N_FIRST_TABLES_TO_COLLECT": "-1",
+}.items():
+    os.environ.setdefault(name, value)
+
+from make_fixture import make_page
+from metrics import peak_rss, reset_peak_rss
+from parser import SCRAPERS
+
+# differences below these values are considered noise
+MIN_DELTA = {"seconds": 0.005, "peak_memory": 256 * 1024, "peak_rss": 1024 * 1024}
+
+# pure Python work similar to parsing: string building, dicts and random
+CALIBRATION_GROUPS = 500
+CALIBRATION_REPEAT = 5
+
+STAGES = [
+    "soup_build",
+    "headers_processing",
+    "collect_soup_timetables",
+    "timetables_processing",
+    "combine_common_lessons",
+    "serialization",
+]
+
+
+def run_stages(scraper_class, page_text: str, measure):
+    """Runs the parser stage by stage, `measure(stage, func)` returns func()."""
+    scraper = scraper_class(workers=1)
+
+    soup = measure("soup_build", lambda: scraper.make_soup(page_text))
+    scraper.timetable_page_soup = soup
+    scraper.headers = measure(
+        "headers_processing", lambda: scraper.headers_processing(soup)
+    )
+
+    timetables_id_name = scraper.headers_to_timetables_dict()
+    soup_timetables = measure(
+        "collect_soup_timetables",
+        lambda: scraper.collect_soup_timetables(next(iter(timetables_id_name))),
+    )
+    timetables = measure(
+        "timetables_processing",
+        lambda: process_tables(scraper, soup_timetables, timetables_id_name),
+    )
+    scraper.release_soup()
+    measure(
+        "combine_common_lessons",
+        lambda: [timetable.combine_common_lessons() for timetable in timetables],
+    )
+    measure(
+        "serialization",
+        lambda: json.dumps(
+            [timetable.to_dict() for timetable in timetables], ensure_ascii=False
+        ),
+    )
+
+    return timetables
+
+
+def process_tables(scraper, soup_timetables: dict, table_ids) -> list:
+    timetables = []
+
+    for table_id in table_ids:
+        table = soup_timetables.pop(table_id)
+        timetables.append(scraper.row_collecting(table))
+        scraper.release_table(table)
+
+    return timetables
+
+
+def benchmark_stages(scraper_class, page_text: str, repeat: int) -> dict:
+    seconds = {stage: float("inf") for stage in STAGES}
+    peak_memory = {}
+    rss = {stage: 0 for stage in STAGES}
+
+    def measure_time(stage, func):
+        reset_peak_rss()
+        start_time = time.perf_counter()
+        result = func()
+        seconds[stage] = min(seconds[stage], time.perf_counter() - start_time)
+        rss[stage] = max(rss[stage], peak_rss())
+        return result
+
+    def measure_memory(stage, func):
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peak_memory[stage] = tracemalloc.get_traced_memory()[1] - start_memory
+        return result
+
+    for _ in range(repeat):
+        timetables = run_stages(scraper_class, page_text, measure_time)
+
+    # tracemalloc slows the code down, so memory is measured in a separate run
+    tracemalloc.start()
+    run_stages(scraper_class, page_text, measure_memory)
+    tracemalloc.stop()
+
+    return {
+        "tables": len(timetables),
+        "lessons": sum(len(timetable) for timetable in timetables),
+        "seconds": seconds,
+        "peak_memory": peak_memory,
+        "peak_rss": rss,
+    }
+
+
+def benchmark_total(scraper_class, file_path: str, repeat: int) -> dict:
+    seconds = float("inf")
+    rss = 0
+
+    for _ in range(repeat):
+        reset_peak_rss()
+        start_time = time.perf_counter()
+        timetables, _ = scraper_class(workers=1).get_timetables_from_file(file_path)
+        seconds = min(seconds, time.perf_counter() - start_time)
+        rss = max(rss, peak_rss())
+
+    tracemalloc.start()
+    scraper_class(workers=1).get_timetables_from_file(file_path)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "tables": len(timetables),
+        "lessons": sum(len(timetable) for timetable in timetables),
+        "seconds": {"total": seconds},
+        "peak_memory": {"total": peak_memory},
+        "peak_rss": {"total": rss},
+    }
+
+
+def calibrate() -> float:
+    """Returns the best time of the calibration workload on this machine."""
+    seconds = float("inf")
+
+    for seed in range(CALIBRATION_REPEAT):
+        start_time = time.perf_counter()
+        make_page(CALIBRATION_GROUPS, seed)
+        seconds = min(seconds, time.perf_counter() - start_time)
+
+    return seconds
+
+
+def get_fixtures(scale: int) -> dict[str, str]:
+    fixtures = {
+        file_name: os.path.join(FIXTURES_DIR, file_name)
+        for file_name in sorted(os.listdir(FIXTURES_DIR))
+        if file_name.endswith(".html")
+    }
+
+    if scale:
+        file_path = os.path.join(FIXTURES_DIR, f"synthetic_{scale}.html.tmp")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(make_page(scale))
+        fixtures[f"synthetic_{scale}"] = file_path
+
+    return fixtures
+
+
+def run_benchmarks(engines: list[str], scale: int, repeat: int) -> dict:
+    results = {}
+
+    for fixture, file_path in get_fixtures(scale).items():
+        with open(file_path, "r", encoding="utf-8") as f:
+            page_text = f.read()
+
+        for engine in engines:
+            scraper_class = SCRAPERS[engine]
+            if engine == "lxml-stream":
+                result = benchmark_total(scraper_class, file_path, repeat)
+            else:
+                result = benchmark_stages(scraper_class, page_text, repeat)
+
+            results[f"{fixture}/{engine}"] = result
+            print_result(f"{fixture}/{engine}", result)
+
+        if file_path.endswith(".tmp"):
+            os.remove(file_path)
+
+    return results
+
+
+def print_result(name: str, result: dict):
+    print(f"{name}: {result['tables']} tables, {result['lessons']} lessons")
+    for stage, seconds in result["seconds"].items():
+        peak_memory = result["peak_memory"][stage] / 1024 / 1024
+        rss = result["peak_rss"][stage] / 1024 / 1024
+        print(
+            f"    {stage:>24}: {seconds * 1000:10.2f} ms {peak_memory:10.2f} MB"
+            f" {rss:10.2f} MB RSS"
+        )
+
+
+def find_regressions(
+    results: dict, baseline: dict, threshold: float, speed_ratio=1.0
+) -> list[str]:
+    """`speed_ratio` - how much slower this machine is than the baseline one."""
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name} is not in the baseline, it's not checked.")
+            continue
+        for metric in ("seconds", "peak_memory", "peak_rss"):
+            for stage, value in result[metric].items():
+                base_value = baseline[name].get(metric, {}).get(stage)
+                if base_value is None:
+                    continue
+                if metric == "seconds":
+                    base_value *= speed_ratio
+                if value - base_value < MIN_DELTA[metric]:
+                    continue
+                if value > base_value * (1 + threshold):
+                    regressions.append(
+                        f"{name} {stage} {metric}: {value:.4g} > {base_value:.4g}"
+                    )
+
+    return regressions
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--engines", nargs="+", default=list(SCRAPERS), choices=list(SCRAPERS)
+    )
+    arg_parser.add_argument(
+        "--scale", type=int, default=1000, help="groups in synthetic page, 0 - skip"
+    )
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--threshold", type=float, default=0.25)
+    arg_parser.add_argument("--baseline", default=BASELINE_FILE)
+    arg_parser.add_argument("--save-baseline", action="store_true")
+    args = arg_parser.parse_args()
+
+    log.basicConfig(level=log.ERROR, format="%(asctime)s: %(levelname)s: %(message)s")
+    calibration = calibrate()
+    print(f"Calibration: {calibration * 1000:.2f} ms")
+    results = run_benchmarks(args.engines, args.scale, args.repeat)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Peak RSS: {max_rss:.1f} MB")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"calibration": calibration, "results": results}, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    else:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(
+                f"Baseline {args.baseline} not found, record it with --save-baseline."
+            )
+            sys.exit(1)
+        if "calibration" not in baseline:
+            print(f"Baseline {args.baseline} has no calibration, record it again.")
+            sys.exit(1)
+
+        speed_ratio = calibration / baseline["calibration"]
+        print(f"This machine is {speed_ratio:.2f}x as slow as the baseline one.")
+        regressions = find_regressions(
+            results, baseline["results"], args.threshold, speed_ratio
+        )
+        if regressions:
+            print("Regressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print("No regressions.")
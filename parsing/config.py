@@ -0,0 +1,82 @@
+import os
+
+# Get environment variables
+USER_AGENT = os.environ["USER_AGENT"]
+ACCEPT = os.environ["ACCEPT"]
+MY_HEADERS = {"User-Agent": USER_AGENT, "Accept": ACCEPT}
+TAG_STRONG_GROUPS = os.environ["TAG_STRONG_GROUPS"]
+TAG_STRONG_TEACHERS = os.environ["TAG_STRONG_TEACHERS"]
+TAG_STRONG_INFORMATICS = os.environ["TAG_STRONG_INFORMATICS"]
+URL_LEQTORI = os.environ["URL_LEQTORI"]
+URL_REST = os.environ["URL_REST"]
+MAX_CONNECTIONS = int(os.environ["MAX_CONNECTIONS"])
+FORCE_TO_COLLECT = os.environ["FORCE_TO_COLLECT"]
+# "diff" - send only changed lessons and parse only changed tables,
+# "full" - recreate the timetable and parse and send everything on every run
+SYNC_MODE = os.environ.get("SYNC_MODE", "full")
+SYNC_STATE_FILE = os.environ.get("SYNC_STATE_FILE", "sync_state.json")
+# full uploads are journaled, "true" - continue an interrupted upload (same as --resume)
+UPLOAD_JOURNAL_FILE = os.environ.get("UPLOAD_JOURNAL_FILE", "upload_journal.sqlite3")
+UPLOAD_RESUME = os.environ.get("UPLOAD_RESUME", "false")
+# "true" - parse the TAG_STRONG_TEACHERS page into per-professor timetables
+COLLECT_TEACHERS = os.environ.get("COLLECT_TEACHERS", "true")
+# "true" - also crawl every other <strong> link of the leqtori index
+CRAWL_ALL_PAGES = os.environ.get("CRAWL_ALL_PAGES", "true")
+CRAWL_MAX_CONNECTIONS = int(os.environ.get("CRAWL_MAX_CONNECTIONS", 16))
+CRAWL_PER_HOST_CONNECTIONS = int(os.environ.get("CRAWL_PER_HOST_CONNECTIONS", 4))
+CRAWL_TIMEOUT = float(os.environ.get("CRAWL_TIMEOUT", 120))
+# downloaded PDFs and their extracted tables, keyed by content hash
+PDF_DIR = os.environ.get("PDF_DIR", "pdfs")
+# parallel tabula extractions of page ranges of one PDF
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 4))
+# every parsed version is archived, empty SNAPSHOT_DIR disables it, 0 keeps all
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", 30))
+# "true" - upload timetables of the groups page while the page is parsed,
+# such an upload can be resumed only if it's interrupted after parsing
+UPLOAD_PIPELINE = os.environ.get("UPLOAD_PIPELINE", "false")
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 16))
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 8))
+BULK_UPLOAD = os.environ.get("BULK_UPLOAD", "false")
+BULK_FORMAT = os.environ.get("BULK_FORMAT", "json")
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+BULK_RETRIES = int(os.environ.get("BULK_RETRIES", 3))
+# MAX_CONNECTIONS is the initial upload concurrency, it's adapted within these bounds
+UPLOAD_MIN_CONNECTIONS = int(os.environ.get("UPLOAD_MIN_CONNECTIONS", 1))
+UPLOAD_MAX_CONNECTIONS = int(os.environ.get("UPLOAD_MAX_CONNECTIONS", 64))
+UPLOAD_LATENCY_TOLERANCE = float(os.environ.get("UPLOAD_LATENCY_TOLERANCE", 3))
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", 3))
+UPLOAD_TIMEOUT = float(os.environ.get("UPLOAD_TIMEOUT", 60))
+UPLOAD_CONNECT_TIMEOUT = float(os.environ.get("UPLOAD_CONNECT_TIMEOUT", 10))
+UPLOAD_KEEPALIVE = float(os.environ.get("UPLOAD_KEEPALIVE", 30))
+# 1 - parse tables serially, 0 - use all CPUs
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", 1))
+# "bs4", "lxml" or "lxml-stream"
+PARSER_ENGINE = os.environ.get("PARSER_ENGINE", "bs4")
+
+FETCH_METADATA_FILE = os.environ.get("FETCH_METADATA_FILE", "fetch_metadata.json")
+TABLE_FINGERPRINTS_FILE = os.environ.get(
+    "TABLE_FINGERPRINTS_FILE", "table_fingerprints.json"
+)
+# empty METRICS_FILE disables export, format is "prometheus" or "json"
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.prom")
+METRICS_FORMAT = os.environ.get("METRICS_FORMAT", "prometheus")
+# daemon mode: runs every UPDATE_INTERVAL +- UPDATE_JITTER seconds and on trigger
+DAEMON = os.environ.get("DAEMON", "false")
+UPDATE_INTERVAL = float(os.environ.get("UPDATE_INTERVAL", 12 * 60 * 60))
+UPDATE_JITTER = float(os.environ.get("UPDATE_JITTER", 5 * 60))
+TRIGGER_HOST = os.environ.get("TRIGGER_HOST", "127.0.0.1")
+TRIGGER_PORT = int(os.environ.get("TRIGGER_PORT", 8090))
+# if set, the trigger endpoint listens on this unix socket instead of TCP
+TRIGGER_SOCKET = os.environ.get("TRIGGER_SOCKET", "")
+
+# requests decodes brotli only if one of these packages is installed
+try:
+    import brotli  # noqa: F401
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+# For debug
+N_FIRST_TABLES_TO_COLLECT = int(os.environ["N_FIRST_TABLES_TO_COLLECT"])
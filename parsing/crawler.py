@@ -0,0 +1,303 @@
+import asyncio
+import logging as log
+import os
+import time
+
+from config import (
+    COLLECT_TEACHERS,
+    CRAWL_ALL_PAGES,
+    N_FIRST_TABLES_TO_COLLECT,
+    PDF_DIR,
+    TAG_STRONG_GROUPS,
+    TAG_STRONG_TEACHERS,
+    URL_LEQTORI,
+)
+from fetcher import count_fetched_bytes, write_file
+from metrics import metrics
+from pipeline import TimetableChannel
+from sync_state import headers_to_group_pathways
+from timetable import Timetable
+
+
+class Crawler:
+    """
+    Crawls every timetable page linked from the leqtori index in one run.
+
+    Pages are downloaded concurrently by `AsyncFetcher`, each page is parsed
+    in a thread as soon as it arrives (streaming engine: while it arrives),
+    so the loop is never blocked. The groups page is required, other pages
+    are optional: their failures are logged and don't fail the run.
+
+    Groups of the other pages are merged into the groups page data, their
+    table ids are prefixed with the page url in headers and fingerprints.
+    Tables of a failed page are taken from the previous sync state, so diff
+    sync keeps its groups instead of removing them.
+
+    With `conditional` pages are requested with the validators of the last
+    upload, a page answered 304 (or with the same hash) is not parsed, its
+    tables are taken from the sync state as those of a failed page.
+
+    Scrapers and the previous fingerprints come from the parser `context`.
+    """
+
+    def __init__(self, context, conditional=False):
+        self.context = context
+        self.fetcher = context.fetcher
+        # unchanged pages can be skipped only if their tables are in the sync state
+        self.conditional = conditional and context.sync_state is not None
+        self.titles = {}
+        self.scrapers = {}
+        self.failed_pages = set()
+        self.unchanged_pages = set()
+
+    def discover(self, leqtori) -> dict[str, str]:
+        """Maps urls of timetable pages to their kind, the groups page first."""
+        links = leqtori.get_strong_links()
+        if TAG_STRONG_GROUPS not in links:
+            raise ValueError(f"Link '{TAG_STRONG_GROUPS}' not found on {URL_LEQTORI}")
+
+        pages = {links.pop(TAG_STRONG_GROUPS): "groups"}
+        teachers_url = links.pop(TAG_STRONG_TEACHERS, None)
+        if COLLECT_TEACHERS == "true":
+            if teachers_url is None:
+                log.warning(f"Link '{TAG_STRONG_TEACHERS}' not found on {URL_LEQTORI}")
+            else:
+                pages.setdefault(teachers_url, "teachers")
+
+        if CRAWL_ALL_PAGES == "true":
+            for title, url in links.items():
+                pages.setdefault(url, "pdf" if ".pdf" in url else "faculty")
+        # PDFs don't list pathways, their groups are put under the link title
+        self.titles = {url: title for title, url in links.items()}
+
+        return pages
+
+    @staticmethod
+    def prefix(url: str, kind: str) -> str:
+        return "" if kind == "groups" else f"{url}#"
+
+    def previous_fingerprints(self, url: str, kind: str) -> dict[str, str]:
+        fingerprints = self.context.fingerprints
+        if fingerprints is None or kind == "teachers":
+            return None
+        if kind == "groups":
+            return {key: value for key, value in fingerprints.items() if "#" not in key}
+
+        prefix = self.prefix(url, kind)
+        return {
+            key[len(prefix) :]: value
+            for key, value in fingerprints.items()
+            if key.startswith(prefix)
+        }
+
+    async def crawl_pdf(self, url: str):
+        """Unchanged PDFs are neither downloaded nor extracted again."""
+        scraper = self.context.pdf_scraper_class(self.titles.get(url))
+        self.scrapers[url] = scraper
+        data, digest = await self.fetcher.fetch_bytes(url)
+
+        filename = os.path.join(PDF_DIR, f"{digest}.pdf")
+        if data is None and scraper.load_cached_rows(digest) is None:
+            data, digest = await self.fetcher.fetch_bytes(url, conditional=False)
+            filename = os.path.join(PDF_DIR, f"{digest}.pdf")
+        if data is not None:
+            os.makedirs(PDF_DIR, exist_ok=True)
+            await asyncio.to_thread(write_file, filename, data)
+
+        return await asyncio.to_thread(
+            scraper.get_timetables_from_pdf,
+            filename,
+            data,
+            N_FIRST_TABLES_TO_COLLECT,
+            digest,
+        )
+
+    async def crawl_page(self, url: str, kind: str, channel: TimetableChannel = None):
+        """Returns None if the page has not changed."""
+        if kind == "pdf":
+            return await self.crawl_pdf(url)
+        if kind == "teachers":
+            scraper_class = self.context.teacher_scraper_class
+            tables_to_collect = -1
+        else:
+            scraper_class = self.context.scraper_class
+            tables_to_collect = N_FIRST_TABLES_TO_COLLECT
+        scraper = scraper_class(
+            fetcher=self.fetcher,
+            previous_fingerprints=self.previous_fingerprints(url, kind),
+        )
+        scraper.channel = channel
+        self.scrapers[url] = scraper
+        loop = asyncio.get_running_loop()
+
+        if not hasattr(scraper, "get_timetables_from_chunks"):
+            log.info(f"Download data from {url}")
+            page = await self.fetcher.fetch(url, conditional=self.conditional)
+            if self.conditional and not page.changed:
+                return None
+            return await loop.run_in_executor(
+                None, scraper.get_timetables_from_page, page, tables_to_collect
+            )
+
+        log.info(f"Download and process data from {url}")
+        start_time = time.perf_counter()
+        async with self.fetcher.stream(url, self.conditional) as response:
+            if response.status == 304:
+                return None
+
+            def read_chunks():
+                # the parsing thread pulls chunks from the loop one by one
+                while True:
+                    chunk = asyncio.run_coroutine_threadsafe(
+                        response.content.read(scraper.CHUNK_SIZE), loop
+                    ).result()
+                    if not chunk:
+                        return
+                    yield chunk
+
+            result = await loop.run_in_executor(
+                None,
+                scraper.get_timetables_from_chunks,
+                count_fetched_bytes(read_chunks(), url),
+                tables_to_collect,
+            )
+        metrics.set("parser_fetch_seconds", time.perf_counter() - start_time, url=url)
+
+        return result
+
+    async def crawl_groups_page(self, url: str, channel: TimetableChannel):
+        try:
+            return await self.crawl_page(url, "groups", channel)
+        finally:
+            await channel.close()
+
+    async def crawl(
+        self, leqtori, channel: TimetableChannel = None
+    ) -> tuple[list[Timetable], dict[str, dict[str, dict]], list[Timetable]]:
+        """
+        Args:
+            channel: gets headers and timetables of the groups page as soon
+                as they are parsed, it's closed when the page is done.
+
+        Returns:
+            tuple: timetables and headers of all group pages, professor
+            timetables (None if the teachers page wasn't parsed).
+        """
+        self.pages = self.discover(leqtori)
+        log.info(f"Crawling {len(self.pages)} pages: {', '.join(self.pages)}")
+        results = await asyncio.gather(
+            *(
+                (
+                    self.crawl_groups_page(url, channel)
+                    if kind == "groups" and channel is not None
+                    else self.crawl_page(url, kind)
+                )
+                for url, kind in self.pages.items()
+            ),
+            return_exceptions=True,
+        )
+
+        timetables, headers, teachers = [], {}, None
+        for (url, kind), result in zip(self.pages.items(), results):
+            if isinstance(result, BaseException):
+                if kind == "groups":
+                    raise result
+                self.failed_pages.add(url)
+                metrics.inc("parser_crawl_pages_total", kind=kind, result="failed")
+                log.error(f"Page {url} wasn't parsed: {result!r}")
+                continue
+
+            if result is None:
+                self.unchanged_pages.add(url)
+                metrics.inc("parser_crawl_pages_total", kind=kind, result="unchanged")
+                log.info(f"Page {url} has not changed, its tables are not parsed.")
+                continue
+
+            metrics.inc("parser_crawl_pages_total", kind=kind, result="parsed")
+            page_timetables, page_headers = result
+            if kind == "teachers":
+                teachers = page_timetables
+            else:
+                self.merge(
+                    timetables, headers, page_timetables, page_headers, url, kind
+                )
+        self.carry_failed_pages(headers)
+
+        return timetables, headers, teachers
+
+    def carry_failed_pages(self, headers: dict[str, dict[str, dict]]):
+        """Adds groups of failed and unchanged pages listed by the previous sync state."""
+        state = self.context.sync_state
+        prefixes = {
+            self.prefix(url, kind)
+            for url, kind in self.pages.items()
+            if kind != "teachers"
+            and (url in self.failed_pages or url in self.unchanged_pages)
+        }
+        if state is None or not prefixes:
+            return
+
+        known_groups = set(headers_to_group_pathways(headers))
+        carried = 0
+        for degree_title, pathway_title, table_id, group_name in state["tables"]:
+            # tables of the groups page have no prefix
+            page_url, separator, _ = table_id.rpartition("#")
+            prefix = page_url + separator
+            if prefix in prefixes and group_name not in known_groups:
+                degree = headers.setdefault(degree_title, {})
+                degree.setdefault(pathway_title, {})[table_id] = group_name
+                carried += 1
+
+        if carried:
+            report = log.warning if self.failed_pages else log.info
+            report(f"{carried} groups of failed or unchanged pages are kept.")
+
+    def merge(
+        self,
+        timetables: list[Timetable],
+        headers: dict[str, dict[str, dict]],
+        page_timetables: list[Timetable],
+        page_headers: dict[str, dict[str, dict]],
+        url: str,
+        kind: str,
+    ):
+        """Adds groups of a page, groups already listed by other pages are skipped."""
+        known_groups = set(headers_to_group_pathways(headers))
+        prefix = self.prefix(url, kind)
+
+        for degree_title, pathways in page_headers.items():
+            degree = headers.setdefault(degree_title, {})
+            for pathway_title, groups in pathways.items():
+                pathway = degree.setdefault(pathway_title, {})
+                for table_id, group_name in groups.items():
+                    if group_name not in known_groups:
+                        pathway[prefix + table_id] = group_name
+
+        timetables.extend(
+            timetable
+            for timetable in page_timetables
+            if timetable.group not in known_groups
+        )
+
+    @property
+    def page_fingerprint(self) -> str:
+        url = next(iter(self.pages))
+        if url in self.unchanged_pages:
+            return self.fetcher.metadata.get(url, {}).get("sha256")
+        return self.scrapers[url].page_fingerprint
+
+    def updated_fingerprints(self) -> dict[str, str]:
+        fingerprints = {}
+        for url, kind in self.pages.items():
+            if kind in ("teachers", "pdf") or url in self.failed_pages:
+                continue
+            prefix = self.prefix(url, kind)
+            if url in self.unchanged_pages:
+                # the tables were not parsed, their fingerprints are the same
+                page_fingerprints = self.previous_fingerprints(url, kind) or {}
+            else:
+                page_fingerprints = self.scrapers[url].updated_fingerprints()
+            for table_id, fingerprint in page_fingerprints.items():
+                fingerprints[prefix + table_id] = fingerprint
+
+        return fingerprints
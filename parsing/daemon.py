@@ -0,0 +1,159 @@
+import asyncio
+import logging as log
+import random
+import signal
+import time
+
+import aiohttp.web
+
+from config import (
+    TRIGGER_HOST,
+    TRIGGER_PORT,
+    TRIGGER_SOCKET,
+    UPDATE_INTERVAL,
+    UPDATE_JITTER,
+)
+from rest_client import Schedule_Service_API
+
+
+class ParserDaemon:
+    """
+    Runs the parser every `interval` +- `jitter` seconds and on demand.
+
+    Runs are executed one by one by a single scheduler loop, a trigger
+    received during a run schedules exactly one more run after it.
+    Trigger endpoint: POST /run, status: GET /status.
+
+    `run_once` is awaited with the context of every run, the context is made
+    once by `make_context(api, resume)` and kept between runs.
+    """
+
+    def __init__(
+        self,
+        run_once,
+        make_context,
+        interval=UPDATE_INTERVAL,
+        jitter=UPDATE_JITTER,
+        trigger_host=TRIGGER_HOST,
+        trigger_port=TRIGGER_PORT,
+        trigger_socket=TRIGGER_SOCKET,
+        resume=False,
+    ):
+        self.run_once = run_once
+        self.make_context = make_context
+        self.interval = interval
+        self.jitter = jitter
+        self.trigger_host = trigger_host
+        self.trigger_port = trigger_port
+        self.trigger_socket = trigger_socket
+        self.resume = resume
+
+        self.lock = asyncio.Lock()
+        self.triggered = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.context = None
+        self.status = {
+            "running": False,
+            "runs": 0,
+            "failed_runs": 0,
+            "last_run_started": None,
+            "last_run_seconds": None,
+            "last_run_success": None,
+            "next_run": None,
+        }
+
+    def next_delay(self) -> float:
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    async def run(self):
+        async with self.lock:
+            self.status["running"] = True
+            self.status["last_run_started"] = time.time()
+            try:
+                await self.run_once(self.context)
+                self.status["last_run_success"] = True
+            except Exception as e:
+                # the daemon survives a failed run, REST may be half updated by it,
+                # so the next run collects and sends everything from scratch
+                log.exception(f"Run failed: {e}")
+                self.context.reset()
+                self.status["failed_runs"] += 1
+                self.status["last_run_success"] = False
+            finally:
+                self.status["running"] = False
+                self.status["runs"] += 1
+                self.status["last_run_seconds"] = (
+                    time.time() - self.status["last_run_started"]
+                )
+
+    async def scheduler(self):
+        while not self.stopping.is_set():
+            self.triggered.clear()
+            await self.run()
+
+            delay = self.next_delay()
+            self.status["next_run"] = time.time() + delay
+            log.info(f"Next run in {delay:.0f} seconds.")
+
+            wakeups = [
+                asyncio.create_task(self.triggered.wait()),
+                asyncio.create_task(self.stopping.wait()),
+            ]
+            await asyncio.wait(
+                wakeups, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in wakeups:
+                task.cancel()
+
+    async def handle_run(self, request: aiohttp.web.Request):
+        running = self.lock.locked()
+        self.triggered.set()
+        log.info("Run triggered.")
+        return aiohttp.web.json_response(
+            {"status": "queued" if running else "started"}, status=202
+        )
+
+    async def handle_status(self, request: aiohttp.web.Request):
+        return aiohttp.web.json_response(self.status)
+
+    async def start_trigger_server(self) -> aiohttp.web.AppRunner:
+        app = aiohttp.web.Application()
+        app.add_routes(
+            [
+                aiohttp.web.post("/run", self.handle_run),
+                aiohttp.web.get("/status", self.handle_status),
+            ]
+        )
+        runner = aiohttp.web.AppRunner(app, access_log=None)
+        await runner.setup()
+
+        if self.trigger_socket:
+            site = aiohttp.web.UnixSite(runner, self.trigger_socket)
+            address = self.trigger_socket
+        else:
+            site = aiohttp.web.TCPSite(runner, self.trigger_host, self.trigger_port)
+            address = f"http://{self.trigger_host}:{self.trigger_port}"
+        await site.start()
+        log.info(f"Trigger endpoint is listening on {address}")
+
+        return runner
+
+    def stop(self):
+        log.info("Stopping after the current run...")
+        self.stopping.set()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        runner = await self.start_trigger_server()
+        try:
+            async with Schedule_Service_API() as api:
+                self.context = self.make_context(api, self.resume)
+                try:
+                    await self.scheduler()
+                finally:
+                    await self.context.close()
+        finally:
+            await runner.cleanup()
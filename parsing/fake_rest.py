@@ -0,0 +1,346 @@
+"""
+Local stand-in for the schedule service, used for offline load tests of the
+parser uploads and of the bot reads.
+
+Run it with `python fake_rest.py --port 8080` and point URL_REST to it.
+Every request can be delayed with --latency and failed with --error-rate,
+per endpoint request counts are available at GET /stats.
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import logging as log
+import random
+from datetime import datetime
+
+from aiohttp import web
+
+LESSON_FIELDS = (
+    "subjectName",
+    "group",
+    "subgroup",
+    "lessonType",
+    "professor",
+    "classroom",
+    "weekDay",
+    "startTime",
+    "hoursSpan",
+)
+
+WEEK_DAYS = {
+    "Mon": "Monday",
+    "Tue": "Tuesday",
+    "Wed": "Wednesday",
+    "Thu": "Thursday",
+    "Fri": "Friday",
+    "Sat": "Saturday",
+    "Sun": "Sunday",
+}
+
+
+class Storage:
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.pathway_ids = itertools.count(1)
+        self.group_ids = itertools.count(1)
+        self.timetable_ids = itertools.count(1)
+        self.pathways = {}
+        self.groups = {}
+        self.group_titles = {}
+        self.lessons = {}
+        self.group_lessons = collections.defaultdict(set)
+        self.timetable = self.new_timetable()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = 0
+        self.records = 0
+        self.errors = 0
+        self.endpoints = collections.Counter()
+
+    def new_timetable(self) -> dict:
+        self.timetable = {
+            "id": next(self.timetable_ids),
+            "addDate": datetime.now().isoformat(timespec="seconds"),
+        }
+        return self.timetable
+
+    def clear(self):
+        self.pathways.clear()
+        self.groups.clear()
+        self.group_titles.clear()
+        self.lessons.clear()
+        self.group_lessons.clear()
+        self.new_timetable()
+
+    def add_pathway(self, record: dict):
+        if not record.get("title"):
+            raise ValueError("'title' is required")
+        previous = self.pathways.get(record["title"])
+        record["id"] = previous["id"] if previous else next(self.pathway_ids)
+        self.pathways[record["title"]] = record
+        return record["id"]
+
+    def add_group(self, record: dict):
+        if not record.get("title"):
+            raise ValueError("'title' is required")
+        pathway = self.pathways.get(record.get("pathwayTitle"))
+        if pathway is None:
+            raise ValueError(f"Pathway {record.get('pathwayTitle')} not found")
+        previous = self.groups.get(record["title"])
+        record["id"] = previous["id"] if previous else next(self.group_ids)
+        record["pathwayId"] = pathway["id"]
+        self.groups[record["title"]] = record
+        self.group_titles[record["id"]] = record["title"]
+        return record["id"]
+
+    def add_lesson(self, record: dict):
+        missing = [field for field in LESSON_FIELDS if field not in record]
+        if missing:
+            raise ValueError(f"Missing fields: {missing}")
+        lesson_id = next(self.ids)
+        self.lessons[lesson_id] = record
+        self.group_lessons[record["group"]].add(lesson_id)
+        return lesson_id
+
+    def update_lesson(self, lesson_id: int, record: dict):
+        self.delete_lesson(lesson_id)
+        self.lessons[lesson_id] = record
+        self.group_lessons[record.get("group")].add(lesson_id)
+
+    def delete_lesson(self, lesson_id: int):
+        record = self.lessons.pop(lesson_id, None)
+        if record is not None:
+            self.group_lessons[record.get("group")].discard(lesson_id)
+
+    def get_groups(self, pathway_id: int = None) -> list[dict]:
+        return [
+            group
+            for group in self.groups.values()
+            if pathway_id is None or group["pathwayId"] == pathway_id
+        ]
+
+    def get_group_week(self, group_id: int) -> list[dict] | None:
+        if group_id not in self.group_titles:
+            return None
+
+        days = collections.defaultdict(list)
+        for lesson_id in self.group_lessons.get(self.group_titles[group_id], ()):
+            lesson = self.lessons[lesson_id]
+            days[lesson["weekDay"]].append({"id": lesson_id, **lesson})
+
+        return [
+            {
+                "day": day,
+                "lessons": sorted(days[short_day], key=lambda x: x["startTime"]),
+            }
+            for short_day, day in WEEK_DAYS.items()
+            if short_day in days
+        ]
+
+
+STORAGE = web.AppKey("storage", Storage)
+
+
+async def read_records(request: web.Request) -> list[dict]:
+    if request.content_type == "application/x-ndjson":
+        records = []
+        async for line in request.content:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+        return records
+
+    return await request.json()
+
+
+def make_app(
+    bulk=True, latency=0.0, error_rate=0.0, error_status=503, seed=None
+) -> web.Application:
+    """
+    Args:
+        latency (float): seconds every request is delayed by.
+        error_rate (float): share of requests answered with `error_status`.
+    """
+    storage = Storage()
+    rng = random.Random(seed)
+    adders = {
+        "pathways": storage.add_pathway,
+        "groups": storage.add_group,
+        "lessons": storage.add_lesson,
+    }
+
+    @web.middleware
+    async def accounting(request: web.Request, handler):
+        if request.path.startswith("/stats"):
+            return await handler(request)
+
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else request.path
+        storage.requests += 1
+        storage.endpoints[f"{request.method} {endpoint}"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if error_rate and rng.random() < error_rate:
+            storage.errors += 1
+            return web.json_response({"error": "Injected error"}, status=error_status)
+        return await handler(request)
+
+    async def post_record(request: web.Request):
+        kind = request.match_info["kind"]
+        if request.content_type == "application/json":
+            record = await request.json()
+        else:
+            record = dict(await request.post())
+
+        try:
+            record_id = adders[kind](record)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+
+        storage.records += 1
+        return web.json_response({"id": record_id, **record})
+
+    async def post_bulk(request: web.Request):
+        kind = request.match_info["kind"]
+        ids = []
+        errors = []
+
+        for index, record in enumerate(await read_records(request)):
+            try:
+                ids.append(adders[kind](record))
+                storage.records += 1
+            except ValueError as e:
+                ids.append(None)
+                errors.append({"index": index, "error": str(e)})
+
+        return web.json_response({"ids": ids, "errors": errors})
+
+    async def put_lesson(request: web.Request):
+        lesson_id = int(request.match_info["id"])
+        if lesson_id not in storage.lessons:
+            return web.json_response({"error": "Lesson not found"}, status=404)
+        storage.update_lesson(lesson_id, await request.json())
+        return web.json_response({"id": lesson_id, **storage.lessons[lesson_id]})
+
+    async def delete_lesson(request: web.Request):
+        storage.delete_lesson(int(request.match_info["id"]))
+        return web.Response(status=204)
+
+    async def get_pathways(request: web.Request):
+        return web.json_response(list(storage.pathways.values()))
+
+    async def get_groups(request: web.Request):
+        pathway_id = request.query.get("pathwayId")
+        try:
+            pathway_id = int(pathway_id) if pathway_id is not None else None
+        except ValueError:
+            return web.json_response({"error": "Bad pathwayId"}, status=400)
+        return web.json_response(storage.get_groups(pathway_id))
+
+    async def get_lessons(request: web.Request):
+        group = request.query.get("group")
+        lessons = [
+            {"id": lesson_id, **lesson}
+            for lesson_id, lesson in storage.lessons.items()
+            if group is None or lesson["group"] == group
+        ]
+        return web.json_response(lessons)
+
+    async def get_group_lessons(request: web.Request):
+        week = storage.get_group_week(int(request.match_info["id"]))
+        if week is None:
+            return web.json_response({"error": "Group not found"}, status=404)
+        if request.match_info["period"] == "week":
+            return web.json_response(week)
+
+        today = datetime.now().strftime("%A")
+        day = next((day for day in week if day["day"] == today), None)
+        return web.json_response(day)
+
+    async def get_timetable(request: web.Request):
+        return web.json_response(storage.timetable)
+
+    async def post_timetable(request: web.Request):
+        return web.json_response(storage.new_timetable())
+
+    async def recreate(request: web.Request):
+        storage.clear()
+        return web.json_response(storage.timetable)
+
+    async def stats(request: web.Request):
+        return web.json_response(
+            {
+                "requests": storage.requests,
+                "records": storage.records,
+                "errors": storage.errors,
+                "endpoints": dict(storage.endpoints),
+                "pathways": len(storage.pathways),
+                "groups": len(storage.groups),
+                "lessons": len(storage.lessons),
+                "timetable": storage.timetable,
+            }
+        )
+
+    async def reset_stats(request: web.Request):
+        storage.reset_stats()
+        return web.Response(status=204)
+
+    app = web.Application(middlewares=[accounting])
+    app[STORAGE] = storage
+    routes = [
+        web.get("/timetable", get_timetable),
+        web.post("/timetable", post_timetable),
+        web.post("/timetable/recreate", recreate),
+        web.get("/pathways", get_pathways),
+        web.get("/groups", get_groups),
+        web.get("/lessons", get_lessons),
+        web.get("/lessons/groups/{id:\\d+}/{period:week|day}", get_group_lessons),
+        web.put("/lessons/{id:\\d+}", put_lesson),
+        web.delete("/lessons/{id:\\d+}", delete_lesson),
+        web.get("/stats", stats),
+        web.delete("/stats", reset_stats),
+    ]
+    if bulk:
+        routes.append(web.post("/{kind:pathways|groups|lessons}/bulk", post_bulk))
+    routes.append(web.post("/{kind:pathways|groups|lessons}", post_record))
+    app.add_routes(routes)
+
+    return app
+
+
+async def start_server(app: web.Application, host="127.0.0.1", port=0):
+    """Starts `app` in the running loop. Returns the runner and the server url."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    return runner, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="0..1")
+    arg_parser.add_argument("--error-status", type=int, default=503)
+    arg_parser.add_argument("--no-bulk", action="store_true")
+    args = arg_parser.parse_args()
+
+    log.basicConfig(level=log.INFO, format="%(asctime)s: %(levelname)s: %(message)s")
+    web.run_app(
+        make_app(
+            bulk=not args.no_bulk,
+            latency=args.latency,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+        ),
+        host=args.host,
+        port=args.port,
+    )
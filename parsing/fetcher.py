@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging as log
+import os
+import threading
+import time
+
+from contextlib import asynccontextmanager
+
+import aiohttp
+import requests
+
+from config import (
+    ACCEPT_ENCODING,
+    CRAWL_MAX_CONNECTIONS,
+    CRAWL_PER_HOST_CONNECTIONS,
+    CRAWL_TIMEOUT,
+    FETCH_METADATA_FILE,
+    MY_HEADERS,
+)
+from metrics import metrics
+
+
+class FetchResult:
+    __slots__ = ["url", "status", "text", "changed"]
+
+    def __init__(self, url="", status=200, text=None, changed=True):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.changed = changed
+
+    def __repr__(self):
+        return (
+            f"FetchResult(url={self.url}, status={self.status}, changed={self.changed})"
+        )
+
+
+class Fetcher:
+    """
+    Downloads pages with compression and conditional requests.
+
+    ETag, Last-Modified and SHA-256 of the last seen content are kept per url
+    in a small JSON metadata store. A 304 response or an unchanged hash
+    (for servers without validators) means that the page has not changed.
+
+    Metadata of new responses is kept in `pending` until `commit_metadata()`,
+    so a page whose data never reached REST is seen as changed again.
+    """
+
+    def __init__(self, metadata_file=FETCH_METADATA_FILE, headers=MY_HEADERS):
+        self.metadata_file = metadata_file
+        self.headers = {**headers, "Accept-Encoding": ACCEPT_ENCODING}
+        self.session = requests.Session()
+        self.metadata = self.load_metadata()
+        self.pending = {}
+        # groups and teachers pages are fetched from different threads
+        self.lock = threading.Lock()
+
+    def load_metadata(self) -> dict[str, dict]:
+        try:
+            with open(self.metadata_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            log.info("Fetch metadata file not found. Creating a new one.")
+            return {}
+
+    def save_metadata(self):
+        with open(self.metadata_file, "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, ensure_ascii=False)
+
+    def request_headers(self, url: str, conditional: bool) -> dict[str, str]:
+        headers = dict(self.headers)
+        metadata = self.metadata.get(url, {})
+
+        if conditional and metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if conditional and metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+        return headers
+
+    def update_metadata(self, url: str, response: requests.Response, **fields):
+        with self.lock:
+            metadata = self.pending.setdefault(url, {})
+            metadata["etag"] = response.headers.get("ETag")
+            metadata["last_modified"] = response.headers.get("Last-Modified")
+            metadata.update(fields)
+
+    def commit_metadata(self):
+        with self.lock:
+            self.metadata.update(self.pending)
+            self.pending = {}
+            self.save_metadata()
+
+    def discard_metadata(self):
+        with self.lock:
+            self.pending = {}
+
+    def get(self, url: str, conditional=True, keep_body=False) -> FetchResult:
+        """
+        Args:
+            conditional (bool): send validators of the previous response.
+            keep_body (bool): store the page text, so it is returned on 304 too.
+        """
+        metadata = self.metadata.get(url, {})
+        # without a stored body a 304 would leave us without the page
+        conditional = conditional and (not keep_body or "body" in metadata)
+        headers = self.request_headers(url, conditional)
+
+        start_time = time.perf_counter()
+        with self.session.get(url, headers=headers) as response:
+            metrics.set(
+                "parser_fetch_seconds", time.perf_counter() - start_time, url=url
+            )
+            metrics.inc(
+                "parser_fetch_requests_total", url=url, status=response.status_code
+            )
+
+            if response.status_code == 304:
+                log.info(f"{url} has not been modified.")
+                return FetchResult(url, 304, metadata.get("body"), changed=False)
+
+            response.encoding = "utf-8"
+            response.raise_for_status()
+            text = response.text
+            metrics.inc("parser_fetch_bytes_total", len(response.content), url=url)
+
+        current_hash = calculate_hash(text)
+        changed = metadata.get("sha256") != current_hash
+
+        fields = {"sha256": current_hash}
+        if keep_body:
+            fields["body"] = text
+        self.update_metadata(url, response, **fields)
+
+        return FetchResult(url, response.status_code, text, changed)
+
+    def get_stream(self, url: str) -> requests.Response:
+        response = self.session.get(url, headers=self.headers, stream=True)
+        metrics.inc("parser_fetch_requests_total", url=url, status=response.status_code)
+        response.raise_for_status()
+        return response
+
+
+class AsyncFetcher(Fetcher):
+    """
+    `Fetcher` which also downloads pages with aiohttp without blocking the loop.
+
+    The connection pool is limited to `max_connections` in total and
+    `per_host` connections to one host, the session is opened on the first
+    request and must be closed with `close()`.
+    """
+
+    def __init__(
+        self,
+        metadata_file=FETCH_METADATA_FILE,
+        headers=MY_HEADERS,
+        max_connections=CRAWL_MAX_CONNECTIONS,
+        per_host=CRAWL_PER_HOST_CONNECTIONS,
+    ):
+        super().__init__(metadata_file, headers)
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.client = None
+
+    def open_client(self) -> aiohttp.ClientSession:
+        if self.client is None or self.client.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.per_host,
+                ttl_dns_cache=300,
+            )
+            self.client = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=CRAWL_TIMEOUT),
+                headers=self.headers,
+            )
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+        self.client = None
+
+    async def fetch(self, url: str, conditional=True, keep_body=False) -> FetchResult:
+        """Async version of `get`."""
+        metadata = self.metadata.get(url, {})
+        conditional = conditional and (not keep_body or "body" in metadata)
+        headers = self.request_headers(url, conditional)
+
+        start_time = time.perf_counter()
+        async with self.open_client().get(url, headers=headers) as response:
+            metrics.inc("parser_fetch_requests_total", url=url, status=response.status)
+            if response.status == 304:
+                log.info(f"{url} has not been modified.")
+                return FetchResult(url, 304, metadata.get("body"), changed=False)
+
+            response.raise_for_status()
+            body = await response.read()
+        metrics.set("parser_fetch_seconds", time.perf_counter() - start_time, url=url)
+        metrics.inc("parser_fetch_bytes_total", len(body), url=url)
+
+        text = body.decode("utf-8", errors="replace")
+        current_hash = calculate_hash(text)
+        changed = metadata.get("sha256") != current_hash
+
+        fields = {"sha256": current_hash}
+        if keep_body:
+            fields["body"] = text
+        self.update_metadata(url, response, **fields)
+
+        return FetchResult(url, response.status, text, changed)
+
+    async def fetch_bytes(self, url: str, conditional=True) -> tuple[bytes, str]:
+        """
+        Returns:
+            tuple: the body and its SHA-256, the body is None if the server
+            answered 304 (the hash is the one of the previous response).
+        """
+        metadata = self.metadata.get(url, {})
+        conditional = conditional and "sha256" in metadata
+        headers = self.request_headers(url, conditional)
+
+        async with self.open_client().get(url, headers=headers) as response:
+            metrics.inc("parser_fetch_requests_total", url=url, status=response.status)
+            if response.status == 304:
+                log.info(f"{url} has not been modified.")
+                return None, metadata["sha256"]
+
+            response.raise_for_status()
+            body = await response.read()
+        metrics.inc("parser_fetch_bytes_total", len(body), url=url)
+
+        current_hash = hashlib.sha256(body).hexdigest()
+        self.update_metadata(url, response, sha256=current_hash)
+
+        return body, current_hash
+
+    @asynccontextmanager
+    async def stream(self, url: str, conditional=False):
+        """
+        Yields the response, the body is read with `response.content`.
+
+        A conditional request can be answered with 304 and no body.
+        """
+        headers = self.request_headers(url, conditional)
+        async with self.open_client().get(url, headers=headers) as response:
+            metrics.inc("parser_fetch_requests_total", url=url, status=response.status)
+            if response.status == 304:
+                log.info(f"{url} has not been modified.")
+            else:
+                response.raise_for_status()
+                self.update_metadata(url, response)
+            yield response
+
+
+def calculate_hash(content):
+    sha256_hash = hashlib.sha256()
+    sha256_hash.update(content.encode())
+    return sha256_hash.hexdigest()
+
+
+def count_fetched_bytes(chunks, url: str):
+    for chunk in chunks:
+        metrics.inc("parser_fetch_bytes_total", len(chunk), url=url)
+        yield chunk
+
+
+def write_file(filename: str, data: bytes):
+    with open(f"{filename}.tmp", "wb") as f:
+        f.write(data)
+    os.replace(f"{filename}.tmp", filename)
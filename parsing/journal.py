@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging as log
+import sqlite3
+import time
+
+from config import UPLOAD_JOURNAL_FILE
+from timetable import Timetable
+
+
+class UploadJournal:
+    """
+    SQLite journal of records sent to REST during a full upload.
+
+    Records are identified by their content, so a resumed upload of the same
+    timetable version skips everything the server has already accepted
+    (including the recreate request). Records are journaled before they are
+    sent and once more when they are acknowledged: the ones sent right before
+    a crash are `in_doubt` on resume and must be looked up in REST.
+    """
+
+    # a pipelined upload gets its version only when parsing is finished
+    UNKNOWN_VERSION = ""
+
+    def __init__(self, filename=UPLOAD_JOURNAL_FILE):
+        self.connection = sqlite3.connect(filename)
+        # WAL without fsync on every commit, records are journaled one by one
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS upload (
+                version TEXT NOT NULL,
+                started REAL NOT NULL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS acknowledged (
+                endpoint TEXT NOT NULL,
+                key TEXT NOT NULL,
+                record_id
+            );
+            CREATE TABLE IF NOT EXISTS sending (
+                endpoint TEXT NOT NULL,
+                key TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sending_key ON sending (endpoint, key);
+            """)
+        self.acknowledged = {}
+        # endpoint -> records sent but not acknowledged before resume
+        self.in_doubt = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.connection.close()
+
+    @staticmethod
+    def record_key(record: dict) -> str:
+        return json.dumps(record, sort_keys=True, ensure_ascii=False)
+
+    def unfinished_version(self):
+        row = self.connection.execute(
+            "SELECT version FROM upload WHERE finished IS NULL"
+        ).fetchone()
+        return row[0] if row else None
+
+    def start(self, version: str, resume=False) -> bool:
+        """
+        Returns:
+            bool: True if an unfinished upload of the same `version` is resumed.
+        """
+        self.acknowledged = {}
+        self.in_doubt = {}
+
+        if resume and self.unfinished_version() == version:
+            rows = self.connection.execute(
+                "SELECT endpoint, key, record_id FROM acknowledged"
+            ).fetchall()
+            # lists of ids, because identical records may be sent several times
+            for endpoint, key, record_id in rows:
+                self.acknowledged.setdefault((endpoint, key), []).append(record_id)
+
+            sending = self.connection.execute("SELECT endpoint, key FROM sending")
+            for endpoint, key in sending.fetchall():
+                self.in_doubt.setdefault(endpoint, []).append(json.loads(key))
+
+            in_doubt = sum(len(records) for records in self.in_doubt.values())
+            log.info(
+                f"Resuming upload, {len(rows)} records are already in REST, "
+                f"{in_doubt} records may be."
+            )
+            return True
+
+        if resume and self.unfinished_version() == self.UNKNOWN_VERSION:
+            log.warning(
+                "The interrupted upload was sent while parsing and stopped before "
+                "parsing had finished, it can't be resumed. Starting from scratch, "
+                "set UPLOAD_PIPELINE=false to make every upload resumable."
+            )
+        elif resume:
+            log.info("No unfinished upload of this timetable, starting from scratch.")
+
+        with self.connection:
+            self.connection.execute("DELETE FROM upload")
+            self.connection.execute("DELETE FROM acknowledged")
+            self.connection.execute("DELETE FROM sending")
+            self.connection.execute(
+                "INSERT INTO upload (version, started) VALUES (?, ?)",
+                (version, time.time()),
+            )
+
+        return False
+
+    def pop_acknowledged(self, endpoint: str, record: dict) -> tuple[bool, object]:
+        """Returns (True, id) if `record` was acknowledged before resume."""
+        ids = self.acknowledged.get((endpoint, self.record_key(record)))
+        if ids:
+            return True, ids.pop()
+        return False, None
+
+    def acknowledged_ids(self, endpoint: str) -> set:
+        return {
+            record_id
+            for (record_endpoint, _), ids in self.acknowledged.items()
+            if record_endpoint == endpoint
+            for record_id in ids
+        }
+
+    def begin(self, endpoint: str, records: list[dict]):
+        """Journals records which are about to be sent."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO sending (endpoint, key) VALUES (?, ?)",
+                ((endpoint, self.record_key(record)) for record in records),
+            )
+
+    def acknowledge(self, endpoint: str, record: dict, record_id=None):
+        key = self.record_key(record)
+        with self.connection:
+            self.connection.execute(
+                """
+                DELETE FROM sending WHERE rowid = (
+                    SELECT rowid FROM sending WHERE endpoint = ? AND key = ? LIMIT 1
+                )
+                """,
+                (endpoint, key),
+            )
+            self.connection.execute(
+                "INSERT INTO acknowledged (endpoint, key, record_id) VALUES (?, ?, ?)",
+                (endpoint, key, record_id),
+            )
+
+    def adopt(self, endpoint: str, record: dict, record_id=None):
+        """Acknowledges a record in doubt which was found in REST."""
+        self.acknowledge(endpoint, record, record_id)
+        key = (endpoint, self.record_key(record))
+        self.acknowledged.setdefault(key, []).append(record_id)
+
+    def clear_in_doubt(self):
+        """Records in doubt which were not found in REST are sent again."""
+        with self.connection:
+            self.connection.execute("DELETE FROM sending")
+        self.in_doubt = {}
+
+    def set_version(self, version: str):
+        """The version of a pipelined upload is known only after parsing."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE upload SET version = ? WHERE finished IS NULL", (version,)
+            )
+
+    def finish(self):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE upload SET finished = ? WHERE finished IS NULL", (time.time(),)
+            )
+            self.connection.execute("DELETE FROM acknowledged")
+            self.connection.execute("DELETE FROM sending")
+
+
+def timetables_version(
+    timetables: list[Timetable], headers: dict[str, dict[str, dict]]
+) -> str:
+    data = [headers, [timetable.to_dict() for timetable in timetables]]
+    data = json.dumps(data, ensure_ascii=False)
+    return hashlib.sha256(data.encode()).hexdigest()
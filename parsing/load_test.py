@@ -0,0 +1,210 @@
+"""
+End-to-end load test of the parser uploads and the bot reads against fake_rest.
+
+Usage:
+    python load_test.py upload timetable_page.html [--latency 0.005] [--error-rate 0.01]
+    python load_test.py read timetable_page.html [--users 200] [--requests 20]
+
+`upload` sends the parsed page with the parser REST client and reports the
+throughput. `read` loads the parsed page into fake_rest and replays bot requests
+of concurrent users through the helpers of telegram_bot/src/rest.py, reporting
+latency percentiles per request kind.
+"""
+
+import argparse
+import asyncio
+import logging as log
+import os
+import random
+import sys
+import time
+
+PARSING_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.join(os.path.dirname(PARSING_DIR), "telegram_bot")
+
+# settings the parser requires, the bot client runs with its shipped defaults
+for name, value in {
+    "USER_AGENT": "",
+    "ACCEPT": "",
+    "TAG_STRONG_GROUPS": "",
+    "TAG_STRONG_TEACHERS": "",
+    "TAG_STRONG_INFORMATICS": "",
+    "URL_LEQTORI": "",
+    "URL_REST": "",
+    "MAX_CONNECTIONS": "10",
+    "FORCE_TO_COLLECT": "true",
+    "N_FIRST_TABLES_TO_COLLECT": "-1",
+    "BOT_TOKEN": "",
+}.items():
+    os.environ.setdefault(name, value)
+
+from fake_rest import STORAGE, make_app, start_server
+from parser import SCRAPERS
+from rest_client import Schedule_Service_API
+
+# share of each request kind in the bot traffic
+READ_MIX = {
+    "day": 0.5,
+    "week": 0.3,
+    "groups": 0.1,
+    "pathways": 0.05,
+    "last_update": 0.05,
+}
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def load_storage(storage, timetables, headers):
+    """Fills fake_rest storage directly, without requests and injected errors."""
+    for pathways in headers.values():
+        for pathway_title, groups in pathways.items():
+            storage.add_pathway({"title": str(pathway_title)})
+            for group_title in groups.values():
+                storage.add_group(
+                    {"title": group_title, "pathwayTitle": str(pathway_title)}
+                )
+
+    for timetable in timetables:
+        for lesson in timetable:
+            storage.add_lesson(lesson.to_dict())
+
+
+async def upload(args, timetables, headers):
+    app = make_app(
+        bulk=not args.no_bulk_endpoints,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    runner, url = await start_server(app)
+
+    try:
+        async with Schedule_Service_API(
+            url,
+            args.max_connections,
+            bulk_upload=args.bulk,
+            bulk_format=args.bulk_format,
+        ) as api:
+            start_time = time.perf_counter()
+            await api.send_data_to_rest(timetables, headers)
+            elapsed = time.perf_counter() - start_time
+            failed = len(api.failed)
+    finally:
+        await runner.cleanup()
+
+    storage = app[STORAGE]
+    lessons = sum(len(timetable) for timetable in timetables)
+    print(
+        f"upload: {elapsed:.3f} s, {storage.requests} requests, "
+        f"{storage.errors} injected errors, {failed} failed records, "
+        f"{len(storage.lessons)}/{lessons} lessons, "
+        f"{len(storage.lessons) / elapsed:.1f} lessons/s"
+    )
+
+
+async def read(args, timetables, headers):
+    app = make_app(latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+    storage = app[STORAGE]
+    load_storage(storage, timetables, headers)
+    runner, url = await start_server(app)
+
+    # the bot reads URL_REST on import
+    os.environ["URL_REST"] = url
+    sys.path.insert(0, BOT_DIR)
+    from src import rest
+
+    rng = random.Random(args.seed)
+    pathway_ids = [pathway["id"] for pathway in storage.pathways.values()]
+    group_ids = [group["id"] for group in storage.groups.values()]
+    # a few groups get most of the traffic, like the big first-year streams
+    group_weights = [1 / rank for rank in range(1, len(group_ids) + 1)]
+    calls = {
+        "day": lambda: rest.get_lessons_day(rng.choices(group_ids, group_weights)[0]),
+        "week": lambda: rest.get_lessons_week(rng.choices(group_ids, group_weights)[0]),
+        "groups": lambda: rest.get_groups(rng.choice(pathway_ids)),
+        "pathways": lambda: rest.get_pathways(),
+        "last_update": lambda: rest.get_last_update(),
+    }
+    latencies = {kind: [] for kind in READ_MIX}
+    errors = {kind: 0 for kind in READ_MIX}
+
+    async def user():
+        for _ in range(args.requests):
+            kind = rng.choices(list(READ_MIX), list(READ_MIX.values()))[0]
+            start_time = time.perf_counter()
+            try:
+                result = await calls[kind]()
+            except Exception:
+                result = None
+            latencies[kind].append(time.perf_counter() - start_time)
+            # the bot helpers return None on errors, a day without lessons is null too
+            if result is None and kind != "day":
+                errors[kind] += 1
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, args.think_time))
+
+    try:
+        storage.reset_stats()
+        start_time = time.perf_counter()
+        await asyncio.gather(*(user() for _ in range(args.users)))
+        elapsed = time.perf_counter() - start_time
+    finally:
+        await rest.close_client()
+        await runner.cleanup()
+
+    total = sum(len(values) for values in latencies.values())
+    print(
+        f"read: {args.users} users, {total} calls in {elapsed:.3f} s, "
+        f"{total / elapsed:.1f} calls/s, {storage.requests} REST requests, "
+        f"{storage.errors} injected errors"
+    )
+    for kind, values in latencies.items():
+        print(
+            f"    {kind:>12}: {len(values):6} calls {errors[kind]:5} errors "
+            f"p50 {percentile(values, 0.5) * 1000:8.2f} ms "
+            f"p95 {percentile(values, 0.95) * 1000:8.2f} ms "
+            f"p99 {percentile(values, 0.99) * 1000:8.2f} ms "
+            f"max {max(values, default=0) * 1000:8.2f} ms"
+        )
+    for name in ("reference_cache", "week_cache"):
+        print(f"    {name}: {getattr(rest, name).stats()}")
+    print(f"    inflight: {rest.inflight.shared} calls shared a request")
+
+
+async def main(args):
+    timetables, headers = SCRAPERS[args.engine]().get_timetables_from_file(args.file)
+
+    if args.mode == "upload":
+        await upload(args, timetables, headers)
+    else:
+        await read(args, timetables, headers)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("mode", choices=["upload", "read"])
+    arg_parser.add_argument("file", help="saved timetable page")
+    arg_parser.add_argument("--engine", default="lxml", choices=list(SCRAPERS))
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="0..1")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    # upload
+    arg_parser.add_argument("--max-connections", type=int, default=10)
+    arg_parser.add_argument("--bulk", action="store_true")
+    arg_parser.add_argument("--bulk-format", default="json", choices=["json", "ndjson"])
+    arg_parser.add_argument("--no-bulk-endpoints", action="store_true")
+    # read
+    arg_parser.add_argument("--users", type=int, default=100)
+    arg_parser.add_argument("--requests", type=int, default=10, help="per user")
+    arg_parser.add_argument(
+        "--think-time", type=float, default=0.0, help="max pause between requests"
+    )
+    args = arg_parser.parse_args()
+
+    log.basicConfig(level=log.WARNING, format="%(asctime)s: %(levelname)s: %(message)s")
+    asyncio.run(main(args))
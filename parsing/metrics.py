@@ -0,0 +1,220 @@
+import json
+import logging as log
+import os
+import re
+import resource
+import threading
+import time
+
+from contextlib import contextmanager
+
+import aiohttp
+
+from config import METRICS_FILE, METRICS_FORMAT
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the process in bytes."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux and can't be reset
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """Resets VmHWM to the current RSS, so the next peak belongs to the next stage."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class RunMetrics:
+    """
+    Counters, gauges and histograms of one parser run.
+
+    Exported as a Prometheus textfile or as a JSON report at the end of the run.
+    """
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        # pages are parsed in parallel threads
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def labels_key(labels: dict) -> tuple:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def inc(self, name: str, value=1, **labels):
+        key = self.labels_key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value, **labels):
+        key = self.labels_key(labels)
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self.labels_key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.setdefault(
+                key,
+                {"buckets": [0] * len(self.LATENCY_BUCKETS), "sum": 0, "count": 0},
+            )
+            for i, bucket in enumerate(self.LATENCY_BUCKETS):
+                if value <= bucket:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set(name, time.perf_counter() - start_time, **labels)
+
+    @contextmanager
+    def stage(self, stage: str, **labels):
+        """
+        Times a parser stage and records the peak RSS of the process during it.
+
+        RSS is process wide, so stages of pages parsed at the same time overlap.
+        """
+        reset_peak_rss()
+        try:
+            with self.timer("parser_stage_seconds", stage=stage, **labels):
+                yield
+        finally:
+            self.set("parser_stage_peak_rss_bytes", peak_rss(), stage=stage, **labels)
+
+    @staticmethod
+    def format_labels(key: tuple, **extra) -> str:
+        labels = list(key) + list(extra.items())
+        if not labels:
+            return ""
+        labels = ",".join(
+            f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for name, value in labels
+        )
+        return "{" + labels + "}"
+
+    def to_prometheus(self) -> str:
+        lines = []
+
+        for metric_type, metrics in (
+            ("counter", self.counters),
+            ("gauge", self.gauges),
+        ):
+            for name, series in metrics.items():
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in series.items():
+                    lines.append(f"{name}{self.format_labels(key)} {value}")
+
+        for name, series in self.histograms.items():
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                for bucket, count in zip(self.LATENCY_BUCKETS, histogram["buckets"]):
+                    labels = self.format_labels(key, le=bucket)
+                    lines.append(f"{name}_bucket{labels} {count}")
+                labels = self.format_labels(key, le="+Inf")
+                lines.append(f"{name}_bucket{labels} {histogram['count']}")
+                lines.append(f"{name}_sum{self.format_labels(key)} {histogram['sum']}")
+                lines.append(
+                    f"{name}_count{self.format_labels(key)} {histogram['count']}"
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> dict:
+        def series_to_list(series: dict) -> list[dict]:
+            return [
+                {"labels": dict(key), "value": value} for key, value in series.items()
+            ]
+
+        return {
+            "counters": {n: series_to_list(s) for n, s in self.counters.items()},
+            "gauges": {n: series_to_list(s) for n, s in self.gauges.items()},
+            "histograms": {
+                name: [
+                    {"labels": dict(key), "buckets": list(self.LATENCY_BUCKETS), **h}
+                    for key, h in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def export(self, filename=METRICS_FILE, metrics_format=METRICS_FORMAT):
+        if not filename:
+            return
+
+        if metrics_format == "json":
+            content = json.dumps(self.to_dict(), indent=4, ensure_ascii=False)
+        else:
+            content = self.to_prometheus()
+
+        # textfile collectors must never see a half-written file
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_filename, filename)
+        log.info(f"Metrics saved to {filename}")
+
+
+metrics = RunMetrics()
+
+
+def get_metrics_trace_config() -> aiohttp.TraceConfig:
+    """Collects latency of every REST request, grouped by endpoint."""
+
+    async def on_request_start(session, context, params):
+        context.start_time = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        endpoint = re.sub(r"/\d+", "/{id}", params.url.path)
+        metrics.observe(
+            "parser_upload_request_seconds",
+            time.perf_counter() - context.start_time,
+            endpoint=endpoint,
+            method=params.method,
+        )
+        metrics.inc(
+            "parser_upload_requests_total",
+            endpoint=endpoint,
+            method=params.method,
+            status=params.response.status,
+        )
+
+    async def on_request_exception(session, context, params):
+        endpoint = re.sub(r"/\d+", "/{id}", params.url.path)
+        metrics.inc(
+            "parser_upload_request_errors_total",
+            endpoint=endpoint,
+            method=params.method,
+            error=type(params.exception).__name__,
+        )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+
+    return trace_config
@@ -1,54 +1,92 @@
+import argparse
 import asyncio
 import hashlib
 import json
 import logging as log
 import math
+import multiprocessing
 import os
 import re
 import time
 
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import unquote, urljoin, urlparse
 
-import aiohttp
 import bs4
-import requests
+import lxml.html
 import uvloop
 
 from bs4 import BeautifulSoup
+from lxml import etree
 from tabula import read_pdf
 
-# Get environment variables
-USER_AGENT = os.environ["USER_AGENT"]
-ACCEPT = os.environ["ACCEPT"]
-MY_HEADERS = {"User-Agent": USER_AGENT, "Accept": ACCEPT}
-TAG_STRONG_GROUPS = os.environ["TAG_STRONG_GROUPS"]
-TAG_STRONG_TEACHERS = os.environ["TAG_STRONG_TEACHERS"]
-TAG_STRONG_INFORMATICS = os.environ["TAG_STRONG_INFORMATICS"]
-URL_LEQTORI = os.environ["URL_LEQTORI"]
-URL_REST = os.environ["URL_REST"]
-MAX_CONNECTIONS = int(os.environ["MAX_CONNECTIONS"])
-FORCE_TO_COLLECT = os.environ["FORCE_TO_COLLECT"]
+from archive import SnapshotArchive
+from config import (
+    BULK_UPLOAD,
+    DAEMON,
+    FORCE_TO_COLLECT,
+    PARSER_ENGINE,
+    PARSE_WORKERS,
+    PDF_DIR,
+    PDF_WORKERS,
+    SNAPSHOT_DIR,
+    SYNC_MODE,
+    SYNC_STATE_FILE,
+    TABLE_FINGERPRINTS_FILE,
+    UPLOAD_PIPELINE,
+    UPLOAD_RESUME,
+    URL_LEQTORI,
+)
+from crawler import Crawler
+from daemon import ParserDaemon
+from fetcher import (
+    AsyncFetcher,
+    FetchResult,
+    Fetcher,
+    calculate_hash,
+    count_fetched_bytes,
+)
+from journal import UploadJournal, timetables_version
+from metrics import metrics
+from pipeline import TimetableChannel, UploadPipeline
+from rest_client import Schedule_Service_API
+from sync_state import discard_sync_state, load_sync_state, save_sync_state
+from timetable import (
+    NO_START_TIME,
+    Lesson,
+    Timetable,
+    minutes_to_time,
+    reset_string_pool,
+)
 
 # Settings
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
-# For debug
-N_FIRST_TABLES_TO_COLLECT = int(os.environ["N_FIRST_TABLES_TO_COLLECT"])
+# parse workers are never forked from this process: it runs the event loop and
+# other parsing threads, a fork could copy a lock held by one of them
+PROCESS_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
 
 
 class Leqtori:
-    def __init__(self, url_leqtori=URL_LEQTORI):
+    def __init__(
+        self,
+        url_leqtori=URL_LEQTORI,
+        fetcher: Fetcher = None,
+        leqtori_page: FetchResult = None,
+    ):
         self.url_leqtori = url_leqtori
-        self.leqtori_text = self.get_page_text(url_leqtori)
+        self.fetcher = fetcher or Fetcher()
+        self.leqtori_page = leqtori_page or self.fetcher.get(
+            url_leqtori, keep_body=True
+        )
+        self.leqtori_text = self.leqtori_page.text
         self.leqtori_soup = BeautifulSoup(self.leqtori_text, "lxml")
 
     def get_page_text(self, url):
-        with requests.get(url, headers=MY_HEADERS) as response:
-            response.encoding = "utf-8"
-            response.raise_for_status()
-            page_text = response.text
-
-        return page_text
+        return self.fetcher.get(url, conditional=False).text
 
     def get_page_soup(self, url):
         page_text = self.get_page_text(url)
@@ -61,316 +99,24 @@ class Leqtori:
             if a.find("strong", string=strong_tag):
                 return a["href"]
 
+    def get_strong_links(self) -> dict[str, str]:
+        """Titles of all <strong> links on the index and their absolute urls."""
+        links = {}
+        for a in self.leqtori_soup.find_all("a", href=True):
+            strong = a.find("strong")
+            if strong is not None:
+                title = strong.get_text(strip=True)
+                links.setdefault(title, urljoin(self.url_leqtori, a["href"]))
 
-class Lesson:
-    __slots__ = [
-        "subjectName",
-        "group",
-        "subgroup",
-        "lessonType",
-        "professor",
-        "classroom",
-        "weekDay",
-        "startTime",
-        "hoursSpan",
-    ]
-
-    def __init__(
-        self,
-        subjectName="",
-        group="",
-        subgroup="",
-        lessonType="",
-        professor="",
-        classroom="",
-        weekDay="",
-        startTime="",
-        hoursSpan=0,
-    ):
-        self.subjectName = subjectName
-        self.group = group
-        self.subgroup = subgroup
-        self.lessonType = lessonType
-        self.professor = professor
-        self.classroom = classroom
-        self.weekDay = weekDay
-        self.startTime = startTime
-        self.hoursSpan = hoursSpan
-
-    def to_dict(self):
-        return {slot: getattr(self, slot) for slot in self.__slots__}
-
-    def __repr__(self):
-        return f"Lesson: {self.to_dict()}"
-
-    def __str__(self):
-        return f"Lesson: {self.to_dict()}"
-
-
-class Timetable:
-    __slots__ = ["_group", "lessons"]
-
-    def __init__(self, group=""):
-        self._group = group
-        self.lessons = []
-
-    def add_lesson(self, lesson: Lesson):
-        self.lessons.append(lesson)
-
-    @property
-    def group(self):
-        return self._group
-
-    @group.setter
-    def group(self, new_group):
-        if self.lessons:
-            self._update_group(new_group)
-
-        self._group = new_group
-
-    def _update_group(self, new_group):
-        for lesson in self.lessons:
-            lesson.group = new_group
-            # if lesson.subgroup:
-            #     pattern = rf"{new_group}\.(\d+-\d+)"
-            #     match = re.search(pattern, lesson.subgroup)
-            #     lesson.subgroup = match.group(1)
-
-    def __repr__(self):
-        return f"Timetable(group={self._group}, lessons={self.lessons})"
-
-    def __str__(self):
-        return f"Timetable(group={self._group}, lessons={self.lessons})"
-
-    def __iter__(self):
-        return iter(self.lessons)
-
-    def __len__(self):
-        return len(self.lessons)
-
-    def __add__(self, other):
-        if not isinstance(other, Timetable):
-            raise TypeError(
-                f"Unsupported operand type for +: 'Timetable' and {type(other)}"
-            )
-        if self.group != other.group:
-            raise ValueError("Timetables must have the same group to be combined.")
-        combined_timetable = Timetable(group=self.group)
-        combined_timetable.lessons.extend(self.lessons)
-        combined_timetable.lessons.extend(other.lessons)
-        return combined_timetable
-
-    def to_dict(self):
-        return {self.group: [lesson.to_dict() for lesson in self.lessons]}
-
-    def combine_common_lessons(self):
-        # Group lessons by common fields
-        grouped_lessons = {}
-        for lesson in self.lessons:
-            key = (
-                lesson.subjectName,
-                lesson.group,
-                lesson.subgroup,
-                lesson.lessonType,
-                lesson.weekDay,
-            )
-            if key not in grouped_lessons:
-                grouped_lessons[key] = []
-            grouped_lessons[key].append(lesson)
-
-        # Sort and combine lessons
-        combined_lessons = []
-        for key, group in grouped_lessons.items():
-            group.sort(key=lambda lesson: lesson.startTime)
-            combined_group = [group[0]]
-            for lesson in group[1:]:
-                last_lesson = combined_group[-1]
-                last_lesson_time = datetime.strptime(last_lesson.startTime, "%H:%M:%S")
-                lesson_time = datetime.strptime(lesson.startTime, "%H:%M:%S")
-                if lesson_time - last_lesson_time <= timedelta(hours=1):
-                    last_lesson.hoursSpan += lesson.hoursSpan
-                else:
-                    combined_group.append(lesson)
-            combined_lessons.extend(combined_group)
-
-        self.lessons = combined_lessons
-
-
-class Schedule_Service_API:
-    amount_pathways = 0
-    amount_groups = 0
-    amount_lessons = 0
-
-    sent_groups = 0
-    sent_pathways = 0
-    sent_lessons = 0
-
-    def __init__(self, url_rest=URL_REST, max_connections=MAX_CONNECTIONS) -> None:
-        self.url_rest = url_rest
-        self.session = aiohttp.ClientSession()
-        self.semaphore = asyncio.Semaphore(max_connections)
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.session.close()
-
-    async def send_group(self, group_name: str, pathway_name: str):
-        group = {"title": group_name, "pathwayTitle": pathway_name}
-        url_group = self.url_rest + "/groups"
-
-        async with self.semaphore:
-            async with self.session.post(url_group, data=group) as response:
-                if response.status == 200:
-                    self.sent_groups += 1
-                    log.debug(
-                        f"Group {group_name}, {pathway_name} sent to REST. {self.sent_groups}/{self.amount_groups} groups sent."
-                    )
-                else:
-                    log.error(
-                        f"Group {group_name} with pathway_name {pathway_name} NOT sent to REST."
-                    )
-                    response_json = await response.json()
-                    response_json["group_name"] = group_name
-                    response_json["pathway_name"] = pathway_name
-                    response_json = json.dumps(
-                        response_json, indent=4, ensure_ascii=False
-                    )
-
-                    exit(f"Error response: {response_json}")
-
-    async def send_pathway(self, pathway: str):
-        pathway = {"title": str(pathway)}
-        url_pathways = self.url_rest + "/pathways"
-
-        async with self.semaphore:
-            async with self.session.post(url_pathways, data=pathway) as response:
-                if response.status == 200:
-                    self.sent_pathways += 1
-                    log.debug(
-                        f"Pathway {pathway['title']} sent to REST. {self.sent_pathways}/{self.amount_pathways} pathways sent."
-                    )
-                else:
-                    log.error(f"Pathway {pathway} NOT sent to REST.")
-                    try:
-                        response_json = await response.json()
-                    except:
-                        response_json = await response.text()
-                        response_json = {"error": response_json}
-                    response_json["pathway"] = pathway
-                    response_json = json.dumps(
-                        response_json, indent=4, ensure_ascii=False
-                    )
-                    exit(f"Error response: {response_json}")
-
-    async def send_timetable_recreate(self):
-        url_recreate = self.url_rest + "/timetable/recreate"
-        async with self.session.post(url_recreate) as response:
-            if response.status == 200:
-                log.debug("Recreate request sent to REST.")
-            else:
-                log.error("Recreate request NOT sent to REST.")
-                response_json = await response.json()
-                response_json = json.dumps(response_json, indent=4, ensure_ascii=False)
-                exit(f"Error response: {response_json}")
-
-    async def send_lesson(self, lesson: dict):
-        url_lessons = self.url_rest + "/lessons"
-        retries = 3
-
-        for i in range(retries):
-            try:
-                if self.session.closed:
-                    await self.session.close()
-                    self.session = aiohttp.ClientSession()
-
-                async with self.semaphore:
-                    async with self.session.post(url_lessons, json=lesson) as response:
-                        if response.status == 200:
-                            self.sent_lessons += 1
-
-                            log.debug(
-                                f"Group {lesson['group']} lesson sent to REST. {self.sent_lessons}/{self.amount_lessons} lessons sent."
-                            )
-                            break
-                        elif response.status != 500:
-                            log.error(f"Lesson {lesson} NOT sent to REST.")
-                            response_json = await response.json()
-                            response_json["lesson"] = lesson
-                            response_json = json.dumps(
-                                response_json, indent=4, ensure_ascii=False
-                            )
-                            log.error(f"Error response: {response_json}")
-                        else:
-                            response_text = await response.text()
-                            lesson["error_code"] = 500
-                            lesson["response_text"] = response_text
-                            lesson = json.dumps(lesson, indent=4, ensure_ascii=False)
-                            exit(f"Error response: {lesson}")
-            except (
-                aiohttp.ServerDisconnectedError,
-                aiohttp.ClientOSError,
-                aiohttp.ClientConnectionError,
-            ):
-                if i < retries:
-                    await asyncio.sleep(2**i)
-                    continue
-                else:
-                    raise
-
-    async def send_pathways(self, headers: dict[str, dict[str, dict]]):
-        tasks = []
-        for pathways in headers.values():
-            for pathway_title in pathways:
-                task = asyncio.create_task(self.send_pathway(pathway_title))
-                tasks.append(task)
-
-        self.amount_pathways = len(tasks)
-        await asyncio.gather(*tasks)
-        return log.info("Pathways successfully sent to REST.")
-
-    async def send_groups(self, amount_to_send, headers: dict[str, dict[str, dict]]):
-        tasks = []
-        for pathways in headers.values():
-            for pathway_title, groups in pathways.items():
-                for group_name in groups.values():
-                    task = asyncio.create_task(
-                        self.send_group(group_name, pathway_title)
-                    )
-                    tasks.append(task)
-
-                    if amount_to_send > 1:
-                        amount_to_send -= 1
-                    else:
-                        self.amount_groups = len(tasks)
-                        await asyncio.gather(*tasks)
-                        return log.info("Groups successfully sent to REST.")
-
-    async def send_lessons(self, timetables: list[Timetable]):
-        tasks = []
-        for timetable in timetables:
-            for lesson in timetable:
-                task = asyncio.create_task(self.send_lesson(lesson.to_dict()))
-                tasks.append(task)
-
-        self.amount_lessons = len(tasks)
-        await asyncio.gather(*tasks)
-        log.info("All data successfully sent to REST.")
-
-    async def send_data_to_rest(
-        self, timetables: list[Timetable], headers: dict[str, dict[str, dict]]
-    ):
-        await self.send_timetable_recreate()
-        amount_to_send = len(timetables)
-
-        await self.send_pathways(headers)
-        await self.send_groups(amount_to_send, headers)
-        await self.send_lessons(timetables)
+        return links
 
 
 class Scraper:
 
+    FINGERPRINT_METHOD = "raw"
+    # label of the page in metrics
+    PAGE = "groups"
+
     WEEK_DICT = {
         0: "Mon",
         1: "Tue",
@@ -380,8 +126,34 @@ class Scraper:
         5: "Sat",
     }
 
-    def __init__(self, url_leqtori=URL_LEQTORI):
+    def __init__(
+        self,
+        url_leqtori=URL_LEQTORI,
+        workers=PARSE_WORKERS,
+        fetcher: Fetcher = None,
+        previous_fingerprints: dict[str, str] = None,
+    ):
+        """
+        Args:
+            previous_fingerprints (dict): table fingerprints of the previous run,
+                tables with the same fingerprint are not parsed. None - parse all tables.
+        """
         self.url_leqtori = url_leqtori
+        self.workers = workers or os.cpu_count()
+        self.fetcher = fetcher
+        self.previous_fingerprints = previous_fingerprints
+        self.page_fingerprint = None
+        self.table_fingerprints = {}
+        self.timetable_page_soup = None
+        self.collected_tables = []
+        self.failed_tables = set()
+        self.changed_groups = []
+        # set by the upload pipeline, gets headers and timetables as they are parsed
+        self.channel = None
+
+    def emit(self, item):
+        if self.channel is not None:
+            self.channel.put(item)
 
     @staticmethod
     def get_first_n_timetables_dict(timetables_dict, n: int = -1):
@@ -560,6 +332,9 @@ class Scraper:
         lessonType = lessonType.strip()
         return subjectName, lessonType
 
+    def subgroup_pattern(self) -> str:
+        return rf"{self.group_name}\.(\d+-\d+)"
+
     def get_lesson(self, tag_content: list) -> Lesson:
         tag_len = len(tag_content)
         subgroup = None
@@ -572,8 +347,7 @@ class Scraper:
             #         f"Cell contain more than 20 symbols in subgroup field: {tag_content[-4]}"
             #     )
             subgroup = tag_content[-4]
-            pattern = rf"{self.group_name}\.(\d+-\d+)"
-            match = re.search(pattern, subgroup)
+            match = re.search(self.subgroup_pattern(), subgroup)
             if match:
                 subgroup = match.group(1)
             else:
@@ -628,24 +402,121 @@ class Scraper:
         with open("text.txt", "w") as f:
             f.write(self.timetable_page_soup.text)
 
-    def timetables_processing(
+    @staticmethod
+    def make_soup(page_text: str) -> BeautifulSoup:
+        return BeautifulSoup(page_text, "lxml")
+
+    @staticmethod
+    def release_table(table: BeautifulSoup):
+        # decompose breaks parent/sibling reference cycles, so memory is freed now
+        table.decompose()
+
+    def release_soup(self):
+        if self.timetable_page_soup is not None:
+            self.timetable_page_soup.decompose()
+            self.timetable_page_soup = None
+
+    @staticmethod
+    def table_to_html(table: BeautifulSoup) -> str:
+        return str(table)
+
+    @staticmethod
+    def table_from_html(table_html: str) -> BeautifulSoup:
+        return BeautifulSoup(table_html, "lxml").table
+
+    def table_processing(self, table: BeautifulSoup) -> Timetable:
+        timetable_data = self.row_collecting(table)
+        timetable_data.combine_common_lessons()
+
+        return timetable_data
+
+    def timetables_processing_serial(
         self, soup_timetables: dict[str, bs4.NavigableString], timetables_id_name: dict
     ) -> list[Timetable]:
         groups = []
 
         for table_id, group_name in timetables_id_name.items():
             log.debug(f"Processing table: '{group_name}', id: '{table_id}'")
+            # a processed table is dropped from the soup, so the tree shrinks as we go
+            table = soup_timetables.pop(table_id, None)
             try:
-                timetable_data = self.row_collecting(soup_timetables[table_id])
-                timetable_data.combine_common_lessons()
-                groups.append(timetable_data)
+                if table is None:
+                    raise KeyError(table_id)
+                groups.append(self.table_processing(table))
             except Exception as e:
+                self.failed_tables.add(table_id)
                 log.error(
                     f"Error processing table (group: '{group_name}', id: '{table_id}'): {e}"
                 )
+                continue
+            finally:
+                if table is not None:
+                    self.release_table(table)
+            self.emit(groups[-1])
+
+        return groups
+
+    def timetables_processing_parallel(
+        self, soup_timetables: dict[str, bs4.NavigableString], timetables_id_name: dict
+    ) -> list[Timetable]:
+        """
+        Parses tables in a process pool.
+
+        Workers receive tables as HTML fragments, results keep the order of
+        `timetables_id_name`, the same as in the serial processing.
+        """
+        groups = []
+        fragments = []
+
+        for table_id in timetables_id_name:
+            table = soup_timetables.pop(table_id, None)
+            if table is None:
+                fragments.append("")
+                continue
+            fragments.append(self.table_to_html(table))
+            self.release_table(table)
+        self.release_soup()
+
+        scraper_classes = [type(self)] * len(fragments)
+        chunksize = max(1, len(fragments) // (self.workers * 4))
+
+        log.debug(f"Processing {len(fragments)} tables in {self.workers} processes")
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=PROCESS_CONTEXT
+        ) as executor:
+            results = executor.map(
+                table_html_processing, fragments, scraper_classes, chunksize=chunksize
+            )
+
+            for (table_id, group_name), (timetable_data, error) in zip(
+                timetables_id_name.items(), results
+            ):
+                if error is None:
+                    groups.append(timetable_data)
+                    self.emit(timetable_data)
+                else:
+                    self.failed_tables.add(table_id)
+                    log.error(
+                        f"Error processing table (group: '{group_name}', id: '{table_id}'): {error}"
+                    )
+
+        return groups
+
+    def timetables_processing(
+        self, soup_timetables: dict[str, bs4.NavigableString], timetables_id_name: dict
+    ) -> list[Timetable]:
+        if self.workers > 1 and len(timetables_id_name) > 1:
+            groups = self.timetables_processing_parallel(
+                soup_timetables, timetables_id_name
+            )
+        else:
+            groups = self.timetables_processing_serial(
+                soup_timetables, timetables_id_name
+            )
 
         amount_parsed = len(groups)
         amount_not_parsed = len(timetables_id_name) - amount_parsed
+        count_parsed_timetables(groups, amount_not_parsed, self.PAGE)
 
         log.info(f"{amount_parsed} tables have been parsed.")
         if amount_not_parsed:
@@ -653,10 +524,6 @@ class Scraper:
 
         return groups
 
-    def recreate_timetable(self):
-        with aiohttp.ClientSession as session:
-            session.post(f"{self.url_rest}/timetable/recreate")
-
     def collect_soup_timetables(self, first_table_id: str):
         """
         Collects soup timetables from a BeautifulSoup object based on the provided first_table_id.
@@ -680,74 +547,944 @@ class Scraper:
 
         return soup_timetables
 
+    def is_table_changed(self, table_id: str) -> bool:
+        if self.previous_fingerprints is None:
+            return True
+
+        fingerprint = self.table_fingerprints.get(table_id)
+        return fingerprint is None or fingerprint != self.previous_fingerprints.get(
+            table_id
+        )
+
+    def report_changed_groups(self, timetables_id_name: dict):
+        self.changed_groups = [
+            group_name
+            for table_id, group_name in timetables_id_name.items()
+            if self.is_table_changed(table_id)
+        ]
+
+        if self.previous_fingerprints is None:
+            log.info("No previous table fingerprints, all tables will be parsed.")
+        elif self.changed_groups:
+            log.info(
+                f"{len(self.changed_groups)} groups changed: {', '.join(self.changed_groups)}"
+            )
+        else:
+            log.info("No group has changed.")
+
+    def updated_fingerprints(self) -> dict[str, str]:
+        """Fingerprints to store: failed tables keep the previous fingerprint."""
+        fingerprints = dict(self.previous_fingerprints or {})
+
+        for table_id in self.collected_tables:
+            if table_id in self.failed_tables:
+                fingerprints.pop(table_id, None)
+            elif table_id in self.table_fingerprints:
+                fingerprints[table_id] = self.table_fingerprints[table_id]
+
+        return fingerprints
+
     def collect_timetables(self, tables_to_collect: int = -1):
         timetables_dict = self.headers_to_timetables_dict()
         timetables_id_name = self.get_first_n_timetables_dict(
             timetables_dict, tables_to_collect
         )
-        soup_timetables = self.collect_soup_timetables(next(iter(timetables_id_name)))
-        timetables = self.timetables_processing(soup_timetables, timetables_id_name)
+        self.collected_tables = list(timetables_id_name)
+        self.report_changed_groups(timetables_id_name)
+        timetables_id_name = {
+            table_id: group_name
+            for table_id, group_name in timetables_id_name.items()
+            if self.is_table_changed(table_id)
+        }
+        if not timetables_id_name:
+            return []
+
+        with metrics.stage("collect_soup_timetables", page=self.PAGE):
+            soup_timetables = self.collect_soup_timetables(
+                next(iter(timetables_id_name))
+            )
+        with metrics.stage("timetables_processing", page=self.PAGE):
+            timetables = self.timetables_processing(soup_timetables, timetables_id_name)
 
         return timetables
 
-    # FIXME: finish it later
-    def pdf_processing(filename):
+    def get_timetables_from_webpage(self, page_url, tables_to_collect: int = -1):
 
-        df = read_pdf(
-            filename,
-            pages="all",
-            output_format="dataframe",
-            multiple_tables=True,
-            lattice=True,
+        if ".pdf" in page_url:
+            filename = download_pdf(page_url, self.fetcher)
+            return PdfScraper().get_timetables_from_file(filename)
+        else:
+            log.info(f"Download data from {page_url}")
+            self.fetcher = self.fetcher or Fetcher()
+            page = self.fetcher.get(page_url, conditional=False)
+            timetables = self.page_processing(page, tables_to_collect)
+
+        return timetables, self.headers
+
+    def get_timetables_from_file(self, file_path, tables_to_collect: int = -1):
+        with open(file_path, "r", encoding="utf-8") as f:
+            page = FetchResult(file_path, text=f.read())
+
+        return self.get_timetables_from_page(page, tables_to_collect)
+
+    def get_timetables_from_text(
+        self, timetable_page_text: str, tables_to_collect: int = -1, source=""
+    ):
+        return self.get_timetables_from_page(
+            FetchResult(source, text=timetable_page_text), tables_to_collect
         )
-        df = pd.DataFrame(
-            df[0].values, columns=["group", "subject", "lector", "date", "time", "room"]
+
+    def get_timetables_from_page(self, page: FetchResult, tables_to_collect: int = -1):
+        """`page.text` is consumed, it's released as soon as the soup is built."""
+        timetables = self.page_processing(page, tables_to_collect)
+
+        return timetables, self.headers
+
+    def page_processing(
+        self, page: FetchResult, tables_to_collect: int = -1
+    ) -> list[Timetable]:
+        # the page object is the only owner of the text, so it can be freed early
+        timetable_page_text, page.text = page.text, None
+        self.page_fingerprint = calculate_hash(timetable_page_text)
+        self.table_fingerprints = calculate_table_fingerprints(timetable_page_text)
+
+        log.info(f"Making soup from {page.url}...")
+        with metrics.stage("soup_build", page=self.PAGE):
+            self.timetable_page_soup = self.make_soup(timetable_page_text)
+        del timetable_page_text
+
+        try:
+            log.info(f"Start processing {page.url}...")
+            with metrics.stage("headers_processing", page=self.PAGE):
+                self.headers = self.headers_processing(self.timetable_page_soup)
+            self.emit(self.headers)
+
+            return self.collect_timetables(tables_to_collect)
+        finally:
+            self.release_soup()
+
+
+class LxmlScraper(Scraper):
+    """
+    Scraper which walks the page with lxml and precompiled XPath instead of BeautifulSoup.
+
+    Produces the same timetables as `Scraper`, `get_text(strip=True)` and
+    `.contents` of BeautifulSoup are reproduced by `get_text` and `get_contents`.
+    """
+
+    XPATH_HEADERS_LI = etree.XPath("(/html/body//ul)[1]/li")
+    XPATH_FIRST_UL = etree.XPath("(.//ul)[1]")
+    XPATH_GROUPS_LI = etree.XPath("(.//li)[1]/../li")
+    XPATH_FIRST_A = etree.XPath("(.//a)[1]")
+    XPATH_TABLE_BY_ID = etree.XPath("//table[@id=$table_id][1]")
+    XPATH_DETAILED_SIBLINGS = etree.XPath(
+        "following-sibling::table[contains(@id, '_DETAILED')]"
+    )
+    XPATH_GROUP_NAME = etree.XPath("(((.//thead)[1]//tr)[1]//th)[1]")
+    XPATH_ROWS = etree.XPath("(.//tbody)[1]/tr")
+    XPATH_FIRST_TH = etree.XPath("(.//th)[1]")
+    XPATH_FIRST_TABLE = etree.XPath("(.//table)[1]")
+    XPATH_TR = etree.XPath(".//tr")
+    XPATH_TD = etree.XPath(".//td")
+
+    @staticmethod
+    def release_table(table: lxml.html.HtmlElement):
+        table.clear()
+        parent = table.getparent()
+        if parent is not None:
+            parent.remove(table)
+
+    def release_soup(self):
+        self.timetable_page_soup = None
+
+    @staticmethod
+    def make_soup(page_text: str) -> lxml.html.HtmlElement:
+        return lxml.html.document_fromstring(page_text)
+
+    @staticmethod
+    def table_to_html(table: lxml.html.HtmlElement) -> str:
+        return etree.tostring(table, encoding="unicode", with_tail=False)
+
+    @staticmethod
+    def table_from_html(table_html: str) -> lxml.html.HtmlElement:
+        return lxml.html.fragment_fromstring(table_html)
+
+    @staticmethod
+    def get_text(element: lxml.html.HtmlElement) -> str:
+        return "".join(text.strip() for text in element.itertext())
+
+    @staticmethod
+    def get_first_string(element: lxml.html.HtmlElement) -> str:
+        """Returns what `next(tag.strings)` returns for bs4"""
+        return next(element.itertext())
+
+    @staticmethod
+    def get_contents(cell: lxml.html.HtmlElement) -> list[str]:
+        """Returns what `[x.get_text(strip=True) for x in cell.contents ...]` returns for bs4"""
+        content = []
+        if cell.text is not None and cell.text != "\n":
+            content.append(cell.text.strip())
+
+        for child in cell:
+            if isinstance(child, etree._Comment):
+                if child.text != "\n":
+                    content.append("")
+            elif child.tag != "br":
+                content.append(LxmlScraper.get_text(child))
+
+            if child.tail is not None and child.tail != "\n":
+                content.append(child.tail.strip())
+
+        return content
+
+    @staticmethod
+    def li_processing(li: lxml.html.HtmlElement) -> dict[str, str]:
+        a = LxmlScraper.XPATH_FIRST_A(li)[0]
+        group_title = a.text.strip()
+        table_id = a.get("href").split("#")[1]
+        group = {table_id: group_title}
+
+        return group
+
+    @staticmethod
+    def parse_groups(ul: lxml.html.HtmlElement) -> dict[str, str]:
+        groups = {}
+
+        for li in LxmlScraper.XPATH_GROUPS_LI(ul):
+            group = LxmlScraper.li_processing(li)
+            groups.update(group)
+
+        return groups
+
+    @staticmethod
+    def parse_pathway(first_level_li: lxml.html.HtmlElement):
+        pathway_header = LxmlScraper.get_first_string(first_level_li)
+        degree_title, pathway_title = Scraper.parse_pathway_titles(pathway_header)
+        ul = LxmlScraper.XPATH_FIRST_UL(first_level_li)[0]
+        groups = LxmlScraper.parse_groups(ul)
+        pathway = {pathway_title: groups}
+
+        return degree_title, pathway
+
+    @staticmethod
+    def headers_processing(
+        timetable_page_soup: lxml.html.HtmlElement,
+    ) -> dict[str, dict[str, dict]]:
+        return LxmlScraper.headers_li_processing(
+            LxmlScraper.XPATH_HEADERS_LI(timetable_page_soup)
         )
-        for i in range(16, 19):  # df.shape[0]):
-            room = df.iloc[i, -1]
-            if isinstance(room, float) and math.isnan(room):
-                df.iloc[i, :] = df.iloc[i, :].shift()
-        # df.to_csv(f"{filename}.csv", index=False)
 
+    @staticmethod
+    def headers_li_processing(
+        li_first_level: list[lxml.html.HtmlElement],
+    ) -> dict[str, dict[str, dict]]:
+        degrees = {}
+
+        for li in li_first_level:
+            degree_title, pathway = LxmlScraper.parse_pathway(li)
+            try:
+                degrees[degree_title].update(pathway)
+            except KeyError:
+                degrees[degree_title] = pathway
+
+        return degrees
+
+    def collect_soup_timetables(self, first_table_id: str):
+        first_table = self.XPATH_TABLE_BY_ID(
+            self.timetable_page_soup, table_id=first_table_id
+        )[0]
+        soup_timetables = {first_table_id: first_table}
+
+        for table in self.XPATH_DETAILED_SIBLINGS(first_table):
+            soup_timetables[table.get("id")] = table
+
+        return soup_timetables
+
+    def row_collecting(self, table: lxml.html.HtmlElement) -> Timetable:
+        """processes all tr tags"""
+
+        self.group_name = self.get_text(self.XPATH_GROUP_NAME(table)[0])
+        timetable = Timetable()
+
+        for row in self.XPATH_ROWS(table):
+            row_timetable = self.cell_collecting(row)
+            timetable += row_timetable
+
+        timetable.group = self.group_name
+        return timetable
+
+    @staticmethod
+    def time_processing(row: lxml.html.HtmlElement) -> str:
+        time = LxmlScraper.get_text(LxmlScraper.XPATH_FIRST_TH(row)[0])
+        time = re.sub(r"\d+-", "", time)
+        time = datetime.strptime(time, "%H:%M").strftime("%H:%M:%S")
+
+        return time
+
+    def cell_collecting(self, row: lxml.html.HtmlElement) -> Timetable:
+        """proces all td tags"""
+
+        time = self.time_processing(row)
+        shift = 0
+        day = 0
+        th = self.XPATH_FIRST_TH(row)[0]
+        timetable = Timetable()
+
+        # text nodes are tails in lxml, bs4 treats them as siblings
+        if th.tail == " span ":
+            shift += 1
+
+        for sibling in th.itersiblings():
+            if isinstance(sibling, etree._Comment):
+                if sibling.text == " span ":
+                    shift += 1
+            elif sibling.tag == "td":
+                if "class" in sibling.attrib:
+                    day -= 1
+                else:
+                    lessons = self.cell_processing(sibling)
+
+                    if lessons is not None:
+                        for lesson in lessons:
+                            lesson.startTime = time
+                            lesson.weekDay = Scraper.WEEK_DICT[day + shift]
+                            timetable.add_lesson(lesson)
+                    day += 1
+
+            if sibling.tail == " span ":
+                shift += 1
+
+        return timetable
+
+    @staticmethod
+    def cell_table_processing(cell: lxml.html.HtmlElement):
+        """processes table inside <td> tag of other table"""
+        table = LxmlScraper.XPATH_FIRST_TABLE(cell)[0]
+
+        trs = LxmlScraper.XPATH_TR(table)
+        count = len(LxmlScraper.XPATH_TD(trs[0]))
+        contents = [[] for _ in range(count)]
+
+        for tr in trs:
+            for i, td in enumerate(LxmlScraper.XPATH_TD(tr)):
+                contents[i].append(LxmlScraper.get_text(td))
+
+        return contents
+
+    def cell_processing(self, cell: lxml.html.HtmlElement) -> list[Lesson]:
+        # skip non info cell
+        text = self.get_text(cell)
+        if not text or text == "---":
+            return None
+
+        hoursSpan = int(cell.get("rowspan", 1))
+        lessons = []
+
+        if not self.XPATH_FIRST_TABLE(cell):
+            content = self.get_contents(cell)
+            lesson = self.get_lesson(content)
+            lesson.hoursSpan = hoursSpan
+            lessons.append(lesson)
+        else:
+            contents = self.cell_table_processing(cell)
+            for content in contents:
+                lesson = self.get_lesson(content)
+                lesson.hoursSpan = hoursSpan
+                lessons.append(lesson)
+
+        return lessons
+
+
+class StreamingScraper(LxmlScraper):
+    """
+    Scraper which parses the page incrementally while it is downloaded or read.
+
+    Every `_DETAILED` table is turned into a `Timetable` as soon as its closing tag
+    is parsed and its subtree is removed right away, so neither the page text nor
+    the whole tree are kept in memory. Tables are always processed serially.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    FINGERPRINT_METHOD = "tree"
+
+    @staticmethod
+    def is_headers_ul(element: lxml.html.HtmlElement) -> bool:
+        parent = element.getparent()
+        if parent is None or element.tag != "ul":
+            return False
+        return not any(ancestor.tag == "ul" for ancestor in element.iterancestors())
+
+    @staticmethod
+    def release_element(element: lxml.html.HtmlElement):
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is None:
+            return
+        while element.getprevious() is not None:
+            del parent[0]
+
+    def iter_timetables(self, chunks, tables_to_collect: int = -1):
+        """
+        Yields timetables in page order from an iterable of HTML bytes.
+
+        `self.headers` is available as soon as the first timetable is yielded.
+        Tables with unchanged fingerprints are skipped.
+        """
+        parser = etree.HTMLPullParser(
+            events=("end",), tag=("ul", "table"), encoding="utf-8"
+        )
+        self.headers = None
+        timetables_id_name = {}
+        collected_id_name = {}
+
+        def handle_events():
+            nonlocal timetables_id_name, collected_id_name
+
+            for _, element in parser.read_events():
+                if self.headers is None:
+                    if self.is_headers_ul(element):
+                        self.headers = self.headers_li_processing(
+                            [li for li in element if li.tag == "li"]
+                        )
+                        timetables_id_name = self.get_first_n_timetables_dict(
+                            self.headers_to_timetables_dict(), tables_to_collect
+                        )
+                        collected_id_name = dict(timetables_id_name)
+                        self.collected_tables = list(timetables_id_name)
+                        self.emit(self.headers)
+                    continue
+
+                table_id = element.get("id", "")
+                if element.tag != "table" or "_DETAILED" not in table_id:
+                    continue
+
+                group_name = timetables_id_name.pop(table_id, None)
+                if group_name is not None:
+                    self.table_fingerprints[table_id] = calculate_hash(
+                        etree.tostring(element, encoding="unicode", with_tail=False)
+                    )
+                    if not self.is_table_changed(table_id):
+                        group_name = None
+
+                if group_name is not None:
+                    log.debug(f"Processing table: '{group_name}', id: '{table_id}'")
+                    try:
+                        yield table_id, self.table_processing(element)
+                    except Exception as e:
+                        self.failed_tables.add(table_id)
+                        log.error(
+                            f"Error processing table (group: '{group_name}', id: '{table_id}'): {e}"
+                        )
+
+                self.release_element(element)
+
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from handle_events()
+
+            if self.headers is not None and not timetables_id_name:
+                break
+
+        parser.close()
+        yield from handle_events()
+
+        if self.headers is None:
+            raise ValueError("Headers list was not found on the page.")
+
+        self.report_changed_groups(collected_id_name)
+
+    def hash_chunks(self, chunks):
+        """Sets `page_fingerprint` to the hash of the consumed part of the page."""
+        page_hash = hashlib.sha256()
+        for chunk in chunks:
+            page_hash.update(chunk)
+            self.page_fingerprint = page_hash.hexdigest()
+            yield chunk
+
+    def collect_streaming_timetables(self, chunks, tables_to_collect: int = -1):
         timetables = {}
+        for table_id, timetable in self.iter_timetables(chunks, tables_to_collect):
+            timetables[table_id] = timetable
+            self.emit(timetable)
+        timetables_id_name = self.get_first_n_timetables_dict(
+            self.headers_to_timetables_dict(), tables_to_collect
+        )
+        timetables = [
+            timetables[table_id]
+            for table_id in timetables_id_name
+            if table_id in timetables
+        ]
+
+        amount_parsed = len(timetables)
+        amount_not_parsed = len(self.failed_tables)
+        count_parsed_timetables(timetables, amount_not_parsed, self.PAGE)
+
+        log.info(f"{amount_parsed} tables have been parsed.")
+        if amount_not_parsed:
+            log.error(f"{amount_not_parsed} tables weren't been parsed.")
 
         return timetables
 
     def get_timetables_from_webpage(self, page_url, tables_to_collect: int = -1):
-
         if ".pdf" in page_url:
-            filename = download_pdf(page_url)
-            timetables = self.pdf_processing(filename)
-        else:
-            log.info(f"Download data from {page_url}")
-            response = requests.get(page_url)
-            response.encoding = "utf-8"
-            timetable_page_text = response.text
+            return super().get_timetables_from_webpage(page_url, tables_to_collect)
+
+        log.info(f"Download and process data from {page_url}")
+        self.fetcher = self.fetcher or Fetcher()
+        start_time = time.perf_counter()
+        with self.fetcher.get_stream(page_url) as response:
+            chunks = response.iter_content(chunk_size=self.CHUNK_SIZE)
+            result = self.get_timetables_from_chunks(
+                count_fetched_bytes(chunks, page_url), tables_to_collect
+            )
+        metrics.set(
+            "parser_fetch_seconds", time.perf_counter() - start_time, url=page_url
+        )
+
+        return result
+
+    def get_timetables_from_file(self, file_path, tables_to_collect: int = -1):
+        with open(file_path, "rb") as f:
+            return self.get_timetables_from_chunks(
+                iter(lambda: f.read(self.CHUNK_SIZE), b""), tables_to_collect
+            )
+
+    def get_timetables_from_text(
+        self, timetable_page_text: str, tables_to_collect: int = -1, source=""
+    ):
+        page = timetable_page_text.encode()
+        chunks = (
+            page[i : i + self.CHUNK_SIZE] for i in range(0, len(page), self.CHUNK_SIZE)
+        )
+        return self.get_timetables_from_chunks(chunks, tables_to_collect)
+
+    def get_timetables_from_page(self, page: FetchResult, tables_to_collect: int = -1):
+        timetable_page_text, page.text = page.text, None
+
+        return self.get_timetables_from_text(timetable_page_text, tables_to_collect)
 
-            log.info(f"Making soup from {page_url}...")
-            self.timetable_page_soup = BeautifulSoup(timetable_page_text, "lxml")
-            log.info(f"Start processing {page_url}...")
-            self.headers = self.headers_processing(self.timetable_page_soup)
-            timetables = self.collect_timetables(tables_to_collect)
+    def get_timetables_from_chunks(self, chunks, tables_to_collect: int = -1):
+        """`chunks` is an iterable of HTML bytes, it's consumed in this thread."""
+        with metrics.stage("streaming_processing", page=self.PAGE):
+            timetables = self.collect_streaming_timetables(
+                self.hash_chunks(chunks), tables_to_collect
+            )
 
         return timetables, self.headers
 
+
+def count_parsed_timetables(
+    timetables: list[Timetable], amount_not_parsed: int, page="groups"
+):
+    metrics.inc("parser_tables_parsed_total", len(timetables), page=page)
+    metrics.inc("parser_tables_failed_total", amount_not_parsed, page=page)
+    metrics.inc(
+        "parser_lessons_total",
+        sum(len(timetable) for timetable in timetables),
+        page=page,
+    )
+
+
+SCRAPERS = {
+    "bs4": Scraper,
+    "lxml": LxmlScraper,
+    "lxml-stream": StreamingScraper,
+}
+
+
+class TeachersPageMixin:
+    """
+    Parses the TAG_STRONG_TEACHERS page, which has the layout of the groups page
+    with a table per professor: the table header is the professor and cells
+    name the group in place of the professor.
+
+    Timetables are keyed by the professor, lessons get the same fields as
+    lessons of the groups page.
+    """
+
+    PAGE = "teachers"
+
+    def subgroup_pattern(self) -> str:
+        return r"\.(\d+-\d+)"
+
+    def row_collecting(self, table) -> Timetable:
+        timetable = super().row_collecting(table)
+        store = timetable.store
+        store.group, store.professor = store.professor, store.group
+
+        return timetable
+
+
+class TeacherScraper(TeachersPageMixin, Scraper):
+    pass
+
+
+class TeacherLxmlScraper(TeachersPageMixin, LxmlScraper):
+    pass
+
+
+class TeacherStreamingScraper(TeachersPageMixin, StreamingScraper):
+    pass
+
+
+TEACHER_SCRAPERS = {
+    "bs4": TeacherScraper,
+    "lxml": TeacherLxmlScraper,
+    "lxml-stream": TeacherStreamingScraper,
+}
+
+
+class PdfScraper:
+    """
+    Turns PDF timetables into the same timetables and headers as the HTML pages.
+
+    Tables are extracted by tabula in page ranges on `workers` threads (every
+    range is a separate JVM call), the extracted rows are cached in `cache_dir`
+    by SHA-256 of the PDF, so an unchanged PDF is never extracted again.
+    Rows have the columns group, subject, lector, date, time, room;
+    a row without the room is shifted by a merged group cell.
+    """
+
+    PAGE = "pdf"
+    COLUMNS = ["group", "subject", "lector", "date", "time", "room"]
+    WEEK_DAYS = {
+        "ორშაბათი": "Mon",
+        "სამშაბათი": "Tue",
+        "ოთხშაბათი": "Wed",
+        "ხუთშაბათი": "Thu",
+        "პარასკევი": "Fri",
+        "შაბათი": "Sat",
+        "კვირა": "Sun",
+        "понедельник": "Mon",
+        "вторник": "Tue",
+        "среда": "Wed",
+        "четверг": "Thu",
+        "пятница": "Fri",
+        "суббота": "Sat",
+        "воскресенье": "Sun",
+    }
+    DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d.%m.%y")
+
+    def __init__(self, title=None, cache_dir=PDF_DIR, workers=PDF_WORKERS):
+        # PDFs don't list pathways, groups are put under the title of the link
+        self.title = title
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.headers = None
+
+    def cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def load_cached_rows(self, digest: str) -> list[list]:
+        try:
+            with open(self.cache_path(digest), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_cached_rows(self, digest: str, rows: list[list]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.cache_path(digest)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path(digest))
+
+    @staticmethod
+    def count_pages(data: bytes) -> int:
+        """Page count from the page tree, 0 if it's inside compressed streams."""
+        counts = re.findall(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)", data)
+        if counts:
+            return max(int(count) for count in counts)
+        return len(re.findall(rb"/Type\s*/Page\b", data))
+
+    def page_ranges(self, pages: int) -> list[str]:
+        if pages <= 1 or self.workers == 1:
+            return ["all"]
+        size = math.ceil(pages / self.workers)
+        return [
+            f"{start}-{min(start + size - 1, pages)}"
+            for start in range(1, pages + 1, size)
+        ]
+
+    @staticmethod
+    def read_tables(filename: str, pages: str) -> list:
+        return read_pdf(
+            filename,
+            pages=pages,
+            output_format="dataframe",
+            multiple_tables=True,
+            lattice=True,
+            silent=True,
+        )
+
+    def extract_rows(self, filename: str, data: bytes) -> list[list]:
+        ranges = self.page_ranges(self.count_pages(data))
+        log.info(f"Extracting tables from {filename} (pages: {', '.join(ranges)})")
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            results = executor.map(self.read_tables, [filename] * len(ranges), ranges)
+            tables = [table for range_tables in results for table in range_tables]
+
+        rows = []
+        for table in tables:
+            if table.shape[1] != len(self.COLUMNS):
+                log.debug(
+                    f"Skipping a table with {table.shape[1]} columns in {filename}"
+                )
+                continue
+            # the header row of a table is its columns
+            rows.append([str(column) for column in table.columns])
+            rows.extend(table.values.tolist())
+
+        return [[self.clean_cell(cell) for cell in row] for row in rows]
+
+    def get_rows(
+        self, filename: str, data: bytes = None, digest: str = None
+    ) -> list[list]:
+        """A known `digest` of the file finds cached rows without reading it."""
+        if digest is None:
+            if data is None:
+                with open(filename, "rb") as f:
+                    data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+
+        rows = self.load_cached_rows(digest)
+        if rows is not None:
+            log.info(f"{filename} has been extracted before, using cached tables.")
+            return rows
+
+        if data is None:
+            with open(filename, "rb") as f:
+                data = f.read()
+
+        with metrics.stage("pdf_extraction", page=self.PAGE):
+            rows = self.extract_rows(filename, data)
+        self.save_cached_rows(digest, rows)
+
+        return rows
+
+    @staticmethod
+    def clean_cell(cell):
+        if cell is None or isinstance(cell, float) and math.isnan(cell):
+            return None
+        cell = " ".join(str(cell).split())
+        return cell or None
+
+    def parse_week_day(self, value: str) -> str:
+        day = value.strip().lower()
+        if day in self.WEEK_DAYS:
+            return self.WEEK_DAYS[day]
+        if day[:3].capitalize() in ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"):
+            return day[:3].capitalize()
+
+        for date_format in self.DATE_FORMATS:
+            try:
+                return datetime.strptime(day, date_format).strftime("%a")
+            except ValueError:
+                continue
+
+        raise ValueError(f"Unknown week day: {value}")
+
+    @staticmethod
+    def parse_time(value: str) -> tuple[str, int]:
+        """ "09:00-10:50" -> ("09:00:00", 2), "9.00" -> ("09:00:00", 1)."""
+        times = [
+            int(hours) * 60 + int(minutes)
+            for hours, minutes in re.findall(r"(\d{1,2})[:.](\d{2})", value)
+        ]
+        if not times:
+            raise ValueError(f"Unknown time: {value}")
+
+        hours_span = 1
+        if len(times) > 1 and times[1] > times[0]:
+            hours_span = math.ceil((times[1] - times[0]) / 60)
+
+        return minutes_to_time(times[0]), hours_span
+
+    def row_to_lesson(self, row: list) -> Lesson:
+        group, subject, professor, week_day, time, classroom = row
+
+        subgroup = None
+        match = re.fullmatch(r"(.+?)\.(\d+-\d+)", group)
+        if match:
+            group, subgroup = match.groups()
+
+        try:
+            subjectName, lessonType = Scraper.separate_subjectName(subject)
+        except IndexError:
+            subjectName, lessonType = subject, None
+
+        startTime, hoursSpan = self.parse_time(time)
+        return Lesson(
+            subjectName,
+            group,
+            subgroup,
+            lessonType,
+            professor,
+            classroom,
+            self.parse_week_day(week_day),
+            startTime,
+            hoursSpan,
+        )
+
+    def rows_to_timetables(self, rows: list[list], source="") -> list[Timetable]:
+        timetables = {}
+        previous = [None] * len(self.COLUMNS)
+        amount_not_parsed = 0
+
+        for row in rows:
+            if row[-1] is None and row[0] is not None:
+                row = [None] + row[:-1]
+            # merged cells of the group and the day are empty in next rows
+            row = [
+                cell if cell is not None or i not in (0, 3) else previous[i]
+                for i, cell in enumerate(row)
+            ]
+            previous = row
+
+            if row[0] is None or row[1] is None or row[4] is None:
+                continue
+            try:
+                lesson = self.row_to_lesson(row)
+            except ValueError as e:
+                # header rows of every page end up here too
+                log.debug(f"Row of {source} skipped: {row}: {e}")
+                amount_not_parsed += 1
+                continue
+
+            if lesson.group not in timetables:
+                timetables[lesson.group] = Timetable(lesson.group)
+            timetables[lesson.group].add_lesson(lesson)
+
+        timetables = list(timetables.values())
+        for timetable in timetables:
+            timetable.combine_common_lessons()
+
+        self.headers = {
+            None: {
+                self.title
+                or source: {
+                    f"{index}_PDF": timetable.group
+                    for index, timetable in enumerate(timetables)
+                }
+            }
+        }
+        count_parsed_timetables(timetables, 0, self.PAGE)
+        log.info(
+            f"{len(timetables)} groups have been parsed from {source}, "
+            f"{amount_not_parsed} rows skipped."
+        )
+
+        return timetables
+
     def get_timetables_from_file(self, file_path, tables_to_collect: int = -1):
-        with open(file_path, "r", encoding="utf-8") as f:
-            timetable_page_text = f.read()
+        return self.get_timetables_from_pdf(
+            file_path, tables_to_collect=tables_to_collect
+        )
 
-        self.timetable_page_soup = BeautifulSoup(timetable_page_text, "lxml")
-        self.headers = self.headers_processing(self.timetable_page_soup)
-        timetables = self.collect_timetables(tables_to_collect)
+    def get_timetables_from_pdf(
+        self,
+        file_path: str,
+        data: bytes = None,
+        tables_to_collect: int = -1,
+        digest: str = None,
+    ):
+        rows = self.get_rows(file_path, data, digest)
+        timetables = self.rows_to_timetables(rows, file_path)
+        if tables_to_collect > 0:
+            timetables = timetables[:tables_to_collect]
 
         return timetables, self.headers
 
 
+def normalize_professor(professor: str) -> str:
+    return " ".join(professor.split()).lower() if professor else ""
+
+
+def lesson_hours(timetable: Timetable, professor: str = None):
+    """Yields (professor, group, weekDay, minutes) of every hour of the lessons."""
+    store = timetable.store
+    decode = store.pool.decode
+    columns = zip(
+        store.professor, store.group, store.weekDay, store.startTime, store.hoursSpan
+    )
+    for professor_code, group_code, day_code, start_time, hours_span in columns:
+        name = normalize_professor(professor or decode(professor_code))
+        if not name or start_time == NO_START_TIME:
+            continue
+        group, week_day = decode(group_code), decode(day_code)
+        for hour in range(hours_span):
+            yield name, group, week_day, start_time + hour * 60
+
+
+def cross_check_teachers(
+    group_timetables: list[Timetable], teacher_timetables: list[Timetable]
+) -> dict:
+    """
+    Compares lesson hours of the groups page with the teachers page.
+
+    Only groups parsed in this run and professors present on the teachers
+    page are compared, mismatches are logged as warnings.
+    """
+    groups = {timetable.group for timetable in group_timetables}
+    professors = {
+        normalize_professor(timetable.group) for timetable in teacher_timetables
+    }
+
+    group_hours = {
+        hour
+        for timetable in group_timetables
+        for hour in lesson_hours(timetable)
+        if hour[0] in professors
+    }
+    teacher_hours = {
+        hour
+        for timetable in teacher_timetables
+        for hour in lesson_hours(timetable, timetable.group)
+        if hour[1] in groups
+    }
+
+    only_in_groups = sorted(group_hours - teacher_hours)
+    only_in_teachers = sorted(teacher_hours - group_hours)
+    report = {
+        "matched": len(group_hours & teacher_hours),
+        "only_in_groups": len(only_in_groups),
+        "only_in_teachers": len(only_in_teachers),
+    }
+    for name, value in report.items():
+        metrics.set("parser_teachers_cross_check_hours", value, result=name)
+
+    log.info(f"Teachers cross-check: {report}")
+    if only_in_groups:
+        log.warning(
+            f"{len(only_in_groups)} lesson hours of the groups page are missing "
+            f"on the teachers page, e.g. {only_in_groups[:5]}"
+        )
+    if only_in_teachers:
+        log.warning(
+            f"{len(only_in_teachers)} lesson hours of the teachers page are missing "
+            f"on the groups page, e.g. {only_in_teachers[:5]}"
+        )
+
+    return report
+
+
+def table_html_processing(
+    table_html: str, scraper_class=Scraper
+) -> tuple[Timetable, str]:
+    """Process pool worker: parses one table from its HTML fragment."""
+    try:
+        table = scraper_class.table_from_html(table_html)
+        return scraper_class(workers=1).table_processing(table), None
+    except Exception as e:
+        return None, str(e)
+
+
 def measure_execution_time(func):
     start_time = time.time()
     result = func()
     end_time = time.time()
-    print(f"Execution time of {func.__name__}: {end_time - start_time} seconds")
+    log.debug(f"Execution time of {func.__name__}: {end_time - start_time} seconds")
     return result
 
 
@@ -759,66 +1496,104 @@ def save_timetables_to_json(timetables: list[Timetable], filename="timetables.js
     log.info(f"Timetables saved to {filename}")
 
 
-def check_website_for_changes(webpage_text: str):
-    current_hash = calculate_hash(webpage_text)
-    prev_hash = read_hash_from_file()
+TABLE_TAG_PATTERN = re.compile(r"<(/?)table\b([^>]*)>", re.IGNORECASE)
+TABLE_ID_PATTERN = re.compile(r"""\bid\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
 
-    if prev_hash is None:
-        log.info("Hash file not found. Creating a new one.")
-        save_hash_to_file(current_hash)
-        return True
-    elif current_hash != prev_hash:
-        log.info("Website content has changed!")
-        save_hash_to_file(current_hash)
-        return True
-    else:
-        log.info("Website content has not changed. Aborting...")
-        return False
 
+def split_raw_tables(page_text: str) -> dict[str, str]:
+    """
+    Returns raw HTML of every top-level `_DETAILED` table without parsing the page.
 
-# FIXME
-def download_pdf(timetable_link):
-    filename = timetable_option.split("/")[1]
-    filename = filename.replace(" ", "_")
-    filename = f"{filename}.pdf"
+    Nested tables inside cells are kept inside their parent table.
+    """
+    tables = {}
+    depth = 0
+    start = table_id = None
 
-    if os.path.exists(filename):
-        print("Timetable is already downloaded.")
-    else:
-        print("Timetable is in PDF format. Downloading...")
-        response = requests.get(timetable_link)
+    for match in TABLE_TAG_PATTERN.finditer(page_text):
+        closing, attrs = match.groups()
 
-        pdf = open(filename, "wb")
-        pdf.write(response.content)
-        pdf.close()
+        if not closing:
+            if depth == 0:
+                start = match.start()
+                id_match = TABLE_ID_PATTERN.search(attrs)
+                table_id = id_match.group(1) if id_match else None
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0 and table_id and "_DETAILED" in table_id:
+                tables[table_id] = page_text[start : match.end()]
 
-    return filename
+    return tables
 
 
-def calculate_hash(content):
-    sha256_hash = hashlib.sha256()
-    sha256_hash.update(content.encode())
-    return sha256_hash.hexdigest()
+def calculate_table_fingerprints(page_text: str) -> dict[str, str]:
+    return {
+        table_id: calculate_hash(table_html)
+        for table_id, table_html in split_raw_tables(page_text).items()
+    }
 
 
-def read_hash_from_file(filename="hash.txt"):
+def load_table_fingerprints(method: str, filename=TABLE_FINGERPRINTS_FILE):
     try:
-        with open(filename, "r") as file:
-            return file.read().strip()
+        with open(filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
     except FileNotFoundError:
+        log.info("Table fingerprints file not found.")
         return None
 
+    if data["method"] != method:
+        log.info("Table fingerprints were calculated by other engine.")
+        return None
+
+    return data["tables"]
 
-# FIXME: finish it later
-def send_hash_outside_the_docker(hash_value):
-    print(hash_value)
 
+def save_table_fingerprints(
+    fingerprints: dict[str, str], method: str, filename=TABLE_FINGERPRINTS_FILE
+):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump({"method": method, "tables": fingerprints}, f)
+    log.info(f"Table fingerprints saved to {filename}")
 
-def save_hash_to_file(hash_value, filename="hash.txt"):
-    path = os.path.join(os.getcwd(), filename)
-    log.info(f"Saving hash to file: {path}")
-    with open(filename, "w") as file:
-        file.write(hash_value)
+
+def discard_table_fingerprints(filename=TABLE_FINGERPRINTS_FILE):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload_state():
+    """REST is partly updated, the next run sends all tables instead of a diff."""
+    discard_sync_state()
+    discard_table_fingerprints()
+
+
+def check_website_for_changes(fetch_result: FetchResult):
+    if fetch_result.changed:
+        log.info("Website content has changed!")
+        return True
+    else:
+        log.info("Website content has not changed. Aborting...")
+        return False
+
+
+def download_pdf(timetable_link, fetcher: Fetcher = None, directory=PDF_DIR) -> str:
+    """Downloads a PDF into `directory` under the name from the link."""
+    fetcher = fetcher or Fetcher()
+    filename = unquote(os.path.basename(urlparse(timetable_link).path))
+    filename = os.path.join(directory, filename.replace(" ", "_"))
+    os.makedirs(directory, exist_ok=True)
+
+    log.info(f"Timetable is in PDF format. Downloading {timetable_link}...")
+    with fetcher.get_stream(timetable_link) as response:
+        with open(f"{filename}.tmp", "wb") as f:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    os.replace(f"{filename}.tmp", filename)
+
+    return filename
 
 
 def calc_max_length_headers(headers: dict[list[dict]]):
@@ -871,32 +1646,312 @@ def calc_max_length_timetables(timetables):
     return max_length
 
 
-async def send_data_to_rest(timetables: list[Timetable], headers: dict[list[dict]]):
-    log.info("Sending pathways, groups and sessons to REST API...")
-    async with Schedule_Service_API() as api:
-        await api.send_data_to_rest(timetables, headers)
+async def send_data_to_rest(
+    timetables: list[Timetable],
+    headers: dict[list[dict]],
+    previous_state=None,
+    api: Schedule_Service_API = None,
+    resume=False,
+) -> dict:
+    """
+    Sends only changes if `previous_state` of diff sync is given.
+
+    Full uploads are journaled, `resume` continues an interrupted upload
+    of the same timetables.
+    """
+    if api is None:
+        async with Schedule_Service_API() as api:
+            return await send_data_to_rest(
+                timetables, headers, previous_state, api, resume
+            )
 
+    start_time = time.perf_counter()
+    api.reset_counters()
 
-async def main():
-    log.info("Starting the program...")
-    start_time = time.time()
-    leqtori = Leqtori()
+    if previous_state is None:
+        log.info("Sending pathways, groups and sessons to REST API...")
+        with UploadJournal() as journal:
+            resumed = journal.start(timetables_version(timetables, headers), resume)
+            api.journal = journal
+            try:
+                if resumed:
+                    await api.reconcile_journal()
+                state = await api.send_data_to_rest(
+                    timetables, headers, recreate=not resumed
+                )
+            finally:
+                api.journal = None
+            if not api.failed:
+                journal.finish()
+    else:
+        log.info("Sending changes of pathways, groups and lessons to REST API...")
+        try:
+            state = await api.send_data_diff(timetables, headers, previous_state)
+        except BaseException:
+            discard_upload_state()
+            raise
 
-    if FORCE_TO_COLLECT == "true" or check_website_for_changes(leqtori.leqtori_text):
-        scraper = Scraper()
-        page_url = leqtori.get_page_url_from_leqtori(TAG_STRONG_GROUPS)
-        timetables, headers = scraper.get_timetables_from_webpage(
-            page_url, N_FIRST_TABLES_TO_COLLECT
-        )
+    return finish_upload(api, state, time.perf_counter() - start_time)
+
+
+def finish_upload(api: Schedule_Service_API, state: dict, upload_time: float) -> dict:
+    count_uploaded_records(api, upload_time)
+
+    if api.failed:
+        # the data in REST is unknown now, the next run has to send everything
+        log.error(f"{len(api.failed)} records NOT sent to REST, sync state discarded.")
+        discard_sync_state()
+        return None
 
-        await send_data_to_rest(timetables, headers)
+    save_sync_state(state)
+    return state
+
+
+async def crawl_and_send(
+    crawler: "Crawler",
+    leqtori: Leqtori,
+    previous_state=None,
+    api: Schedule_Service_API = None,
+):
+    """
+    Crawls the pages and uploads the groups page while it is parsed.
+
+    Groups of the other pages are uploaded when the crawl is finished.
+    A pipelined full upload is journaled too, its version is set as soon
+    as parsing is finished, so it can be resumed by a batch upload. An
+    upload interrupted while parsing can't be resumed. Once the upload has
+    started, any error discards the sync state and table fingerprints.
+
+    Returns:
+        tuple: timetables, headers, professor timetables and the sync state.
+    """
+    if api is None:
+        async with Schedule_Service_API() as api:
+            return await crawl_and_send(crawler, leqtori, previous_state, api)
+
+    start_time = time.perf_counter()
+    api.reset_counters()
+    channel = TimetableChannel()
+
+    with UploadJournal() as journal:
+        if previous_state is None:
+            log.info(
+                "Sending pathways, groups and lessons to REST API while parsing..."
+            )
+            journal.start(UploadJournal.UNKNOWN_VERSION, resume=False)
+            api.journal = journal
+        else:
+            log.info("Sending changes to REST API while parsing...")
+
+        try:
+            async with UploadPipeline(api, previous_state) as pipeline:
+                try:
+                    consumer = asyncio.create_task(pipeline.consume(channel))
+                    try:
+                        timetables, headers, teachers = await crawler.crawl(
+                            leqtori, channel
+                        )
+                    except BaseException:
+                        channel.cancel()
+                        if consumer.done() and not consumer.cancelled():
+                            # the upload failed first, parsing was cancelled by it
+                            consumer.result()
+                        consumer.cancel()
+                        raise
+                    await consumer
+
+                    if previous_state is None:
+                        journal.set_version(timetables_version(timetables, headers))
+                    await pipeline.add_headers(headers)
+                    for timetable in timetables:
+                        await pipeline.add_timetable(timetable)
+                    state = await pipeline.finish(timetables, headers)
+                except BaseException:
+                    discard_upload_state()
+                    raise
+        finally:
+            api.journal = None
+
+        if previous_state is None and not api.failed:
+            journal.finish()
+
+    state = finish_upload(api, state, time.perf_counter() - start_time)
+    return timetables, headers, teachers, state
+
+
+def count_uploaded_records(api: Schedule_Service_API, upload_time: float):
+    for kind in ("pathways", "groups", "lessons"):
+        metrics.set(f"parser_upload_{kind}_amount", getattr(api, f"amount_{kind}"))
+        metrics.set(f"parser_upload_{kind}_sent", getattr(api, f"sent_{kind}"))
+    metrics.set("parser_upload_lessons_updated", api.updated_lessons)
+    metrics.set("parser_upload_lessons_deleted", api.deleted_lessons)
+
+    records = (
+        api.sent_pathways
+        + api.sent_groups
+        + api.sent_lessons
+        + api.updated_lessons
+        + api.deleted_lessons
+    )
+    for failure in api.failed:
+        metrics.inc("parser_upload_failed_records_total", endpoint=failure["endpoint"])
+    metrics.set("parser_upload_concurrency_limit", int(api.limiter.limit))
+    metrics.set("parser_upload_concurrency_decreases", api.limiter.decreases)
+    metrics.set("parser_upload_seconds", upload_time)
+    metrics.set("parser_upload_records_per_second", records / max(upload_time, 1e-9))
+
+
+class ParserContext:
+    """
+    Everything a run reuses: HTTP sessions, sync state and table fingerprints.
+
+    A one-shot run loads it from files, the daemon keeps it in memory
+    between runs (files are still written to survive restarts).
+    """
+
+    def __init__(self, api: Schedule_Service_API = None, resume=False):
+        self.fetcher = AsyncFetcher()
+        self.api = api
+        self.resume = resume
+        self.scraper_class = SCRAPERS[PARSER_ENGINE]
+        self.teacher_scraper_class = TEACHER_SCRAPERS[PARSER_ENGINE]
+        self.pdf_scraper_class = PdfScraper
+        self.sync_state = load_sync_state() if SYNC_MODE == "diff" else None
+        # unchanged tables can be skipped only if their lessons are already in REST
+        if self.sync_state is not None:
+            self.fingerprints = load_table_fingerprints(
+                self.scraper_class.FINGERPRINT_METHOD
+            )
+        else:
+            self.fingerprints = None
+
+    def reset(self):
+        """Forgets everything about REST, the next run sends all data."""
+        self.fetcher.discard_metadata()
+        self.sync_state = None
+        self.fingerprints = None
+        discard_sync_state()
+
+    async def close(self):
+        await self.fetcher.close()
+
+
+async def run_once(context: ParserContext):
+    log.info("Starting the program...")
+    start_time = time.time()
+    metrics.reset()
+    # strings of the previous run are freed with its timetables
+    reset_string_pool()
+    try:
+        await collect_and_send(context)
+        metrics.set("parser_run_success", 1)
+    except BaseException:
+        metrics.set("parser_run_success", 0)
+        raise
+    finally:
+        execute_time = time.time() - start_time
+        metrics.set("parser_run_seconds", execute_time)
+        metrics.set("parser_run_timestamp_seconds", time.time())
+        metrics.export()
 
-    execute_time = time.time() - start_time
     hours, remainder = divmod(execute_time, 3600)
     minutes, seconds = divmod(remainder, 60)
     log.info(f"Execution time: {int(hours):02}:{int(minutes):02}:{seconds:06.3f}")
 
 
+def must_collect(context: ParserContext) -> bool:
+    """The page is collected even if it's unchanged when REST may lack its data."""
+    if FORCE_TO_COLLECT == "true":
+        return True
+    if context.resume:
+        log.info("Resuming the interrupted upload.")
+        return True
+    if not os.path.exists(SYNC_STATE_FILE):
+        log.info("The last upload has not finished. Collecting the data again...")
+        return True
+    return False
+
+
+async def collect_and_send(context: ParserContext):
+    # validators of a failed run are dropped, the next run sees the page as changed
+    context.fetcher.discard_metadata()
+    leqtori_page = await context.fetcher.fetch(URL_LEQTORI, keep_body=True)
+
+    collect = must_collect(context)
+    if not collect and not check_website_for_changes(leqtori_page):
+        context.fetcher.commit_metadata()
+        return
+
+    leqtori = Leqtori(fetcher=context.fetcher, leqtori_page=leqtori_page)
+    # pages of a forced collection are parsed even if they haven't changed
+    crawler = Crawler(context, conditional=not collect)
+    pipeline = UPLOAD_PIPELINE == "true" and BULK_UPLOAD != "true"
+    if pipeline and context.resume:
+        # resuming needs the version of the whole upload before it starts
+        log.warning("The upload is resumed after parsing, UPLOAD_PIPELINE is ignored.")
+        pipeline = False
+    if pipeline:
+        timetables, headers, teachers, state = await crawl_and_send(
+            crawler, leqtori, context.sync_state, context.api
+        )
+    else:
+        timetables, headers, teachers = await crawler.crawl(leqtori)
+
+    if teachers is not None:
+        cross_check_teachers(timetables, teachers)
+    if SNAPSHOT_DIR:
+        await asyncio.to_thread(
+            SnapshotArchive().save,
+            timetables,
+            headers,
+            crawler.page_fingerprint,
+            teachers,
+        )
+
+    if not pipeline:
+        state = await send_data_to_rest(
+            timetables, headers, context.sync_state, context.api, context.resume
+        )
+    fingerprints = crawler.updated_fingerprints()
+    save_table_fingerprints(fingerprints, context.scraper_class.FINGERPRINT_METHOD)
+    if state is not None:
+        context.fetcher.commit_metadata()
+        # the interrupted upload is finished, later daemon runs start anew
+        context.resume = False
+
+    if SYNC_MODE == "diff":
+        context.sync_state = state
+        # without sync state the next run sends all tables
+        if state is not None:
+            context.fingerprints = fingerprints
+        else:
+            context.fingerprints = None
+
+
+async def main(resume=False):
+    context = ParserContext(resume=resume)
+    try:
+        await run_once(context)
+    finally:
+        await context.close()
+
+
+async def replay_snapshot(snapshot: str, resume=False):
+    """Uploads an archived snapshot without scraping, e.g. to roll back."""
+    archive = SnapshotArchive()
+    snapshot = archive.resolve(snapshot)
+    timetables, headers = archive.load(snapshot)
+    log.info(f"Replaying {snapshot} ({len(timetables)} groups)...")
+
+    metrics.reset()
+    previous_state = load_sync_state() if SYNC_MODE == "diff" else None
+    await send_data_to_rest(timetables, headers, previous_state, resume=resume)
+    metrics.export()
+
+    # REST doesn't match the fingerprints of the latest page anymore
+    save_table_fingerprints({}, SCRAPERS[PARSER_ENGINE].FINGERPRINT_METHOD)
+
+
 if __name__ == "__main__":
     log_level = os.environ["LOG_LEVEL"]
     log_level = getattr(log, log_level.upper())
@@ -905,4 +1960,65 @@ if __name__ == "__main__":
         format="%(asctime)s: %(levelname)s: %(message)s",
     )
 
-    asyncio.run(main())
+    arg_parser = argparse.ArgumentParser(description="Leqtori timetable parser")
+    arg_parser.add_argument(
+        "--daemon",
+        action="store_true",
+        default=DAEMON == "true",
+        help="keep running and refresh the data on schedule and on trigger",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=UPLOAD_RESUME == "true",
+        help="continue an interrupted full upload of the same timetables",
+    )
+    arg_parser.add_argument(
+        "--replay",
+        metavar="SNAPSHOT",
+        help='upload an archived snapshot (path, file name or "latest") and exit',
+    )
+    arg_parser.add_argument(
+        "--list-snapshots", action="store_true", help="print archived snapshots"
+    )
+    arg_parser.add_argument(
+        "--diff-snapshots",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="print changed groups between two snapshots",
+    )
+    arg_parser.add_argument(
+        "--teacher",
+        metavar="PROFESSOR",
+        help="print lessons of a professor from the latest snapshot",
+    )
+    arg_parser.add_argument(
+        "--prune-snapshots",
+        type=int,
+        metavar="KEEP",
+        help="remove all snapshots except the KEEP newest ones",
+    )
+    args = arg_parser.parse_args()
+
+    if args.list_snapshots:
+        archive = SnapshotArchive()
+        for snapshot in archive.snapshots():
+            meta = archive.load_meta(snapshot)
+            print(
+                f"{snapshot} {meta['version'][:12]} {len(meta['groups'])} groups "
+                f"{len(meta.get('teachers', {}))} teachers"
+            )
+    elif args.diff_snapshots:
+        diff = SnapshotArchive().diff(*args.diff_snapshots)
+        print(json.dumps(diff, indent=4, ensure_ascii=False))
+    elif args.teacher:
+        timetable = SnapshotArchive().load_teacher("latest", args.teacher)
+        print(json.dumps(timetable.to_dict(), indent=4, ensure_ascii=False))
+    elif args.prune_snapshots is not None:
+        SnapshotArchive().prune(args.prune_snapshots)
+    elif args.replay:
+        asyncio.run(replay_snapshot(args.replay, args.resume))
+    elif args.daemon:
+        asyncio.run(ParserDaemon(run_once, ParserContext, resume=args.resume).serve())
+    else:
+        asyncio.run(main(args.resume))
@@ -0,0 +1,264 @@
+import asyncio
+import logging as log
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_WORKERS
+from rest_client import Schedule_Service_API
+from sync_state import (
+    build_sync_state,
+    diff_lessons,
+    groups_to_send,
+    headers_to_group_pathways,
+    headers_to_tables,
+)
+from timetable import Timetable
+
+
+class TimetableChannel:
+    """
+    Bounded queue from a parsing thread to the event loop.
+
+    The thread puts the headers and then every parsed timetable, `put` blocks
+    while the queue is full. None marks the end of the page.
+    """
+
+    def __init__(self, maxsize=PIPELINE_QUEUE_SIZE):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.cancelled = False
+
+    def put(self, item):
+        """Called from the parsing thread."""
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self.loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except FutureTimeoutError:
+                if self.cancelled:
+                    future.cancel()
+                    raise RuntimeError("Upload has stopped, parsing is cancelled.")
+
+    def cancel(self):
+        """Unblocks and stops the parsing thread, the consumer is gone."""
+        self.cancelled = True
+
+    async def close(self):
+        if not self.cancelled:
+            await self.queue.put(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class UploadPipeline:
+    """
+    Uploads timetables while the page is still being parsed.
+
+    Pathways are sent as soon as the headers arrive. Every timetable becomes
+    a job of a bounded queue served by `workers` tasks: a job creates the
+    group and sends its lessons (full upload) or its changes (diff sync).
+    Both queues are bounded, so the parser is slowed down by a slow REST
+    instead of piling up tasks.
+    """
+
+    def __init__(
+        self,
+        api: Schedule_Service_API,
+        previous_state: dict = None,
+        recreate=True,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        workers=PIPELINE_WORKERS,
+    ):
+        """`recreate` is used by full uploads only, see `send_data_to_rest`."""
+        self.api = api
+        self.previous_state = previous_state
+        self.recreate = recreate
+        self.jobs = asyncio.Queue(queue_size)
+        self.workers_amount = max(1, workers)
+        self.workers = []
+        self.error = None
+
+        self.group_pathways = {}
+        self.pathways = list(previous_state["pathways"]) if previous_state else []
+        self.queued_groups = set()
+        self.sent_groups = set()
+        # full upload: lesson ids of every group, diff sync: the new state
+        self.lesson_ids = {}
+        self.state_groups = dict(previous_state["groups"]) if previous_state else {}
+        self.changed_groups = 0
+
+    async def __aenter__(self):
+        if self.previous_state is None and self.recreate:
+            await self.api.send_timetable_recreate()
+        self.workers = [
+            asyncio.create_task(self.worker()) for _ in range(self.workers_amount)
+        ]
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    async def worker(self):
+        while True:
+            timetable = await self.jobs.get()
+            try:
+                if self.previous_state is None:
+                    await self.send_timetable(timetable)
+                else:
+                    await self.send_timetable_diff(timetable)
+            except Exception as e:
+                self.error = self.error or e
+            finally:
+                self.jobs.task_done()
+
+    async def consume(self, channel: TimetableChannel):
+        """Reads the channel until the end of the page."""
+        try:
+            while (item := await channel.get()) is not None:
+                if isinstance(item, Timetable):
+                    await self.add_timetable(item)
+                else:
+                    await self.add_headers(item)
+        except BaseException:
+            channel.cancel()
+            raise
+
+    async def add_headers(self, headers: dict[str, dict[str, dict]]):
+        group_pathways = headers_to_group_pathways(headers)
+        for group, pathway in group_pathways.items():
+            self.group_pathways.setdefault(group, pathway)
+
+        if self.previous_state is None:
+            # full upload sends every pathway title of the headers
+            new_pathways = [
+                str(pathway_title)
+                for pathways in headers.values()
+                for pathway_title in pathways
+                if str(pathway_title) not in self.pathways
+            ]
+            self.pathways += new_pathways
+            self.api.amount_pathways += len(new_pathways)
+            await self.api.send_all(
+                "/pathways", [{"title": pathway} for pathway in new_pathways]
+            )
+        else:
+            new_pathways = [
+                pathway
+                for pathway in dict.fromkeys(group_pathways.values())
+                if pathway not in self.pathways
+            ]
+            self.pathways += new_pathways
+            self.api.amount_pathways += len(new_pathways)
+            await asyncio.gather(*(self.api.send_pathway(p) for p in new_pathways))
+
+    async def add_timetable(self, timetable: Timetable):
+        if self.error is not None:
+            raise self.error
+        if timetable.group in self.queued_groups:
+            return
+        self.queued_groups.add(timetable.group)
+        await self.jobs.put(timetable)
+
+    async def send_group(self, group: str):
+        pathway = self.group_pathways.get(group)
+        self.sent_groups.add(group)
+        self.api.amount_groups += 1
+        if self.previous_state is None:
+            await self.api.send_all(
+                "/groups", [{"title": group, "pathwayTitle": pathway}]
+            )
+        else:
+            await self.api.send_group(group, pathway)
+
+    async def send_timetable(self, timetable: Timetable):
+        await self.send_group(timetable.group)
+        records = timetable.store.records()
+        self.api.amount_lessons += len(records)
+        self.lesson_ids[timetable.group] = await self.api.send_all("/lessons", records)
+
+    async def send_timetable_diff(self, timetable: Timetable):
+        group = timetable.group
+        prev_groups = self.previous_state["groups"]
+        if group not in prev_groups:
+            if group in self.group_pathways:
+                await self.send_group(group)
+            else:
+                log.warning(f"Group {group} is not listed in headers.")
+
+        prev_lessons = prev_groups.get(group, {"lessons": []})["lessons"]
+        change = diff_lessons(prev_lessons, timetable.store.records())
+        if not (change["create"] or change["update"] or change["delete"]):
+            return
+        await self.send_change(group, change)
+
+    async def send_change(self, group: str, change: dict):
+        self.changed_groups += 1
+        self.api.amount_lessons += len(change["create"])
+
+        tasks = [self.api.delete_lesson(lesson_id) for lesson_id in change["delete"]]
+        tasks += [self.api.update_lesson(i, lesson) for i, lesson in change["update"]]
+        await asyncio.gather(*tasks)
+
+        created_ids = await asyncio.gather(
+            *(self.api.send_lesson(dict(lesson)) for lesson in change["create"])
+        )
+
+        if change["lessons"] is None:
+            self.state_groups.pop(group, None)
+        else:
+            lessons = change["lessons"]
+            lessons += [
+                {"id": i, **lesson} for i, lesson in zip(created_ids, change["create"])
+            ]
+            self.state_groups[group] = {
+                "pathway": self.group_pathways.get(group),
+                "lessons": lessons,
+            }
+
+    async def finish(
+        self, timetables: list[Timetable], headers: dict[str, dict[str, dict]]
+    ) -> dict:
+        """Waits for all jobs, returns the new sync state."""
+        await self.jobs.join()
+        if self.error is not None:
+            raise self.error
+
+        if self.previous_state is None:
+            # groups without parsed timetables are created as in the batch upload
+            group_names = [
+                group
+                for group in groups_to_send(timetables, headers)
+                if group not in self.sent_groups
+            ]
+            await asyncio.gather(*(self.send_group(group) for group in group_names))
+
+            lesson_ids = [
+                lesson_id
+                for timetable in timetables
+                for lesson_id in self.lesson_ids.get(
+                    timetable.group, [None] * len(timetable)
+                )
+            ]
+            log.info("All data successfully sent to REST.")
+            return build_sync_state(timetables, headers, lesson_ids)
+
+        current_groups = {timetable.group for timetable in timetables}
+        for group, prev_group in self.previous_state["groups"].items():
+            if group not in current_groups and group not in self.group_pathways:
+                delete = [lesson["id"] for lesson in prev_group["lessons"]]
+                change = {"lessons": None, "create": [], "update": [], "delete": delete}
+                await self.send_change(group, change)
+
+        log.info(
+            f"Diff sync finished: {self.changed_groups} groups changed, "
+            f"{self.api.sent_lessons} lessons created, {self.api.updated_lessons} "
+            f"updated, {self.api.deleted_lessons} deleted."
+        )
+        return {
+            "pathways": self.pathways,
+            "groups": self.state_groups,
+            "tables": headers_to_tables(headers),
+        }
@@ -0,0 +1,879 @@
+import asyncio
+import collections
+import email.utils
+import json
+import logging as log
+import random
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+
+from config import (
+    BULK_CHUNK_SIZE,
+    BULK_FORMAT,
+    BULK_RETRIES,
+    BULK_UPLOAD,
+    MAX_CONNECTIONS,
+    UPLOAD_CONNECT_TIMEOUT,
+    UPLOAD_KEEPALIVE,
+    UPLOAD_LATENCY_TOLERANCE,
+    UPLOAD_MAX_CONNECTIONS,
+    UPLOAD_MIN_CONNECTIONS,
+    UPLOAD_RETRIES,
+    UPLOAD_TIMEOUT,
+    URL_REST,
+)
+from metrics import get_metrics_trace_config, metrics
+from sync_state import (
+    build_sync_state,
+    diff_timetables,
+    groups_to_send,
+    headers_to_group_pathways,
+    headers_to_tables,
+)
+from timetable import Timetable
+
+
+class BulkReport:
+    __slots__ = ["endpoint", "sent", "chunks", "failed_chunks", "failed", "ids"]
+
+    def __init__(self, endpoint=""):
+        self.endpoint = endpoint
+        self.sent = 0
+        self.chunks = 0
+        self.failed_chunks = 0
+        self.failed = []
+        self.ids = []
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return (
+            f"BulkReport(endpoint={self.endpoint}, sent={self.sent}, "
+            f"chunks={self.chunks}, failed_chunks={self.failed_chunks}, "
+            f"failed={len(self.failed)})"
+        )
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = None, response=None, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.response = response
+        # response headers, e.g. Retry-After
+        self.headers = headers if headers is not None else {}
+
+
+class RetryableUploadError(UploadError):
+    """Timeouts, connection errors, 429 and 5xx: the request can be repeated."""
+
+
+class FatalUploadError(UploadError):
+    """The server rejected the request, repeating it won't help."""
+
+
+RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+def classify_response(
+    status: int, message: str, response=None, headers=None
+) -> UploadError:
+    if status in RETRYABLE_STATUSES:
+        return RetryableUploadError(message, status, response, headers)
+    return FatalUploadError(message, status, response, headers)
+
+
+def parse_retry_after(value: str) -> float | None:
+    """Seconds to wait by a Retry-After header, given in seconds or as an HTTP-date."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit of concurrent REST requests.
+
+    The limit grows by one per `limit` successful requests and is multiplied by
+    `decrease_factor` on 429/5xx responses, connection errors and timeouts, or when
+    the smoothed latency exceeds `latency_tolerance` times the best recent latency.
+    Responses to requests sent before the last decrease don't decrease it again,
+    so one burst of errors cuts the limit once.
+    """
+
+    LATENCY_WINDOW = 500
+    # latencies below this are never considered as congestion
+    MIN_CONGESTED_LATENCY = 0.05
+
+    def __init__(
+        self,
+        initial_limit=MAX_CONNECTIONS,
+        min_limit=UPLOAD_MIN_CONNECTIONS,
+        max_limit=UPLOAD_MAX_CONNECTIONS,
+        latency_tolerance=UPLOAD_LATENCY_TOLERANCE,
+        decrease_factor=0.7,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.condition = asyncio.Condition()
+        self.latencies = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self.smoothed_latency = None
+        self.last_decrease = 0.0
+        self.decreases = 0
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify(max(0, int(self.limit) - self.in_flight))
+
+    def is_congested(self, latency: float) -> bool:
+        self.latencies.append(latency)
+        if self.smoothed_latency is None:
+            self.smoothed_latency = latency
+        else:
+            self.smoothed_latency += 0.2 * (latency - self.smoothed_latency)
+
+        baseline = min(self.latencies)
+        return (
+            self.smoothed_latency > self.MIN_CONGESTED_LATENCY
+            and self.smoothed_latency > baseline * self.latency_tolerance
+        )
+
+    def record(self, start_time: float, latency: float = None, overloaded=False):
+        """Adjusts the limit by the result of a request started at `start_time`."""
+        if latency is not None and self.is_congested(latency):
+            overloaded = True
+
+        if not overloaded:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif start_time > self.last_decrease:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.last_decrease = time.monotonic()
+            self.decreases += 1
+            log.debug(f"Upload concurrency decreased to {int(self.limit)}.")
+
+
+class Schedule_Service_API:
+    amount_pathways = 0
+    amount_groups = 0
+    amount_lessons = 0
+
+    sent_groups = 0
+    sent_pathways = 0
+    sent_lessons = 0
+    updated_lessons = 0
+    deleted_lessons = 0
+
+    BULK_UNSUPPORTED_STATUSES = (404, 405, 501)
+
+    def __init__(
+        self,
+        url_rest=URL_REST,
+        max_connections=MAX_CONNECTIONS,
+        bulk_upload=BULK_UPLOAD == "true",
+        bulk_format=BULK_FORMAT,
+        bulk_chunk_size=BULK_CHUNK_SIZE,
+    ) -> None:
+        """
+        Args:
+            max_connections (int): initial concurrency, it is adapted
+                between UPLOAD_MIN_CONNECTIONS and UPLOAD_MAX_CONNECTIONS.
+        """
+        self.url_rest = url_rest
+        self.limiter = AdaptiveLimiter(max_connections)
+        self.session = self.make_session(self.limiter.max_limit)
+        self.bulk_upload = bulk_upload
+        self.bulk_format = bulk_format
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_supported = {}
+        self.failed = []
+        # set for full uploads, see UploadJournal
+        self.journal = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.session.close()
+
+    def reset_counters(self):
+        """Counters are per run, the daemon reuses one API object."""
+        self.amount_pathways = self.amount_groups = self.amount_lessons = 0
+        self.sent_pathways = self.sent_groups = self.sent_lessons = 0
+        self.updated_lessons = self.deleted_lessons = 0
+        self.failed = []
+
+    @staticmethod
+    def make_session(max_connections: int) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=max_connections,
+            limit_per_host=max_connections,
+            keepalive_timeout=UPLOAD_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=UPLOAD_TIMEOUT, sock_connect=UPLOAD_CONNECT_TIMEOUT
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=[get_metrics_trace_config()],
+        )
+
+    @staticmethod
+    async def read_response(response: aiohttp.ClientResponse):
+        try:
+            return await response.json(content_type=None)
+        except (json.JSONDecodeError, aiohttp.ContentTypeError, UnicodeDecodeError):
+            return await response.text()
+
+    @staticmethod
+    def retry_delay(attempt: int, error: UploadError) -> float:
+        """Retry-After of the response headers or body, exponential backoff otherwise."""
+        if error.status in (429, 503):
+            retry_after = parse_retry_after(error.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after
+            if isinstance(error.response, dict):
+                retry_after = error.response.get("retry_after")
+                if isinstance(retry_after, (int, float)):
+                    return retry_after
+        return 2**attempt * random.uniform(0.5, 1)
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        retries=UPLOAD_RETRIES,
+        expected_statuses=(200,),
+        **kwargs,
+    ):
+        """
+        Sends a request within the adaptive concurrency limit.
+
+        Retryable errors are repeated `retries` times with exponential backoff.
+
+        Returns:
+            tuple: (status, response json or text) for `expected_statuses`.
+
+        Raises:
+            FatalUploadError: the server rejected the request.
+            RetryableUploadError: retries are exhausted.
+        """
+        url = self.url_rest + endpoint
+
+        for attempt in range(retries + 1):
+            async with self.limiter as start_time:
+                try:
+                    async with self.session.request(method, url, **kwargs) as response:
+                        status = response.status
+                        headers = response.headers
+                        body = await self.read_response(response)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    self.limiter.record(start_time, overloaded=True)
+                    error = RetryableUploadError(f"{method} {endpoint}: {e!r}")
+                else:
+                    latency = time.monotonic() - start_time
+                    self.limiter.record(
+                        start_time, latency, overloaded=status in RETRYABLE_STATUSES
+                    )
+                    if status in expected_statuses:
+                        return status, body
+                    error = classify_response(
+                        status, f"{method} {endpoint}: status {status}", body, headers
+                    )
+
+            if isinstance(error, FatalUploadError) or attempt == retries:
+                raise error
+
+            metrics.inc("parser_upload_retries_total", endpoint=endpoint)
+            log.warning(f"{error}, retrying...")
+            await asyncio.sleep(self.retry_delay(attempt, error))
+
+    def acknowledge(self, endpoint: str, record: dict, record_id=None):
+        if self.journal is not None:
+            self.journal.acknowledge(endpoint, record, record_id)
+
+    def adopt_existing(
+        self, endpoint: str, records: list[dict], existing: list[dict], fields=None
+    ):
+        """
+        Acknowledges `records` in doubt which match REST records by `fields`
+        (all fields of the record by default), every REST record is matched once.
+        """
+        acknowledged_ids = self.journal.acknowledged_ids(endpoint)
+        candidates = [
+            item for item in existing if item.get("id") not in acknowledged_ids
+        ]
+
+        for record in records:
+            for index, item in enumerate(candidates):
+                if all(item.get(field) == record[field] for field in fields or record):
+                    self.journal.adopt(endpoint, record, item.get("id"))
+                    del candidates[index]
+                    break
+
+    async def get_group_lessons(self, group: str, group_id: int) -> list[dict]:
+        """Lessons of a group by its week, the endpoint the bot reads."""
+        _, week = await self.request("GET", f"/lessons/groups/{group_id}/week")
+        return [{"group": group, **lesson} for day in week for lesson in day["lessons"]]
+
+    async def reconcile_journal(self):
+        """
+        Looks up records in doubt of a resumed upload in REST.
+
+        Found records are acknowledged with their REST ids, so they are
+        not created twice, the others are sent again. Lessons are read by
+        group weeks, REST can't search lessons by group.
+        """
+        in_doubt = self.journal.in_doubt
+        if not in_doubt:
+            return
+        log.info("Looking up records sent before the upload was interrupted...")
+
+        _, pathways = await self.request("GET", "/pathways")
+        self.adopt_existing("/pathways", in_doubt.get("/pathways", []), pathways)
+
+        pathway_groups = {}
+        if "/groups" in in_doubt or "/lessons" in in_doubt:
+            existing = await asyncio.gather(
+                *(
+                    self.request("GET", "/groups", params={"pathwayId": pathway["id"]})
+                    for pathway in pathways
+                )
+            )
+            pathway_groups = {
+                pathway["title"]: groups
+                for pathway, (_, groups) in zip(pathways, existing)
+            }
+
+        groups = {}
+        for group in in_doubt.get("/groups", []):
+            groups.setdefault(group["pathwayTitle"], []).append(group)
+        for pathway, records in groups.items():
+            if pathway in pathway_groups:
+                self.adopt_existing(
+                    "/groups", records, pathway_groups[pathway], fields=("title",)
+                )
+
+        group_ids = {
+            group["title"]: group["id"]
+            for groups in pathway_groups.values()
+            for group in groups
+        }
+        lessons = {}
+        for lesson in in_doubt.get("/lessons", []):
+            # lessons of groups missing in REST are not there either
+            if lesson["group"] in group_ids:
+                lessons.setdefault(lesson["group"], []).append(lesson)
+        existing = await asyncio.gather(
+            *(self.get_group_lessons(group, group_ids[group]) for group in lessons)
+        )
+        for records, group_lessons in zip(lessons.values(), existing):
+            self.adopt_existing("/lessons", records, group_lessons)
+
+        self.journal.clear_in_doubt()
+
+    def record_failure(self, endpoint: str, record: dict, error: UploadError):
+        log.error(
+            f"{record} NOT sent to {endpoint}: {error}, response: {error.response}"
+        )
+        self.failed.append(
+            {
+                "endpoint": endpoint,
+                "record": record,
+                "status": error.status,
+                "error": str(error),
+            }
+        )
+
+    async def post_group(self, group_name: str, pathway_name: str):
+        group = {"title": group_name, "pathwayTitle": pathway_name}
+        await self.request("POST", "/groups", data=group)
+        self.acknowledge("/groups", group)
+        self.sent_groups += 1
+        log.debug(
+            f"Group {group_name}, {pathway_name} sent to REST. {self.sent_groups}/{self.amount_groups} groups sent."
+        )
+
+    async def send_group(self, group_name: str, pathway_name: str) -> bool:
+        try:
+            await self.post_group(group_name, pathway_name)
+            return True
+        except UploadError as e:
+            group = {"title": group_name, "pathwayTitle": pathway_name}
+            self.record_failure("/groups", group, e)
+            return False
+
+    async def post_pathway(self, pathway: str):
+        pathway = {"title": str(pathway)}
+        await self.request("POST", "/pathways", data=pathway)
+        self.acknowledge("/pathways", pathway)
+        self.sent_pathways += 1
+        log.debug(
+            f"Pathway {pathway['title']} sent to REST. {self.sent_pathways}/{self.amount_pathways} pathways sent."
+        )
+
+    async def send_pathway(self, pathway: str) -> bool:
+        try:
+            await self.post_pathway(pathway)
+            return True
+        except UploadError as e:
+            self.record_failure("/pathways", {"title": str(pathway)}, e)
+            return False
+
+    async def send_timetable_recreate(self):
+        # nothing can be uploaded on top of the old timetable, so errors are raised
+        await self.request("POST", "/timetable/recreate")
+        log.debug("Recreate request sent to REST.")
+
+    async def post_lesson(self, lesson: dict):
+        _, response = await self.request("POST", "/lessons", json=lesson)
+        lesson_id = self.get_response_id(response)
+        self.acknowledge("/lessons", lesson, lesson_id)
+        self.sent_lessons += 1
+        log.debug(
+            f"Group {lesson['group']} lesson sent to REST. {self.sent_lessons}/{self.amount_lessons} lessons sent."
+        )
+        return lesson_id
+
+    async def send_lesson(self, lesson: dict):
+        """Returns id of the created lesson, None if it's not sent."""
+        try:
+            return await self.post_lesson(lesson)
+        except UploadError as e:
+            self.record_failure("/lessons", lesson, e)
+            return None
+
+    @staticmethod
+    def get_response_id(response):
+        if isinstance(response, dict):
+            return response.get("id")
+        return None
+
+    async def update_lesson(self, lesson_id: int, lesson: dict) -> bool:
+        try:
+            await self.request("PUT", f"/lessons/{lesson_id}", json=lesson)
+        except UploadError as e:
+            self.record_failure(f"/lessons/{lesson_id}", lesson, e)
+            return False
+
+        self.updated_lessons += 1
+        log.debug(f"Lesson {lesson_id} of group {lesson['group']} updated.")
+        return True
+
+    async def delete_lesson(self, lesson_id: int) -> bool:
+        try:
+            await self.request(
+                "DELETE", f"/lessons/{lesson_id}", expected_statuses=(200, 204, 404)
+            )
+        except UploadError as e:
+            self.record_failure(f"/lessons/{lesson_id}", {"id": lesson_id}, e)
+            return False
+
+        self.deleted_lessons += 1
+        log.debug(f"Lesson {lesson_id} deleted from REST.")
+        return True
+
+    @staticmethod
+    def chunk_records(records: list, chunk_size: int):
+        for i in range(0, len(records), chunk_size):
+            yield records[i : i + chunk_size]
+
+    @staticmethod
+    async def ndjson_stream(records: list[dict]):
+        for record in records:
+            yield (json.dumps(record, ensure_ascii=False) + "\n").encode()
+
+    async def send_record(self, endpoint: str, record: dict):
+        """Fallback for servers without bulk endpoint."""
+        if endpoint == "/pathways":
+            return await self.post_pathway(record["title"])
+        elif endpoint == "/groups":
+            return await self.post_group(record["title"], record["pathwayTitle"])
+        elif endpoint == "/lessons":
+            return await self.post_lesson(record)
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    async def send_one(self, endpoint: str, record: dict):
+        try:
+            return await self.send_record(endpoint, record)
+        except UploadError as e:
+            self.record_failure(endpoint, record, e)
+            return None
+
+    def pending_records(self, endpoint: str, records: list[dict]) -> tuple[list, list]:
+        """
+        Returns:
+            tuple: (indices of records not acknowledged by a resumed upload,
+                ids of all records, None for pending ones)
+        """
+        ids = [None] * len(records)
+        if self.journal is None:
+            return list(range(len(records))), ids
+
+        pending = []
+        for index, record in enumerate(records):
+            acknowledged, record_id = self.journal.pop_acknowledged(endpoint, record)
+            if acknowledged:
+                ids[index] = record_id
+            else:
+                pending.append(index)
+
+        if len(pending) < len(records):
+            log.info(
+                f"{len(records) - len(pending)} records of {endpoint} are already "
+                "in REST, skipping them."
+            )
+        return pending, ids
+
+    async def send_all(self, endpoint: str, records: list[dict]) -> list:
+        """Sends records in bulk or one by one, returns their ids."""
+        pending, ids = self.pending_records(endpoint, records)
+        pending_records = [records[index] for index in pending]
+        if self.journal is not None:
+            self.journal.begin(endpoint, pending_records)
+
+        if self.bulk_upload:
+            report = await self.send_bulk(endpoint, pending_records)
+            sent_ids = report.ids
+        else:
+            sent_ids = await asyncio.gather(
+                *(self.send_one(endpoint, record) for record in pending_records)
+            )
+
+        for index, record_id in zip(pending, sent_ids):
+            ids[index] = record_id
+        return ids
+
+    async def send_records(
+        self, endpoint: str, chunk: list[dict], offset: int, report: BulkReport
+    ):
+        results = await asyncio.gather(
+            *(self.send_record(endpoint, record) for record in chunk),
+            return_exceptions=True,
+        )
+
+        for index, (record, result) in enumerate(zip(chunk, results)):
+            if isinstance(result, UploadError):
+                report.failed.append(
+                    {"record": record, "index": offset + index, "error": str(result)}
+                )
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                report.sent += 1
+                report.ids[offset + index] = result
+
+    async def post_chunk(self, endpoint: str, chunk: list[dict]):
+        """
+        Posts one chunk to the bulk endpoint, retries are made by `send_chunk`.
+
+        Returns:
+            tuple: (status, response json or None)
+        """
+        if self.bulk_format == "ndjson":
+            kwargs = {
+                "data": self.ndjson_stream(chunk),
+                "headers": {"Content-Type": "application/x-ndjson"},
+            }
+        else:
+            kwargs = {"json": chunk}
+
+        return await self.request(
+            "POST",
+            f"{endpoint}/bulk",
+            retries=0,
+            expected_statuses=(200, *self.BULK_UNSUPPORTED_STATUSES),
+            **kwargs,
+        )
+
+    @staticmethod
+    def parse_bulk_response(response, size: int) -> tuple[list, dict] | None:
+        """
+        Returns:
+            tuple: (ids of the records, errors by index), None if the
+            response doesn't describe a chunk of `size` records.
+        """
+        if response is None:
+            response = {}
+        if not isinstance(response, dict):
+            return None
+
+        ids = response.get("ids") or [None] * size
+        errors = response.get("errors") or []
+        if not isinstance(ids, list) or len(ids) != size:
+            return None
+        if not isinstance(errors, list) or not all(
+            isinstance(e, dict) and e.get("index") in range(size) for e in errors
+        ):
+            return None
+
+        return ids, {e["index"]: e for e in errors}
+
+    async def send_chunk(
+        self, endpoint: str, chunk: list[dict], offset: int, report: BulkReport
+    ):
+        error = None
+
+        for i in range(BULK_RETRIES + 1):
+            if self.bulk_supported.get(endpoint) is False:
+                break
+
+            try:
+                status, response_json = await self.post_chunk(endpoint, chunk)
+            except FatalUploadError as e:
+                error = e
+                break
+            except RetryableUploadError as e:
+                error = e
+                if i < BULK_RETRIES:
+                    log.warning(f"Chunk to {endpoint} NOT sent ({e}), retrying...")
+                    metrics.inc(
+                        "parser_upload_retries_total", endpoint=f"{endpoint}/bulk"
+                    )
+                    await asyncio.sleep(self.retry_delay(i, e))
+                continue
+
+            if status == 200:
+                self.bulk_supported[endpoint] = True
+                parsed = self.parse_bulk_response(response_json, len(chunk))
+                if parsed is None:
+                    log.warning(
+                        f"Unexpected response of {endpoint}/bulk, sending {len(chunk)} "
+                        f"records one by one: {str(response_json)[:200]}"
+                    )
+                    return await self.send_records(endpoint, chunk, offset, report)
+
+                ids, errors = parsed
+                for index, record in enumerate(chunk):
+                    if index in errors:
+                        error = {**errors[index], "index": offset + index}
+                        report.failed.append({"record": record, **error})
+                    else:
+                        report.sent += 1
+                        report.ids[offset + index] = ids[index]
+                        self.acknowledge(endpoint, record, ids[index])
+
+                if errors:
+                    log.error(
+                        f"{len(errors)} records of chunk NOT accepted by {endpoint}."
+                    )
+                return
+            elif status in self.BULK_UNSUPPORTED_STATUSES:
+                log.warning(
+                    f"{endpoint} has no bulk endpoint, sending records one by one."
+                )
+                self.bulk_supported[endpoint] = False
+                break
+
+        if self.bulk_supported.get(endpoint) is False:
+            return await self.send_records(endpoint, chunk, offset, report)
+
+        log.error(f"Chunk of {len(chunk)} records NOT sent to {endpoint}: {error}")
+        report.failed_chunks += 1
+        report.failed.extend(
+            {"record": record, "index": offset + index, "error": str(error)}
+            for index, record in enumerate(chunk)
+        )
+
+    async def send_bulk(self, endpoint: str, records: list[dict]) -> BulkReport:
+        """
+        Sends records to `endpoint` in chunks of `bulk_chunk_size`.
+
+        Each chunk is retried on connection errors, timeouts, 429 and 5xx responses. Records
+        rejected by the server are collected in the report instead of stopping the upload.
+        """
+        report = BulkReport(endpoint)
+        report.ids = [None] * len(records)
+        size = self.bulk_chunk_size
+        chunks = list(self.chunk_records(records, size))
+        report.chunks = len(chunks)
+
+        # the first chunk finds out whether the server supports bulk upload
+        if chunks:
+            await self.send_chunk(endpoint, chunks[0], 0, report)
+        await asyncio.gather(
+            *(
+                self.send_chunk(endpoint, chunk, i * size, report)
+                for i, chunk in enumerate(chunks[1:], start=1)
+            )
+        )
+
+        log.info(
+            f"{report.sent}/{len(records)} records sent to {endpoint} "
+            f"in {report.chunks} chunks."
+        )
+        if report.failed:
+            failed = json.dumps(report.failed[:10], indent=4, ensure_ascii=False)
+            log.error(f"{len(report.failed)} records NOT sent to {endpoint}: {failed}")
+            self.failed.extend({"endpoint": endpoint, **f} for f in report.failed)
+
+        return report
+
+    async def send_pathways(self, headers: dict[str, dict[str, dict]]):
+        records = [
+            {"title": str(pathway_title)}
+            for pathways in headers.values()
+            for pathway_title in pathways
+        ]
+        self.amount_pathways = len(records)
+        await self.send_all("/pathways", records)
+        return log.info("Pathways successfully sent to REST.")
+
+    async def send_groups(
+        self, timetables: list[Timetable], headers: dict[str, dict[str, dict]]
+    ):
+        records = [
+            {"title": group_name, "pathwayTitle": pathway_title}
+            for group_name, pathway_title in groups_to_send(timetables, headers).items()
+        ]
+        self.amount_groups = len(records)
+        await self.send_all("/groups", records)
+        return log.info("Groups successfully sent to REST.")
+
+    async def send_lessons(self, timetables: list[Timetable]) -> list:
+        records = [lesson.to_dict() for timetable in timetables for lesson in timetable]
+        self.amount_lessons = len(records)
+        lesson_ids = await self.send_all("/lessons", records)
+        log.info("All data successfully sent to REST.")
+
+        return lesson_ids
+
+    async def send_data_to_rest(
+        self,
+        timetables: list[Timetable],
+        headers: dict[str, dict[str, dict]],
+        recreate=True,
+    ) -> dict:
+        """`recreate` is False when a journaled upload is resumed."""
+        if recreate:
+            await self.send_timetable_recreate()
+
+        await self.send_pathways(headers)
+        await self.send_groups(timetables, headers)
+        lesson_ids = await self.send_lessons(timetables)
+
+        return build_sync_state(timetables, headers, lesson_ids)
+
+    async def apply_change(self, change: dict) -> list[dict] | None:
+        """
+        Deletes, updates and creates lessons of one group, failed records are
+        kept in `failed`.
+
+        Returns:
+            list: lessons of the group in the new sync state, None if it's removed.
+        """
+        tasks = [self.delete_lesson(lesson_id) for lesson_id in change["delete"]]
+        tasks += [self.update_lesson(i, lesson) for i, lesson in change["update"]]
+        await asyncio.gather(*tasks)
+
+        created_ids = await asyncio.gather(
+            *(self.send_lesson(dict(lesson)) for lesson in change["create"])
+        )
+
+        if change["lessons"] is None:
+            return None
+        return change["lessons"] + [
+            {"id": i, **lesson} for i, lesson in zip(created_ids, change["create"])
+        ]
+
+    async def send_data_diff(
+        self,
+        timetables: list[Timetable],
+        headers: dict[str, dict[str, dict]],
+        previous_state: dict,
+    ) -> dict:
+        """
+        Sends only the difference between the previous run and the current timetables.
+
+        Groups that are still listed in the headers but absent from `timetables` are
+        treated as unchanged. Groups that disappeared from the headers lose their lessons.
+
+        Returns:
+            dict: The new sync state to be saved for the next run.
+        """
+        group_pathways = headers_to_group_pathways(headers)
+        prev_groups = previous_state["groups"]
+
+        new_pathways = [
+            pathway
+            for pathway in dict.fromkeys(group_pathways.values())
+            if pathway not in previous_state["pathways"]
+        ]
+        self.amount_pathways = len(new_pathways)
+        await asyncio.gather(*(self.send_pathway(p) for p in new_pathways))
+
+        new_groups = []
+        for timetable in timetables:
+            if timetable.group in prev_groups:
+                continue
+            if timetable.group not in group_pathways:
+                log.warning(f"Group {timetable.group} is not listed in headers.")
+                continue
+            new_groups.append(timetable.group)
+
+        self.amount_groups = len(new_groups)
+        await asyncio.gather(
+            *(self.send_group(g, group_pathways[g]) for g in new_groups)
+        )
+
+        changes = diff_timetables(prev_groups, timetables, group_pathways)
+        self.amount_lessons = sum(len(c["create"]) for c in changes.values())
+
+        state_groups = {
+            group: prev_group
+            for group, prev_group in prev_groups.items()
+            if group not in changes
+        }
+
+        # groups are applied concurrently, AdaptiveLimiter bounds the requests
+        results = await asyncio.gather(
+            *(self.apply_change(change) for change in changes.values()),
+            return_exceptions=True,
+        )
+        for (group, change), lessons in zip(changes.items(), results):
+            if isinstance(lessons, BaseException):
+                raise lessons
+            if lessons is not None:
+                state_groups[group] = {
+                    "pathway": group_pathways.get(group),
+                    "lessons": lessons,
+                }
+
+        log.info(
+            f"Diff sync finished: {len(changes)} groups changed, "
+            f"{self.sent_lessons} lessons created, {self.updated_lessons} updated, "
+            f"{self.deleted_lessons} deleted."
+        )
+
+        pathways = previous_state["pathways"] + new_pathways
+        return {
+            "pathways": pathways,
+            "groups": state_groups,
+            "tables": headers_to_tables(headers),
+        }
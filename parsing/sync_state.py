@@ -0,0 +1,201 @@
+import json
+import logging as log
+import os
+
+from config import N_FIRST_TABLES_TO_COLLECT, SYNC_STATE_FILE
+from timetable import Timetable
+
+
+def headers_to_group_pathways(headers: dict[str, dict[str, dict]]) -> dict[str, str]:
+    group_pathways = {}
+    for pathways in headers.values():
+        for pathway_title, groups in pathways.items():
+            for group_name in groups.values():
+                group_pathways[group_name] = pathway_title
+
+    return group_pathways
+
+
+def groups_to_send(
+    timetables: list[Timetable], headers: dict[str, dict[str, dict]]
+) -> dict[str, str]:
+    """
+    Groups to create in REST with their pathways, in the order of headers.
+
+    All groups of headers are created when all tables are collected, otherwise
+    only the groups of parsed timetables. Groups are matched by name, headers
+    of several pages aren't in the order of timetables.
+    """
+    group_pathways = headers_to_group_pathways(headers)
+    if N_FIRST_TABLES_TO_COLLECT == -1:
+        return group_pathways
+
+    parsed_groups = {timetable.group for timetable in timetables}
+    return {
+        group: pathway
+        for group, pathway in group_pathways.items()
+        if group in parsed_groups
+    }
+
+
+def headers_to_tables(headers: dict[str, dict[str, dict]]) -> list[list]:
+    """Flat headers for JSON, degree titles may be None."""
+    return [
+        [degree_title, pathway_title, table_id, group_name]
+        for degree_title, pathways in headers.items()
+        for pathway_title, groups in pathways.items()
+        for table_id, group_name in groups.items()
+    ]
+
+
+def tables_to_headers(tables: list[list]) -> dict[str, dict[str, dict]]:
+    """Headers of `headers_to_tables` rows."""
+    headers = {}
+    for degree_title, pathway_title, table_id, group_name in tables:
+        degree = headers.setdefault(degree_title, {})
+        degree.setdefault(pathway_title, {})[table_id] = group_name
+
+    return headers
+
+
+def build_sync_state(
+    timetables: list[Timetable], headers: dict[str, dict[str, dict]], lesson_ids: list
+) -> dict:
+    group_pathways = headers_to_group_pathways(headers)
+    lesson_ids = iter(lesson_ids)
+    groups = {}
+
+    for timetable in timetables:
+        groups[timetable.group] = {
+            "pathway": group_pathways.get(timetable.group),
+            "lessons": [
+                {"id": next(lesson_ids), **lesson.to_dict()} for lesson in timetable
+            ],
+        }
+
+    pathways = list(dict.fromkeys(group_pathways.values()))
+    tables = headers_to_tables(headers)
+    return {"pathways": pathways, "groups": groups, "tables": tables}
+
+
+def lesson_slot(lesson: dict) -> tuple:
+    return lesson["subgroup"], lesson["weekDay"], lesson["startTime"]
+
+
+def diff_lessons(previous: list[dict], current: list[dict]) -> dict[str, list]:
+    """
+    Compares lessons of one group.
+
+    Identical lessons are kept, lessons that only moved within the same slot
+    (subgroup, weekday and start time) are updated, the rest are created or deleted.
+
+    Returns:
+        dict: "lessons" - kept and updated lessons with their ids,
+              "create" - lessons to create, "update" - (id, lesson) pairs,
+              "delete" - ids of lessons to delete.
+    """
+    unmatched = {}
+    for prev_lesson in previous:
+        lesson = {k: v for k, v in prev_lesson.items() if k != "id"}
+        key = json.dumps(lesson, sort_keys=True, ensure_ascii=False)
+        unmatched.setdefault(key, []).append(prev_lesson)
+
+    kept = []
+    remaining = []
+    for lesson in current:
+        key = json.dumps(lesson, sort_keys=True, ensure_ascii=False)
+        if unmatched.get(key):
+            kept.append(unmatched[key].pop())
+        else:
+            remaining.append(lesson)
+
+    slots = {}
+    for prev_lessons in unmatched.values():
+        for prev_lesson in prev_lessons:
+            slots.setdefault(lesson_slot(prev_lesson), []).append(prev_lesson)
+
+    create = []
+    update = []
+    for lesson in remaining:
+        prev_lessons = slots.get(lesson_slot(lesson))
+        if prev_lessons:
+            lesson_id = prev_lessons.pop()["id"]
+            update.append((lesson_id, lesson))
+            kept.append({"id": lesson_id, **lesson})
+        else:
+            create.append(lesson)
+
+    delete = [
+        prev_lesson["id"]
+        for prev_lessons in slots.values()
+        for prev_lesson in prev_lessons
+    ]
+
+    return {"lessons": kept, "create": create, "update": update, "delete": delete}
+
+
+def diff_timetables(
+    prev_groups: dict[str, dict],
+    timetables: list[Timetable],
+    group_pathways: dict[str, str],
+) -> dict[str, dict]:
+    """
+    Returns changes of lessons for every group which differs from the previous run.
+
+    A group from the previous run is considered removed only when it is neither in
+    `timetables` nor in the headers. Removed groups have `None` instead of lessons.
+    """
+    changes = {}
+
+    for timetable in timetables:
+        prev_lessons = prev_groups.get(timetable.group, {"lessons": []})["lessons"]
+        lessons = [lesson.to_dict() for lesson in timetable]
+        change = diff_lessons(prev_lessons, lessons)
+
+        if change["create"] or change["update"] or change["delete"]:
+            changes[timetable.group] = change
+
+    current_groups = {timetable.group for timetable in timetables}
+    for group, prev_group in prev_groups.items():
+        if group not in current_groups and group not in group_pathways:
+            delete = [lesson["id"] for lesson in prev_group["lessons"]]
+            changes[group] = {
+                "lessons": None,
+                "create": [],
+                "update": [],
+                "delete": delete,
+            }
+
+    return changes
+
+
+def load_sync_state(filename=SYNC_STATE_FILE):
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        log.info("Sync state file not found.")
+        return None
+
+    for group in state["groups"].values():
+        if any(lesson["id"] is None for lesson in group["lessons"]):
+            log.warning("Sync state has lessons without id. Diff sync is impossible.")
+            return None
+    if "tables" not in state:
+        log.warning("Sync state has no tables. Diff sync is impossible.")
+        return None
+
+    return state
+
+
+def save_sync_state(state: dict, filename=SYNC_STATE_FILE):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    log.info(f"Sync state saved to {filename}")
+
+
+def discard_sync_state(filename=SYNC_STATE_FILE):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,204 @@
+import os
+import shutil
+import sys
+import tempfile
+
+from contextlib import asynccontextmanager
+
+import pytest
+
+from aiohttp import web
+
+PARSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# files of the parser state, they are removed after every test
+STATE_DIR = tempfile.mkdtemp(prefix="parser-tests-")
+
+sys.path.insert(0, PARSING_DIR)
+sys.path.insert(0, os.path.join(PARSING_DIR, "benchmarks"))
+
+# the parser reads its settings on import
+for name, value in {
+    "USER_AGENT": "parser-tests",
+    "ACCEPT": "text/html",
+    "TAG_STRONG_GROUPS": "Groups",
+    "TAG_STRONG_TEACHERS": "Teachers",
+    "TAG_STRONG_INFORMATICS": "Informatics",
+    "URL_LEQTORI": "http://127.0.0.1:9/",
+    "URL_REST": "http://127.0.0.1:9",
+    "MAX_CONNECTIONS": "4",
+    "FORCE_TO_COLLECT": "false",
+    "N_FIRST_TABLES_TO_COLLECT": "-1",
+    "SYNC_MODE": "full",
+    "COLLECT_TEACHERS": "false",
+    "CRAWL_ALL_PAGES": "false",
+    "UPLOAD_RETRIES": "0",
+    "SNAPSHOT_DIR": "",
+    "METRICS_FILE": "",
+    "SYNC_STATE_FILE": os.path.join(STATE_DIR, "sync_state.json"),
+    "UPLOAD_JOURNAL_FILE": os.path.join(STATE_DIR, "upload_journal.sqlite3"),
+    "FETCH_METADATA_FILE": os.path.join(STATE_DIR, "fetch_metadata.json"),
+    "TABLE_FINGERPRINTS_FILE": os.path.join(STATE_DIR, "table_fingerprints.json"),
+}.items():
+    os.environ[name] = value
+
+from fake_rest import make_app, start_server
+from make_fixture import make_page
+from timetable import Lesson, Timetable
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    for filename in os.listdir(STATE_DIR):
+        path = os.path.join(STATE_DIR, filename)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+@pytest.fixture
+def fake_rest():
+    """
+    Starts fake_rest in the running loop, yields its app and url.
+
+    `middlewares` are added after the ones of fake_rest, e.g. to reject requests.
+    """
+
+    @asynccontextmanager
+    async def serve(middlewares=(), **kwargs):
+        app = make_app(**kwargs)
+        app.middlewares.extend(middlewares)
+        runner, url = await start_server(app)
+        try:
+            yield app, url
+        finally:
+            await runner.cleanup()
+
+    return serve
+
+
+@pytest.fixture
+def leqtori_site():
+    """
+    Starts a leqtori index with a link to a groups page of four groups.
+
+    Yields the site state and the index url, a new `state["seed"]` changes
+    both the index and the groups page, a new `state["index"]` only the index,
+    `state["down"]` breaks the groups page. Timetable pages have an ETag,
+    `state["not_modified"]` counts their 304 responses.
+    With `faculty` the index also links a faculty page of four other groups,
+    `state["faculty_down"]` breaks it.
+    """
+
+    @asynccontextmanager
+    async def serve(faculty=False):
+        state = {
+            "seed": 0,
+            "index": 0,
+            "down": False,
+            "faculty_down": False,
+            "requests": 0,
+            "not_modified": 0,
+        }
+
+        def page_response(request: web.Request, text: str):
+            etag = f'"{state["seed"]}"'
+            if request.headers.get("If-None-Match") == etag:
+                state["not_modified"] += 1
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(
+                text=text, content_type="text/html", headers={"ETag": etag}
+            )
+
+        async def index(request: web.Request):
+            state["requests"] += 1
+            links = f'<a href="{state["url"]}groups"><strong>Groups</strong></a>'
+            if faculty:
+                links += f'<a href="{state["url"]}faculty"><strong>Faculty</strong></a>'
+            return web.Response(
+                text=f'<html><body><!-- {state["seed"]}.{state["index"]} -->'
+                f"{links}</body></html>",
+                content_type="text/html",
+            )
+
+        async def groups(request: web.Request):
+            state["requests"] += 1
+            if state["down"]:
+                return web.Response(status=500)
+            return page_response(request, make_page(4, state["seed"]))
+
+        async def faculty_page(request: web.Request):
+            state["requests"] += 1
+            if state["faculty_down"]:
+                return web.Response(status=503)
+            return page_response(request, make_page(4, state["seed"], first_number=201))
+
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/", index),
+                web.get("/groups", groups),
+                web.get("/faculty", faculty_page),
+            ]
+        )
+        runner, url = await start_server(app)
+        # the parser joins relative links with URL_LEQTORI of its settings
+        state["url"] = f"{url}/"
+        try:
+            yield state, state["url"]
+        finally:
+            await runner.cleanup()
+
+    return serve
+
+
+def make_lesson(group: str, number: int, **fields) -> Lesson:
+    lesson = {
+        "subjectName": f"Subject {number}",
+        "group": group,
+        "subgroup": "",
+        "lessonType": "Lecture",
+        "professor": "J. Smith",
+        "classroom": f"I-{100 + number}",
+        "weekDay": ("Mon", "Tue", "Wed", "Thu", "Fri")[number % 5],
+        "startTime": f"{9 + number % 8:02}:00:00",
+        "hoursSpan": 1,
+    }
+    lesson.update(fields)
+    return Lesson(**lesson)
+
+
+@pytest.fixture(name="make_lesson")
+def make_lesson_fixture():
+    return make_lesson
+
+
+@pytest.fixture
+def timetables():
+    """Three groups of two pathways with five lessons each, and their headers."""
+    headers = {
+        "Bachelor": {
+            "Informatics": {"101_DETAILED": "101A", "102_DETAILED": "102A"},
+            "Physics": {"103_DETAILED": "103B"},
+        }
+    }
+    result = []
+    for group in ("101A", "102A", "103B"):
+        timetable = Timetable(group)
+        for number in range(5):
+            timetable.add_lesson(make_lesson(group, number))
+        result.append(timetable)
+
+    return result, headers
+
+
+@pytest.fixture
+def sorted_lessons():
+    """Lessons without ids in a stable order, so REST and timetables can be compared."""
+
+    def sort(lessons) -> list[dict]:
+        lessons = [{k: v for k, v in lesson.items() if k != "id"} for lesson in lessons]
+        return sorted(lessons, key=lambda lesson: sorted(lesson.items()))
+
+    return sort
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import sys
+
+from archive import SnapshotArchive
+from conftest import PARSING_DIR
+from fake_rest import STORAGE
+from timetable import Timetable
+
+
+def to_dicts(timetables) -> dict:
+    return {
+        group: lessons
+        for timetable in timetables
+        for group, lessons in timetable.to_dict().items()
+    }
+
+
+def teacher(professor: str, make_lesson) -> Timetable:
+    # the teachers page swaps the group and the professor columns
+    timetable = Timetable(professor)
+    timetable.add_lesson(make_lesson(professor, 0, professor="101A"))
+    return timetable
+
+
+def test_save_and_load(tmp_path, timetables):
+    timetables, headers = timetables
+    archive = SnapshotArchive(str(tmp_path), keep=0)
+
+    path = archive.save(timetables, headers, page_fingerprint="page")
+
+    assert archive.snapshots() == [path] and archive.latest() == path
+    assert archive.resolve("latest") == archive.resolve(os.path.basename(path)) == path
+    loaded, loaded_headers = archive.load(path)
+    assert loaded_headers == headers
+    assert to_dicts(loaded) == to_dicts(timetables)
+    assert archive.load_group("latest", "102A").to_dict() == timetables[1].to_dict()
+    meta = archive.load_meta(path)
+    assert meta["page_fingerprint"] == "page"
+    assert meta["missing"] == []
+    assert meta["version"].startswith(path[-16:-4])
+
+
+def test_headers_without_a_degree_round_trip(tmp_path, timetables):
+    timetables, headers = timetables
+    # tables of the faculty page have no degree title
+    headers = {**headers, None: {"Chemistry": {"201_DETAILED": "201A"}}}
+    archive = SnapshotArchive(str(tmp_path), keep=0)
+
+    path = archive.save(timetables, headers)
+
+    loaded, loaded_headers = archive.load(path)
+    assert loaded_headers == headers
+    assert None in loaded_headers and "null" not in loaded_headers
+
+
+def test_unparsed_groups_are_copied_from_the_previous_snapshot(
+    tmp_path, timetables, make_lesson
+):
+    timetables, headers = timetables
+    archive = SnapshotArchive(str(tmp_path), keep=0)
+
+    # groups of unchanged tables aren't parsed, none were archived before
+    first = archive.save(timetables[:1], headers)
+    assert archive.load_meta(first)["missing"] == ["102A", "103B"]
+
+    second = archive.save(
+        timetables, headers, teachers=[teacher("J. Smith", make_lesson)]
+    )
+    changed = Timetable("101A")
+    changed.add_lesson(make_lesson("101A", 7))
+    third = archive.save([changed], headers)
+
+    loaded, _ = archive.load(third)
+    assert to_dicts(loaded) == to_dicts([changed, *timetables[1:]])
+    old_meta, new_meta = archive.load_meta(second), archive.load_meta(third)
+    assert new_meta["groups"]["103B"] == old_meta["groups"]["103B"]
+    assert new_meta["version"] != old_meta["version"]
+    # professor timetables are kept when the teachers page isn't collected
+    assert archive.load_teacher(third, "J. Smith").to_dict() == (
+        teacher("J. Smith", make_lesson).to_dict()
+    )
+
+
+def test_diff(tmp_path, timetables, make_lesson):
+    timetables, headers = timetables
+    archive = SnapshotArchive(str(tmp_path), keep=0)
+    old = archive.save(timetables, headers)
+
+    group_101a = Timetable("101A")
+    for number in range(5):
+        # the classroom of a lesson moves, its slot is the same
+        classroom = "V-501" if number == 0 else f"I-{100 + number}"
+        group_101a.add_lesson(make_lesson("101A", number, classroom=classroom))
+    group_101a.add_lesson(make_lesson("101A", 7))
+    group_104c = Timetable("104C")
+    group_104c.add_lesson(make_lesson("104C", 0))
+    new_headers = {
+        "Bachelor": {
+            "Informatics": {"101_DETAILED": "101A", "102_DETAILED": "102A"},
+            "Physics": {"104_DETAILED": "104C"},
+        }
+    }
+    new = archive.save([group_101a, timetables[1], group_104c], new_headers)
+
+    assert archive.diff(old, new) == {
+        "added": ["104C"],
+        "removed": ["103B"],
+        "changed": {"101A": {"created": 1, "updated": 1, "deleted": 0}},
+    }
+    assert archive.diff(new, new) == {"added": [], "removed": [], "changed": {}}
+
+
+def test_prune(tmp_path, timetables):
+    timetables, headers = timetables
+    archive = SnapshotArchive(str(tmp_path), keep=2)
+
+    saved = [archive.save(timetables, headers) for _ in range(4)]
+
+    # every save prunes the archive
+    assert archive.snapshots() == saved[-2:]
+    assert archive.prune(0) == []
+    assert archive.prune(1) == saved[2:3]
+    assert archive.snapshots() == saved[-1:]
+
+
+def test_snapshot_flags(tmp_path, timetables, make_lesson, fake_rest):
+    timetables, headers = timetables
+    archive = SnapshotArchive(str(tmp_path), keep=0)
+    old = archive.save(timetables, headers)
+    changed = Timetable("101A")
+    changed.add_lesson(make_lesson("101A", 7))
+    new = archive.save([changed], headers, teachers=[teacher("J. Smith", make_lesson)])
+
+    async def run_parser(*args, url_rest="http://127.0.0.1:9") -> str:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "parser.py",
+            *args,
+            cwd=PARSING_DIR,
+            env={
+                **os.environ,
+                "LOG_LEVEL": "WARNING",
+                "SNAPSHOT_DIR": str(tmp_path),
+                "URL_REST": url_rest,
+            },
+            stdout=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await process.communicate()
+        assert process.returncode == 0
+        return stdout.decode()
+
+    async def scenario():
+        listed = await run_parser("--list-snapshots")
+        assert listed.splitlines() == [
+            f"{old} {archive.load_meta(old)['version'][:12]} 3 groups 0 teachers",
+            f"{new} {archive.load_meta(new)['version'][:12]} 3 groups 1 teachers",
+        ]
+
+        diff = await run_parser("--diff-snapshots", old, os.path.basename(new))
+        assert json.loads(diff) == archive.diff(old, new)
+
+        lessons = await run_parser("--teacher", "J. Smith")
+        assert json.loads(lessons) == teacher("J. Smith", make_lesson).to_dict()
+
+        # rolls REST back to the old snapshot
+        async with fake_rest() as (app, url):
+            await run_parser("--replay", old, url_rest=url)
+            assert len(app[STORAGE].lessons) == 15
+            assert len(app[STORAGE].groups) == 3
+
+        await run_parser("--prune-snapshots", "1")
+        assert archive.snapshots() == [new]
+
+    asyncio.run(scenario())
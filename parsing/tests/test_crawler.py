@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import crawler
+import parser
+import sync_state
+from fake_rest import STORAGE
+from parser import load_table_fingerprints
+from rest_client import Schedule_Service_API
+
+
+@pytest.mark.parametrize("pipeline", ["true", "false"])
+@pytest.mark.parametrize(
+    "tables_to_collect, groups",
+    [
+        (-1, {"101A", "102B", "103C", "104D"}),
+        # only groups of parsed tables are created
+        (2, {"102B"}),
+    ],
+)
+def test_groups_match_timetables_when_pages_fail(
+    fake_rest, leqtori_site, monkeypatch, pipeline, tables_to_collect, groups
+):
+    monkeypatch.setattr(parser, "FORCE_TO_COLLECT", "true")
+    monkeypatch.setattr(parser, "UPLOAD_PIPELINE", pipeline)
+    monkeypatch.setattr(crawler, "CRAWL_ALL_PAGES", "true")
+    monkeypatch.setattr(crawler, "N_FIRST_TABLES_TO_COLLECT", tables_to_collect)
+    monkeypatch.setattr(sync_state, "N_FIRST_TABLES_TO_COLLECT", tables_to_collect)
+    table_processing = parser.Scraper.table_processing
+
+    def failing_table_processing(self, table):
+        timetable = table_processing(self, table)
+        if timetable.group == "101A":
+            raise ValueError("Unexpected cell")
+        return timetable
+
+    monkeypatch.setattr(parser.Scraper, "table_processing", failing_table_processing)
+
+    async def scenario():
+        site_server = leqtori_site(faculty=True)
+        async with site_server as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            site["faculty_down"] = True
+            async with Schedule_Service_API(url_rest) as api:
+                context = parser.ParserContext(api)
+                try:
+                    await parser.run_once(context)
+                finally:
+                    await context.close()
+
+            storage = app[STORAGE]
+            # headers list more groups than there are timetables, in another order
+            assert set(storage.groups) == groups
+            lesson_groups = {lesson["group"] for lesson in storage.lessons.values()}
+            assert lesson_groups == groups - {"101A"}
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("pipeline", ["true", "false"])
+@pytest.mark.parametrize("engine", ["bs4", "lxml-stream"])
+def test_unchanged_pages_are_not_parsed(
+    fake_rest, leqtori_site, monkeypatch, pipeline, engine
+):
+    monkeypatch.setattr(parser, "SYNC_MODE", "diff")
+    monkeypatch.setattr(parser, "PARSER_ENGINE", engine)
+    monkeypatch.setattr(parser, "UPLOAD_PIPELINE", pipeline)
+    monkeypatch.setattr(crawler, "CRAWL_ALL_PAGES", "true")
+    method = parser.SCRAPERS[engine].FINGERPRINT_METHOD
+
+    async def run(url_rest):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    def state_lessons():
+        return [
+            lesson
+            for group in sync_state.load_sync_state()["groups"].values()
+            for lesson in group["lessons"]
+        ]
+
+    async def scenario():
+        site_server = leqtori_site(faculty=True)
+        async with site_server as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            await run(url_rest)
+            state = sync_state.load_sync_state()
+            fingerprints = load_table_fingerprints(method)
+
+            # only the index has changed
+            site["index"] = 1
+            storage.reset_stats()
+            await run(url_rest)
+
+            assert site["not_modified"] == 2
+            assert not any(
+                endpoint.startswith(("POST", "PUT", "DELETE"))
+                for endpoint in storage.endpoints
+            )
+            assert sync_state.load_sync_state() == state
+            assert load_table_fingerprints(method) == fingerprints
+
+            site["seed"] = 1
+            await run(url_rest)
+
+            assert site["not_modified"] == 2
+            assert len(storage.groups) == 8
+            assert storage.lessons == {
+                lesson.pop("id"): lesson for lesson in state_lessons()
+            }
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+import asyncio
+
+import parser
+from daemon import ParserDaemon
+from fake_rest import STORAGE
+from rest_client import Schedule_Service_API
+from sync_state import load_sync_state
+
+
+def test_failed_run_is_followed_by_full_upload(fake_rest, leqtori_site, monkeypatch):
+    monkeypatch.setattr(parser, "SYNC_MODE", "diff")
+
+    async def scenario():
+        async with leqtori_site() as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            daemon = ParserDaemon(parser.run_once, parser.ParserContext)
+
+            async with Schedule_Service_API(url_rest) as api:
+                daemon.context = parser.ParserContext(api)
+                try:
+                    await daemon.run()
+                    assert daemon.status["last_run_success"]
+                    assert daemon.context.sync_state is not None
+
+                    site["seed"] = 1
+                    site["down"] = True
+                    await daemon.run()
+                    assert daemon.status["failed_runs"] == 1
+                    assert daemon.context.sync_state is None
+                    assert load_sync_state() is None
+
+                    site["down"] = False
+                    storage.reset_stats()
+                    await daemon.run()
+                    assert daemon.status["last_run_success"]
+                    # REST is recreated instead of being patched by a diff
+                    assert storage.endpoints["POST /timetable/recreate"] == 1
+                    assert daemon.context.sync_state == load_sync_state()
+                finally:
+                    await daemon.context.close()
+
+            state_lessons = sum(
+                len(group["lessons"]) for group in load_sync_state()["groups"].values()
+            )
+            assert len(storage.lessons) == state_lessons
+
+    asyncio.run(scenario())
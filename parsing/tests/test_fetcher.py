@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from aiohttp import web
+
+import parser
+from config import FETCH_METADATA_FILE, SYNC_STATE_FILE
+from fake_rest import STORAGE, start_server
+from fetcher import AsyncFetcher
+from rest_client import FatalUploadError, Schedule_Service_API
+
+
+def test_metadata_is_saved_only_on_commit(tmp_path):
+    metadata_file = str(tmp_path / "fetch_metadata.json")
+    conditional_requests = []
+
+    async def page(request: web.Request):
+        conditional_requests.append("If-None-Match" in request.headers)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="<html></html>", headers={"ETag": '"v1"'})
+
+    async def scenario():
+        app = web.Application()
+        app.add_routes([web.get("/", page)])
+        runner, url = await start_server(app)
+        fetcher = AsyncFetcher(metadata_file)
+        try:
+            assert (await fetcher.fetch(url)).changed
+            assert not os.path.exists(metadata_file)
+
+            # e.g. the upload failed, the page must be processed again
+            fetcher.discard_metadata()
+            assert (await fetcher.fetch(url)).changed
+            fetcher.commit_metadata()
+
+            result = await fetcher.fetch(url)
+            assert result.status == 304
+            assert not result.changed
+        finally:
+            await fetcher.close()
+            await runner.cleanup()
+
+        assert conditional_requests == [False, False, True]
+        assert AsyncFetcher(metadata_file).metadata[url]["etag"] == '"v1"'
+
+    asyncio.run(scenario())
+
+
+def test_failed_upload_is_retried(fake_rest, leqtori_site, monkeypatch):
+    rest_is_down = False
+
+    @web.middleware
+    async def outage(request: web.Request, handler):
+        if rest_is_down:
+            return web.json_response({"error": "Service is down"}, status=400)
+        return await handler(request)
+
+    async def run(url_rest):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    async def scenario():
+        nonlocal rest_is_down
+        async with leqtori_site() as (site, url), fake_rest([outage]) as (
+            app,
+            url_rest,
+        ):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+
+            await run(url_rest)
+            assert storage.lessons
+            with open(FETCH_METADATA_FILE, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+
+            site["seed"] = 1
+            rest_is_down = True
+            with pytest.raises(FatalUploadError):
+                await run(url_rest)
+            # the sync state of the first run is still there, only the fetch
+            # metadata tells that the new page hasn't reached REST
+            assert os.path.exists(SYNC_STATE_FILE)
+            with open(FETCH_METADATA_FILE, "r", encoding="utf-8") as f:
+                assert json.load(f) == metadata
+
+            rest_is_down = False
+            storage.reset_stats()
+            await run(url_rest)
+            assert storage.endpoints["POST /timetable/recreate"] == 1
+            assert storage.lessons
+
+            storage.reset_stats()
+            site["requests"] = 0
+            await run(url_rest)
+            assert storage.requests == 0
+            assert site["requests"] == 1
+
+    asyncio.run(scenario())
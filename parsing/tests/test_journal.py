@@ -0,0 +1,155 @@
+import asyncio
+import logging
+
+from aiohttp import web
+
+import parser
+from fake_rest import STORAGE
+from journal import UploadJournal, timetables_version
+from rest_client import Schedule_Service_API
+
+
+@web.middleware
+async def no_lesson_search(request: web.Request, handler):
+    """REST lists lessons only by group weeks, `GET /lessons` is fake_rest's own."""
+    if request.method == "GET" and request.path == "/lessons":
+        return web.json_response({"error": "Not found"}, status=404)
+    return await handler(request)
+
+
+def interrupted_upload(timetables, headers, url, lost_acks_after: int):
+    """
+    Full upload killed right before it's finished: REST got all records,
+    but acknowledgements of lessons after the first `lost_acks_after` were lost.
+    """
+    acknowledge = UploadJournal.acknowledge
+    acknowledged_lessons = 0
+
+    def lose_acks(journal, endpoint, record, record_id=None):
+        nonlocal acknowledged_lessons
+        if endpoint == "/lessons":
+            acknowledged_lessons += 1
+            if acknowledged_lessons > lost_acks_after:
+                return
+        acknowledge(journal, endpoint, record, record_id)
+
+    async def upload():
+        async with Schedule_Service_API(url) as api:
+            with UploadJournal() as journal:
+                journal.start(timetables_version(timetables, headers))
+                journal.acknowledge = lose_acks.__get__(journal)
+                api.journal = journal
+                await api.send_data_to_rest(timetables, headers)
+
+    return upload()
+
+
+def test_resume_sends_only_lessons_missing_in_rest(
+    fake_rest, timetables, sorted_lessons
+):
+    timetables, headers = timetables
+
+    async def scenario():
+        async with fake_rest([no_lesson_search]) as (app, url):
+            storage = app[STORAGE]
+            await interrupted_upload(timetables, headers, url, lost_acks_after=5)
+            timetable_id = storage.timetable["id"]
+            # 3 of the unacknowledged lessons never reached REST
+            for lesson_id in sorted(storage.lessons)[-3:]:
+                storage.delete_lesson(lesson_id)
+            storage.reset_stats()
+
+            async with Schedule_Service_API(url) as api:
+                state = await parser.send_data_to_rest(
+                    timetables, headers, api=api, resume=True
+                )
+
+            assert state is not None
+            assert storage.timetable["id"] == timetable_id
+            assert "POST /timetable/recreate" not in storage.endpoints
+            assert storage.endpoints["POST /{kind}"] == 3
+            # weeks of the two groups with lessons in doubt
+            assert storage.endpoints["GET /lessons/groups/{id}/{period}"] == 2
+            assert len(storage.pathways) == 2
+            assert len(storage.groups) == 3
+            assert sorted_lessons(storage.lessons.values()) == sorted_lessons(
+                lesson.to_dict() for timetable in timetables for lesson in timetable
+            )
+
+    asyncio.run(scenario())
+
+
+def test_identical_lessons_in_doubt_are_matched_once(
+    fake_rest, timetables, make_lesson
+):
+    timetables, headers = timetables
+    # the same lesson twice, e.g. a lesson of two subgroups taught together
+    for _ in range(2):
+        timetables[0].add_lesson(make_lesson("101A", 10))
+
+    async def scenario():
+        async with fake_rest([no_lesson_search]) as (app, url):
+            storage = app[STORAGE]
+            await interrupted_upload(timetables, headers, url, lost_acks_after=0)
+            duplicate = make_lesson("101A", 10).to_dict()
+            storage.delete_lesson(
+                next(i for i, lesson in storage.lessons.items() if lesson == duplicate)
+            )
+            storage.reset_stats()
+
+            async with Schedule_Service_API(url) as api:
+                await parser.send_data_to_rest(
+                    timetables, headers, api=api, resume=True
+                )
+
+            assert storage.endpoints["POST /{kind}"] == 1
+            lessons = list(storage.lessons.values())
+            assert lessons.count(duplicate) == 2
+            assert len(lessons) == 17
+
+    asyncio.run(scenario())
+
+
+def test_finished_upload_is_not_resumed(fake_rest, timetables):
+    timetables, headers = timetables
+
+    async def scenario():
+        async with fake_rest() as (app, url):
+            storage = app[STORAGE]
+            async with Schedule_Service_API(url) as api:
+                await parser.send_data_to_rest(timetables, headers, api=api)
+                await parser.send_data_to_rest(
+                    timetables, headers, api=api, resume=True
+                )
+
+            assert storage.endpoints["POST /timetable/recreate"] == 2
+            assert len(storage.lessons) == 15
+
+    asyncio.run(scenario())
+
+
+def test_pipelined_upload_is_not_resumed(timetables, caplog):
+    timetables, headers = timetables
+    version = timetables_version(timetables, headers)
+
+    with UploadJournal() as journal:
+        journal.start(UploadJournal.UNKNOWN_VERSION)
+        journal.acknowledge("/pathways", {"title": "Informatics"}, 1)
+
+    with UploadJournal() as journal, caplog.at_level(logging.WARNING):
+        assert journal.start(version, resume=True) is False
+        assert journal.acknowledged == {}
+
+    assert "can't be resumed" in caplog.text
+
+
+def test_other_timetables_are_not_resumed(timetables):
+    timetables, headers = timetables
+
+    with UploadJournal() as journal:
+        journal.start("previous version")
+        journal.begin("/pathways", [{"title": "Informatics"}])
+
+    with UploadJournal() as journal:
+        assert journal.start(timetables_version(timetables, headers), True) is False
+        assert journal.in_doubt == {}
@@ -0,0 +1,43 @@
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import RunMetrics
+
+
+def test_metrics_of_parallel_threads():
+    metrics = RunMetrics()
+
+    def parse_page(page: int):
+        for table in range(1000):
+            metrics.inc("parser_tables_total", page=page % 2)
+            metrics.set("parser_table_rows", table, page=page, table=table % 10)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(parse_page, range(8)))
+
+    assert metrics.counters["parser_tables_total"] == {
+        (("page", "0"),): 4000,
+        (("page", "1"),): 4000,
+    }
+    assert len(metrics.gauges["parser_table_rows"]) == 80
+
+
+def test_export(tmp_path):
+    metrics = RunMetrics()
+    metrics.inc("parser_fetch_requests_total", url="http://x/", status=200)
+    metrics.observe("parser_upload_request_seconds", 0.02, endpoint="/lessons")
+    metrics.set("parser_run_success", 1)
+
+    filename = tmp_path / "metrics.prom"
+    metrics.export(str(filename))
+    lines = filename.read_text().splitlines()
+    assert 'parser_fetch_requests_total{status="200",url="http://x/"} 1' in lines
+    bucket = 'parser_upload_request_seconds_bucket{endpoint="/lessons",le="%s"}'
+    assert f"{bucket % 0.01} 0" in lines
+    assert f"{bucket % 0.025} 1" in lines
+    assert "parser_run_success 1" in lines
+
+    metrics.export(str(tmp_path / "metrics.json"), "json")
+    report = json.loads((tmp_path / "metrics.json").read_text())
+    assert report["gauges"]["parser_run_success"] == [{"labels": {}, "value": 1}]
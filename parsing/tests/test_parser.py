@@ -0,0 +1,55 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import parser
+from conftest import PARSING_DIR
+from parser import SCRAPERS
+
+FIXTURE = os.path.join(PARSING_DIR, "benchmarks", "fixtures", "groups.html")
+
+
+def parse(scraper_class, workers=1) -> tuple[list[dict], dict]:
+    scraper = scraper_class(workers=workers)
+    timetables, headers = scraper.get_timetables_from_file(FIXTURE)
+    return [timetable.to_dict() for timetable in timetables], headers
+
+
+@pytest.fixture(scope="module")
+def bs4_result():
+    timetables, headers = parse(SCRAPERS["bs4"])
+    assert len(timetables) == 40
+    return timetables, headers
+
+
+@pytest.mark.parametrize("engine", ["lxml", "lxml-stream"])
+def test_engines_match_bs4(bs4_result, engine):
+    assert parse(SCRAPERS[engine]) == bs4_result
+
+
+def test_streaming_engine_matches_bs4_with_small_chunks(bs4_result, monkeypatch):
+    # tables and headers are split between many chunks
+    monkeypatch.setattr(SCRAPERS["lxml-stream"], "CHUNK_SIZE", 97)
+
+    assert parse(SCRAPERS["lxml-stream"]) == bs4_result
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml"])
+def test_process_pool_matches_serial_bs4(bs4_result, engine):
+    assert parse(SCRAPERS[engine], workers=2) == bs4_result
+
+
+def test_process_pool_workers_are_not_forked(bs4_result, monkeypatch):
+    contexts = []
+
+    def executor(*args, **kwargs):
+        contexts.append(kwargs.get("mp_context"))
+        return ProcessPoolExecutor(*args, **kwargs)
+
+    monkeypatch.setattr(parser, "ProcessPoolExecutor", executor)
+
+    assert parse(SCRAPERS["bs4"], workers=2) == bs4_result
+    # a forked worker could inherit STRING_POOL.lock held by a parsing thread
+    assert [context.get_start_method() for context in contexts] == ["forkserver"]
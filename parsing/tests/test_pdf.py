@@ -0,0 +1,131 @@
+import asyncio
+import os
+
+from types import SimpleNamespace
+
+import pandas as pd
+
+from aiohttp import web
+
+import crawler
+import parser
+from fake_rest import start_server
+from fetcher import AsyncFetcher
+
+PDF_DATA = b"%PDF-1.4 << /Type /Pages /Count 2 >>"
+
+
+def frame(*rows: str) -> pd.DataFrame:
+    """Table of "|" separated cells, tabula takes the first row as columns."""
+    rows = [[cell or None for cell in row.split("|")] for row in rows]
+    return pd.DataFrame(rows[1:], columns=rows[0])
+
+
+def make_tables(pages: str) -> list[pd.DataFrame]:
+    """Tables of a timetable PDF as tabula returns them, one page per range."""
+    if pages == "1-1":
+        return [
+            frame(
+                "101A|Mathematics (MAT101) Lecture|J. Smith|ორშაბათი|09:00-10:50|I-101",
+                # the group and the day are merged with the row above
+                "|Physics (PHY110) Practice|M. Jones||11:00|II-205",
+                # the merged group cell is lost, the cells are shifted left
+                "Programming (CS120) Laboratory|A. Ivanov|12.03.2024|13.00-14.50|I-3|",
+            ),
+            frame("a|b|c", "1|2|3"),
+        ]
+    return [
+        frame(
+            "ჯგუფი|საგანი|ლექტორი|დღე|დრო|აუდიტორია",
+            "102B.1-2|History (HIS201) Lecture|M. Jones|Wednesday|9.00|VI-412",
+        )
+    ]
+
+
+def lessons(timetable) -> list[tuple]:
+    return sorted(
+        (
+            lesson.group,
+            lesson.subgroup,
+            lesson.subjectName,
+            lesson.lessonType,
+            lesson.professor,
+            lesson.weekDay,
+            lesson.startTime,
+            lesson.hoursSpan,
+            lesson.classroom,
+        )
+        for lesson in timetable
+    )
+
+
+def test_rows_of_fabricated_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        parser.PdfScraper, "read_tables", staticmethod(lambda f, p: make_tables(p))
+    )
+    scraper = parser.PdfScraper("Faculty", cache_dir=str(tmp_path), workers=2)
+
+    timetables, headers = scraper.get_timetables_from_pdf("timetable.pdf", PDF_DATA)
+
+    assert headers == {None: {"Faculty": {"0_PDF": "101A", "1_PDF": "102B"}}}
+    lecture = "101A", None, "Mathematics (MAT101)", "Lecture", "J. Smith"
+    practice = "101A", None, "Physics (PHY110)", "Practice", "M. Jones"
+    laboratory = "101A", None, "Programming (CS120)", "Laboratory", "A. Ivanov"
+    assert lessons(timetables[0]) == [
+        (*lecture, "Mon", "09:00:00", 2, "I-101"),
+        (*practice, "Mon", "11:00:00", 1, "II-205"),
+        (*laboratory, "Tue", "13:00:00", 2, "I-3"),
+    ]
+    history = "102B", "1-2", "History (HIS201)", "Lecture", "M. Jones"
+    assert lessons(timetables[1]) == [(*history, "Wed", "09:00:00", 1, "VI-412")]
+    # header rows of the pages are skipped, rows are cached by the PDF hash
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_cached_rows_are_found_by_digest(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        parser.PdfScraper, "read_tables", staticmethod(lambda f, p: make_tables(p))
+    )
+    pdf_dir = tmp_path / "pdfs"
+    monkeypatch.setattr(crawler, "PDF_DIR", str(pdf_dir))
+    extractions = []
+
+    def extract_rows(self, filename, data):
+        extractions.append(filename)
+        return extract(self, filename, data)
+
+    extract = parser.PdfScraper.extract_rows
+    monkeypatch.setattr(parser.PdfScraper, "extract_rows", extract_rows)
+
+    async def pdf(request: web.Request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(body=PDF_DATA, headers={"ETag": '"v1"'})
+
+    async def scenario():
+        app = web.Application()
+        app.add_routes([web.get("/timetable.pdf", pdf)])
+        runner, url = await start_server(app)
+        context = SimpleNamespace(
+            fetcher=AsyncFetcher(str(tmp_path / "fetch_metadata.json")),
+            pdf_scraper_class=lambda title: parser.PdfScraper(
+                title, cache_dir=str(pdf_dir), workers=2
+            ),
+        )
+        try:
+            first, _ = await crawler.Crawler(context).crawl_pdf(f"{url}/timetable.pdf")
+            context.fetcher.commit_metadata()
+
+            # a 304 gives the digest of the cached rows, the PDF itself isn't needed
+            for filename in os.listdir(pdf_dir):
+                if filename.endswith(".pdf"):
+                    os.remove(pdf_dir / filename)
+            second, _ = await crawler.Crawler(context).crawl_pdf(f"{url}/timetable.pdf")
+        finally:
+            await context.fetcher.close()
+            await runner.cleanup()
+
+        assert len(extractions) == 1
+        assert [lessons(t) for t in second] == [lessons(t) for t in first]
+
+    asyncio.run(scenario())
@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import pytest
+
+import crawler
+import parser
+import pipeline
+from config import SYNC_STATE_FILE, TABLE_FINGERPRINTS_FILE
+from fake_rest import STORAGE
+from journal import UploadJournal
+from rest_client import Schedule_Service_API
+from sync_state import load_sync_state
+from timetable import Timetable
+
+
+def test_interrupted_pipelined_diff_discards_sync_state(
+    fake_rest, leqtori_site, monkeypatch
+):
+    monkeypatch.setattr(parser, "SYNC_MODE", "diff")
+    monkeypatch.setattr(parser, "UPLOAD_PIPELINE", "true")
+    emit = parser.Scraper.emit
+
+    def failing_emit(self, item):
+        emit(self, item)
+        if isinstance(item, Timetable) and item.group == "102B":
+            raise RuntimeError("Parsing failed")
+
+    async def run(url_rest):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    async def scenario():
+        async with leqtori_site() as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            await run(url_rest)
+            assert os.path.exists(TABLE_FINGERPRINTS_FILE)
+
+            # changes of 101A may reach REST before parsing fails
+            site["seed"] = 1
+            with monkeypatch.context() as patch:
+                patch.setattr(parser.Scraper, "emit", failing_emit)
+                with pytest.raises(RuntimeError):
+                    await run(url_rest)
+            assert not os.path.exists(SYNC_STATE_FILE)
+            assert not os.path.exists(TABLE_FINGERPRINTS_FILE)
+
+            storage.reset_stats()
+            await run(url_rest)
+            assert storage.endpoints["POST /timetable/recreate"] == 1
+
+        state_lessons = sum(
+            len(group["lessons"]) for group in load_sync_state()["groups"].values()
+        )
+        assert len(storage.lessons) == state_lessons
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "failing_group, resumed",
+    [
+        # faculty groups are uploaded after parsing, the version is known then
+        ("201A", True),
+        # an upload stopped while parsing has no version, it starts anew
+        ("102B", False),
+    ],
+)
+def test_interrupted_pipelined_upload_is_resumed(
+    fake_rest, leqtori_site, monkeypatch, sorted_lessons, failing_group, resumed
+):
+    monkeypatch.setattr(parser, "UPLOAD_PIPELINE", "true")
+    monkeypatch.setattr(crawler, "CRAWL_ALL_PAGES", "true")
+    add_timetable = pipeline.UploadPipeline.add_timetable
+
+    async def failing_add_timetable(self, timetable):
+        if timetable.group == failing_group:
+            raise RuntimeError("Connection lost")
+        await add_timetable(self, timetable)
+
+    async def run(url_rest, resume=False):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api, resume=resume)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    async def scenario():
+        site_server = leqtori_site(faculty=True)
+        async with site_server as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            with monkeypatch.context() as patch:
+                patch.setattr(
+                    pipeline.UploadPipeline, "add_timetable", failing_add_timetable
+                )
+                with pytest.raises(RuntimeError):
+                    await run(url_rest)
+            with UploadJournal() as journal:
+                version = journal.unfinished_version()
+            assert (version != UploadJournal.UNKNOWN_VERSION) is resumed
+
+            storage.reset_stats()
+            await run(url_rest, resume=True)
+
+            recreated = "POST /timetable/recreate" in storage.endpoints
+            assert recreated is not resumed
+            # records acknowledged before the interruption aren't sent again
+            records = len(storage.pathways) + len(storage.groups) + len(storage.lessons)
+            assert (storage.endpoints["POST /{kind}"] < records) is resumed
+            state_lessons = [
+                lesson
+                for group in load_sync_state()["groups"].values()
+                for lesson in group["lessons"]
+            ]
+            assert {"101A", "201A"} <= set(load_sync_state()["groups"])
+            assert sorted_lessons(storage.lessons.values()) == sorted_lessons(
+                state_lessons
+            )
+
+    asyncio.run(scenario())
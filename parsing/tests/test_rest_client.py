@@ -0,0 +1,307 @@
+import asyncio
+import email.utils
+import time
+
+import pytest
+
+from aiohttp import web
+
+import rest_client
+from conftest import make_lesson
+from fake_rest import STORAGE
+from rest_client import (
+    AdaptiveLimiter,
+    FatalUploadError,
+    RetryableUploadError,
+    Schedule_Service_API,
+    classify_response,
+    parse_retry_after,
+)
+
+PATHWAYS = [{"title": f"Pathway {number}"} for number in range(5)]
+LESSONS = [make_lesson("101A", number).to_dict() for number in range(5)]
+
+
+def assert_stored(storage, ids: list):
+    """`ids` are the ones of LESSONS in REST."""
+    assert {lesson_id: storage.lessons[lesson_id] for lesson_id in ids} == dict(
+        zip(ids, LESSONS)
+    )
+
+
+def bulk_response(response, status=200):
+    """Answers bulk requests with `response` instead of storing the records."""
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        if request.path.endswith("/bulk"):
+            return web.json_response(response, status=status)
+        return await handler(request)
+
+    return middleware
+
+
+def test_bulk_upload_sends_chunks(fake_rest):
+    async def scenario():
+        async with fake_rest() as (app, url):
+            storage = app[STORAGE]
+            async with Schedule_Service_API(
+                url, bulk_upload=True, bulk_chunk_size=2
+            ) as api:
+                ids = await api.send_all("/lessons", LESSONS)
+
+            assert storage.endpoints == {"POST /{kind}/bulk": 3}
+            assert_stored(storage, ids)
+            assert api.failed == []
+
+    asyncio.run(scenario())
+
+
+def test_bulk_upload_reports_rejected_records(fake_rest):
+    records = [*PATHWAYS[:2], {"title": ""}]
+
+    async def scenario():
+        async with fake_rest() as (app, url):
+            async with Schedule_Service_API(url, bulk_upload=True) as api:
+                ids = await api.send_all("/pathways", records)
+
+            assert ids[:2] != [None, None] and ids[2] is None
+            assert [f["index"] for f in api.failed] == [2]
+
+    asyncio.run(scenario())
+
+
+def test_bulk_upload_falls_back_without_endpoint(fake_rest):
+    async def scenario():
+        async with fake_rest(bulk=False) as (app, url):
+            storage = app[STORAGE]
+            async with Schedule_Service_API(
+                url, bulk_upload=True, bulk_chunk_size=2
+            ) as api:
+                ids = await api.send_all("/lessons", LESSONS)
+
+            assert api.bulk_supported == {"/lessons": False}
+            # only the first chunk finds out that there is no bulk endpoint
+            assert storage.endpoints["POST /{kind}"] == len(LESSONS)
+            assert sum(storage.endpoints.values()) == len(LESSONS) + 1
+            assert_stored(storage, ids)
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        ["not", "a", "dict"],
+        {"ids": [1, 2]},
+        {"ids": None, "errors": [{"index": 99, "error": "Unknown"}]},
+    ],
+)
+def test_unexpected_bulk_response_falls_back_to_records(fake_rest, response):
+    async def scenario():
+        async with fake_rest([bulk_response(response)]) as (app, url):
+            storage = app[STORAGE]
+            async with Schedule_Service_API(url, bulk_upload=True) as api:
+                ids = await api.send_all("/lessons", LESSONS)
+
+            assert storage.endpoints["POST /{kind}"] == len(LESSONS)
+            assert_stored(storage, ids)
+            assert api.failed == []
+
+    asyncio.run(scenario())
+
+
+def test_chunk_is_sent_once_without_retries(fake_rest, monkeypatch):
+    monkeypatch.setattr(rest_client, "BULK_RETRIES", 0)
+
+    async def scenario():
+        async with fake_rest() as (app, url):
+            async with Schedule_Service_API(url, bulk_upload=True) as api:
+                ids = await api.send_all("/pathways", PATHWAYS)
+            assert None not in ids
+            assert app[STORAGE].endpoints == {"POST /{kind}/bulk": 1}
+
+        error = bulk_response({"error": "Service is down"}, status=503)
+        async with fake_rest([error]) as (app, url):
+            async with Schedule_Service_API(url, bulk_upload=True) as api:
+                ids = await api.send_all("/pathways", PATHWAYS)
+            assert ids == [None] * len(PATHWAYS)
+            assert app[STORAGE].endpoints == {"POST /{kind}/bulk": 1}
+            assert "status 503" in api.failed[0]["error"]
+
+    asyncio.run(scenario())
+
+
+def test_limiter_grows_additively_up_to_the_ceiling():
+    limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=3)
+
+    # by 1 / limit per successful request, about one per `limit` requests
+    for _ in range(2):
+        limiter.record(time.monotonic())
+    assert limiter.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(10):
+        limiter.record(time.monotonic())
+    assert limiter.limit == 3
+
+
+def test_limiter_decreases_once_per_burst_down_to_the_floor():
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=2, max_limit=20)
+
+    sent_before_errors = [time.monotonic() for _ in range(3)]
+    for start_time in sent_before_errors:
+        limiter.record(start_time, overloaded=True)
+    assert limiter.limit == pytest.approx(7)
+    assert limiter.decreases == 1
+
+    for _ in range(10):
+        limiter.record(time.monotonic(), overloaded=True)
+    assert limiter.limit == 2
+    assert limiter.decreases == 11
+
+
+def test_limiter_decreases_on_latency_growth():
+    limiter = AdaptiveLimiter(initial_limit=10, latency_tolerance=3)
+
+    for _ in range(5):
+        limiter.record(time.monotonic(), latency=0.1)
+    assert limiter.decreases == 0
+
+    # the smoothed latency follows a slow server, it isn't cut by one spike
+    limiter.record(time.monotonic(), latency=1.0)
+    assert limiter.decreases == 0
+    for _ in range(10):
+        limiter.record(time.monotonic(), latency=1.0)
+    assert limiter.decreases > 0
+    assert limiter.limit < 10
+
+
+def test_limiter_blocks_above_the_limit():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial_limit=2, min_limit=1, max_limit=2)
+        entered = []
+
+        async def request(number):
+            async with limiter:
+                entered.append(number)
+                await asyncio.sleep(0.05)
+
+        tasks = [asyncio.create_task(request(number)) for number in range(3)]
+        await asyncio.sleep(0.01)
+        assert entered == [0, 1]
+        await asyncio.gather(*tasks)
+        assert entered == [0, 1, 2]
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "status, error_class",
+    [
+        (408, RetryableUploadError),
+        (429, RetryableUploadError),
+        (500, RetryableUploadError),
+        (503, RetryableUploadError),
+        (400, FatalUploadError),
+        (404, FatalUploadError),
+        (409, FatalUploadError),
+    ],
+)
+def test_classify_response(status, error_class):
+    error = classify_response(status, "POST /lessons", {"error": "Nope"})
+
+    assert type(error) is error_class
+    assert error.status == status
+    assert error.response == {"error": "Nope"}
+
+
+def http_date(seconds: float) -> str:
+    return email.utils.formatdate(time.time() + seconds, usegmt=True)
+
+
+@pytest.mark.parametrize(
+    "value, delay",
+    [("3", 3), ("0", 0), ("-5", 0), (http_date(-60), 0), ("soon", None), (None, None)],
+)
+def test_parse_retry_after(value, delay):
+    assert parse_retry_after(value) == delay
+
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after(http_date(30)) == pytest.approx(30, abs=2)
+
+
+@pytest.mark.parametrize(
+    "status, headers, body, delay",
+    [
+        # the header wins over the body
+        (429, {"Retry-After": "7"}, {"retry_after": 1}, 7),
+        (503, {"Retry-After": http_date(3600)}, None, pytest.approx(3600, abs=300)),
+        (429, {"Retry-After": "soon"}, {"retry_after": 1}, 1),
+        (503, {}, {"retry_after": 2}, 2),
+    ],
+)
+def test_retry_delay_honours_retry_after(status, headers, body, delay):
+    error = classify_response(status, "POST /lessons", body, headers)
+
+    assert Schedule_Service_API.retry_delay(0, error) == delay
+
+
+def test_retry_delay_falls_back_to_backoff():
+    error = classify_response(500, "POST /lessons", None, {"Retry-After": "7"})
+
+    assert 2 <= Schedule_Service_API.retry_delay(2, error) <= 4
+    assert 0.5 <= Schedule_Service_API.retry_delay(0, RetryableUploadError("")) <= 1
+
+
+def test_retry_after_header_is_kept_on_the_error(fake_rest, monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    @web.middleware
+    async def overload(request: web.Request, handler):
+        return web.Response(status=503, text="busy", headers={"Retry-After": "120"})
+
+    async def scenario():
+        async with fake_rest([overload]) as (app, url):
+            async with Schedule_Service_API(url) as api:
+                monkeypatch.setattr(rest_client.asyncio, "sleep", record_sleep)
+                with pytest.raises(RetryableUploadError) as error:
+                    await api.request("GET", "/pathways", retries=2)
+
+        assert error.value.headers["Retry-After"] == "120"
+        # the session sleeps on close too
+        assert delays[:2] == [120, 120]
+
+    asyncio.run(scenario())
+
+
+def test_overloaded_requests_are_retried_and_cut_the_limit(fake_rest):
+    statuses = [429, 503]
+
+    @web.middleware
+    async def overload(request: web.Request, handler):
+        if statuses:
+            return web.json_response({"retry_after": 0}, status=statuses.pop(0))
+        return await handler(request)
+
+    async def scenario():
+        async with fake_rest([overload]) as (app, url):
+            async with Schedule_Service_API(url, max_connections=8) as api:
+                status, _ = await api.request(
+                    "POST", "/pathways", retries=2, data={"title": "Informatics"}
+                )
+                assert status == 200
+                assert api.limiter.decreases == 2
+                assert int(api.limiter.limit) < 8
+
+                with pytest.raises(FatalUploadError) as error:
+                    await api.request("POST", "/pathways", retries=2, data={})
+                assert error.value.status == 400
+            assert app[STORAGE].endpoints["POST /{kind}"] == 4
+
+    asyncio.run(scenario())
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+from aiohttp import web
+
+import crawler
+import parser
+from config import SYNC_STATE_FILE
+from fake_rest import STORAGE
+from rest_client import Schedule_Service_API
+from sync_state import diff_lessons, diff_timetables, load_sync_state
+from timetable import Timetable
+
+
+def test_diff_lessons(make_lesson):
+    kept, moved, removed = (make_lesson("101A", n).to_dict() for n in range(3))
+    previous = [
+        {"id": 1, **kept},
+        {"id": 2, **moved},
+        {"id": 3, **removed},
+    ]
+    # another classroom in the same slot is an update, not a delete and a create
+    moved = {**moved, "classroom": "IV-404"}
+    created = make_lesson("101A", 7).to_dict()
+
+    change = diff_lessons(previous, [kept, moved, created])
+
+    assert change["create"] == [created]
+    assert change["update"] == [(2, moved)]
+    assert change["delete"] == [3]
+    assert change["lessons"] == [{"id": 1, **kept}, {"id": 2, **moved}]
+
+
+def test_diff_lessons_of_unchanged_group(make_lesson):
+    lessons = [make_lesson("101A", n).to_dict() for n in range(3)]
+    previous = [{"id": i, **lesson} for i, lesson in enumerate(lessons)]
+
+    change = diff_lessons(previous, list(reversed(lessons)))
+
+    assert change["create"] == change["update"] == change["delete"] == []
+    assert sorted(lesson["id"] for lesson in change["lessons"]) == [0, 1, 2]
+
+
+def test_diff_timetables_keeps_listed_groups(make_lesson):
+    prev_groups = {
+        group: {"lessons": [{"id": i, **make_lesson(group, 0).to_dict()}]}
+        for i, group in enumerate(("101A", "102A", "103B"))
+    }
+    timetable = Timetable("101A")
+    timetable.add_lesson(make_lesson("101A", 0))
+
+    # 102A is still listed, but its table wasn't parsed, e.g. it's unchanged
+    changes = diff_timetables(prev_groups, [timetable], {"101A": "A", "102A": "A"})
+
+    assert changes == {
+        "103B": {"lessons": None, "create": [], "update": [], "delete": [2]}
+    }
+
+
+def test_diff_upload_sends_only_changes(
+    fake_rest, timetables, make_lesson, sorted_lessons
+):
+    timetables, headers = timetables
+
+    # 101A: one lesson moved to another classroom, one dropped, one added
+    group_101a = Timetable("101A")
+    group_101a.add_lesson(make_lesson("101A", 0, classroom="IV-404"))
+    for number in (2, 3, 4, 7):
+        group_101a.add_lesson(make_lesson("101A", number))
+    changed = [group_101a, timetables[1]]
+    # 103B is gone from the page
+    changed_headers = {"Bachelor": {"Informatics": headers["Bachelor"]["Informatics"]}}
+
+    async def scenario():
+        async with fake_rest() as (app, url):
+            storage = app[STORAGE]
+            async with Schedule_Service_API(url) as api:
+                state = await parser.send_data_to_rest(timetables, headers, api=api)
+                assert load_sync_state() == state
+                storage.reset_stats()
+
+                state = await parser.send_data_to_rest(
+                    changed, changed_headers, state, api=api
+                )
+                assert dict(storage.endpoints) == {
+                    "PUT /lessons/{id}": 1,
+                    "DELETE /lessons/{id}": 6,
+                    "POST /{kind}": 1,
+                }
+                assert load_sync_state() == state
+                assert sorted_lessons(storage.lessons.values()) == sorted_lessons(
+                    lesson.to_dict() for timetable in changed for lesson in timetable
+                )
+
+                # lesson ids of the state are the ones of REST
+                for group in state["groups"].values():
+                    for lesson in group["lessons"]:
+                        stored = storage.lessons[lesson["id"]]
+                        assert stored == {k: v for k, v in lesson.items() if k != "id"}
+
+                storage.reset_stats()
+                await parser.send_data_to_rest(changed, changed_headers, state, api=api)
+                assert storage.requests == 0
+
+    asyncio.run(scenario())
+
+
+def test_diff_groups_are_applied_concurrently(fake_rest, timetables, make_lesson):
+    timetables, headers = timetables
+    for timetable in timetables:
+        timetable.add_lesson(make_lesson(timetable.group, 7))
+    in_flight = []
+    most_groups_in_flight = 0
+
+    @web.middleware
+    async def slow_lessons(request: web.Request, handler):
+        if request.method != "POST" or request.path != "/lessons":
+            return await handler(request)
+        nonlocal most_groups_in_flight
+        group = (await request.json())["group"]
+        in_flight.append(group)
+        most_groups_in_flight = max(most_groups_in_flight, len(set(in_flight)))
+        await asyncio.sleep(0.05)
+        in_flight.remove(group)
+        if group == "102A":
+            return web.json_response({"error": "Rejected"}, status=400)
+        return await handler(request)
+
+    async def scenario():
+        async with fake_rest([slow_lessons]) as (app, url):
+            # all lessons fit into the concurrency limit
+            async with Schedule_Service_API(url, max_connections=32) as api:
+                # the groups are in REST, they have no lessons yet
+                state = await api.send_data_to_rest([], headers)
+                state["groups"] = {
+                    timetable.group: {"pathway": "Informatics", "lessons": []}
+                    for timetable in timetables
+                }
+
+                state = await api.send_data_diff(timetables, headers, state)
+
+            assert most_groups_in_flight == 3
+            # a rejected group doesn't stop the others
+            assert {failure["record"]["group"] for failure in api.failed} == {"102A"}
+            assert len(api.failed) == 6
+            assert api.sent_lessons == 12
+            assert len(app[STORAGE].lessons) == 12
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_tables_are_skipped(fake_rest, leqtori_site, monkeypatch, caplog):
+    monkeypatch.setattr(parser, "SYNC_MODE", "diff")
+    # fingerprints are used even when every run collects the page
+    monkeypatch.setattr(parser, "FORCE_TO_COLLECT", "true")
+
+    async def run(url_rest):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    async def scenario():
+        async with leqtori_site() as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            await run(url_rest)
+            lessons = dict(storage.lessons)
+
+            storage.reset_stats()
+            caplog.clear()
+            with caplog.at_level(logging.INFO):
+                await run(url_rest)
+            assert "No group has changed." in caplog.text
+            assert storage.requests == 0
+
+            # without sync state REST may lack the lessons of unchanged tables
+            os.remove(SYNC_STATE_FILE)
+            caplog.clear()
+            with caplog.at_level(logging.INFO):
+                await run(url_rest)
+            assert "all tables will be parsed" in caplog.text
+            assert storage.endpoints["POST /timetable/recreate"] == 1
+            assert sorted(storage.lessons.values(), key=str) == sorted(
+                lessons.values(), key=str
+            )
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("pipeline", ["true", "false"])
+def test_groups_of_failed_page_are_kept(fake_rest, leqtori_site, monkeypatch, pipeline):
+    monkeypatch.setattr(parser, "SYNC_MODE", "diff")
+    monkeypatch.setattr(parser, "FORCE_TO_COLLECT", "true")
+    monkeypatch.setattr(parser, "UPLOAD_PIPELINE", pipeline)
+    monkeypatch.setattr(crawler, "CRAWL_ALL_PAGES", "true")
+
+    async def run(url_rest):
+        async with Schedule_Service_API(url_rest) as api:
+            context = parser.ParserContext(api)
+            try:
+                await parser.run_once(context)
+            finally:
+                await context.close()
+
+    async def scenario():
+        site_server = leqtori_site(faculty=True)
+        async with site_server as (site, url), fake_rest() as (app, url_rest):
+            monkeypatch.setattr(parser, "URL_LEQTORI", url)
+            storage = app[STORAGE]
+            await run(url_rest)
+            lessons = dict(storage.lessons)
+            groups = set(load_sync_state()["groups"])
+            assert {"201A", "202B"} <= groups
+
+            # a temporary outage of the faculty page doesn't remove its groups
+            site["faculty_down"] = True
+            storage.reset_stats()
+            await run(url_rest)
+            assert storage.requests == 0
+            assert set(load_sync_state()["groups"]) == groups
+
+            # the page is parsed again and matches the kept lessons
+            site["faculty_down"] = False
+            await run(url_rest)
+            assert storage.requests == 0
+            assert storage.lessons == lessons
+
+    asyncio.run(scenario())
@@ -0,0 +1,149 @@
+import logging
+
+import pytest
+
+from parser import TEACHER_SCRAPERS, cross_check_teachers
+from timetable import Timetable
+
+# a table per professor, cells name the group in place of the professor
+TEACHERS_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Teachers</title></head>
+<body>
+<ul>
+<li>Professors
+<ul>
+<li><a href="#1_DETAILED"> J. Smith </a></li>
+<li><a href="#2_DETAILED"> M. Jones </a></li>
+</ul>
+</li>
+</ul>
+<table id="1_DETAILED" border="1">
+<thead><tr><th colspan="7">J. Smith</th></tr></thead>
+<tbody>
+<tr><th>1-09:00</th>
+<td rowspan="2">Mathematics (MAT101) Lecture<br/>101A<br/>I-101</td>
+<td>---</td><td></td><td>---</td><td>---</td><td>---</td></tr>
+<tr><th>2-10:00</th><!-- span -->
+<td>101A.1-2<br/>Physics (PHY110) Practice<br/>101A<br/>II-205</td>
+<td></td><td>---</td><td>---</td><td>---</td></tr>
+</tbody>
+</table>
+<br/>
+<table id="2_DETAILED" border="1">
+<thead><tr><th colspan="7">M. Jones</th></tr></thead>
+<tbody>
+<tr><th>1-09:00</th><td>---</td><td>---</td>
+<td>History (HIS201) Lecture<br/>102B<br/>VI-412</td>
+<td>---</td><td>---</td><td>---</td></tr>
+</tbody>
+</table>
+<br/>
+</body></html>
+"""
+
+
+@pytest.fixture
+def teachers_page(tmp_path):
+    path = tmp_path / "teachers.html"
+    path.write_text(TEACHERS_PAGE, encoding="utf-8")
+    return str(path)
+
+
+def timetable(group: str, *lessons) -> Timetable:
+    timetable = Timetable(group)
+    for lesson in lessons:
+        timetable.add_lesson(lesson)
+    return timetable
+
+
+@pytest.mark.parametrize("engine", ["bs4", "lxml", "lxml-stream"])
+def test_teachers_page_swaps_group_and_professor(teachers_page, make_lesson, engine):
+    scraper = TEACHER_SCRAPERS[engine](workers=1)
+
+    timetables, headers = scraper.get_timetables_from_file(teachers_page)
+
+    assert headers == {
+        None: {"Professors": {"1_DETAILED": "J. Smith", "2_DETAILED": "M. Jones"}}
+    }
+    mathematics = make_lesson(
+        "101A",
+        0,
+        subjectName="Mathematics (MAT101)",
+        subgroup=None,
+        classroom="I-101",
+        hoursSpan=2,
+    )
+    physics = make_lesson(
+        "101A",
+        1,
+        subjectName="Physics (PHY110)",
+        subgroup="1-2",
+        lessonType="Practice",
+        classroom="II-205",
+        startTime="10:00:00",
+    )
+    history = make_lesson(
+        "102B",
+        2,
+        subjectName="History (HIS201)",
+        subgroup=None,
+        professor="M. Jones",
+        classroom="VI-412",
+        startTime="09:00:00",
+    )
+    # timetables are keyed by the professor, lessons look like the groups page
+    assert [t.group for t in timetables] == ["J. Smith", "M. Jones"]
+    assert [lesson.to_dict() for lesson in timetables[0]] == [
+        mathematics.to_dict(),
+        physics.to_dict(),
+    ]
+    assert [lesson.to_dict() for lesson in timetables[1]] == [history.to_dict()]
+
+
+def test_cross_check_teachers(teachers_page, make_lesson, caplog):
+    teachers, _ = TEACHER_SCRAPERS["bs4"](workers=1).get_timetables_from_file(
+        teachers_page
+    )
+    groups = [
+        timetable(
+            "101A",
+            # professor names are compared case and whitespace insensitive
+            make_lesson("101A", 0, professor="j.  SMITH", hoursSpan=2),
+            make_lesson("101A", 1, startTime="10:00:00"),
+            make_lesson("101A", 3, professor="J. Smith"),
+            # professors without a table on the teachers page aren't compared
+            make_lesson("101A", 4, professor="A. Ivanov"),
+        ),
+        # the lesson of M. Jones has moved to 10:00 on the groups page
+        timetable(
+            "102B", make_lesson("102B", 2, professor="M. Jones", startTime="10:00:00")
+        ),
+    ]
+
+    with caplog.at_level(logging.WARNING):
+        report = cross_check_teachers(groups, teachers)
+
+    assert report == {"matched": 3, "only_in_groups": 2, "only_in_teachers": 1}
+    warnings = [record.getMessage() for record in caplog.records]
+    assert "2 lesson hours of the groups page are missing" in warnings[0]
+    assert "1 lesson hours of the teachers page are missing" in warnings[1]
+
+
+def test_cross_check_skips_groups_not_parsed_in_this_run(teachers_page, make_lesson):
+    teachers, _ = TEACHER_SCRAPERS["bs4"](workers=1).get_timetables_from_file(
+        teachers_page
+    )
+    groups = [
+        timetable(
+            "101A",
+            make_lesson("101A", 0, hoursSpan=2),
+            make_lesson("101A", 1, startTime="10:00:00"),
+        )
+    ]
+
+    # 102B of the M. Jones table wasn't parsed, its table is unchanged
+    assert cross_check_teachers(groups, teachers) == {
+        "matched": 3,
+        "only_in_groups": 0,
+        "only_in_teachers": 0,
+    }
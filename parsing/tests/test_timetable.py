@@ -0,0 +1,135 @@
+import multiprocessing
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import timetable as timetable_module
+from timetable import LessonView, StringPool, Timetable
+
+
+def test_to_dict_round_trip(make_lesson):
+    lessons = [
+        make_lesson("101A", 0).to_dict(),
+        make_lesson("101A", 1, subgroup=None, startTime="", hoursSpan=0).to_dict(),
+        make_lesson("101A", 2, professor="ნ. ბერიძე", classroom=None).to_dict(),
+    ]
+
+    timetable = Timetable.from_dict({"101A": lessons})
+
+    assert len(timetable) == 3
+    assert timetable.to_dict() == {"101A": lessons}
+    assert [lesson.to_dict() for lesson in timetable] == lessons
+
+
+def test_lesson_view_reads_and_writes_the_store(make_lesson):
+    timetable = Timetable("101A")
+    timetable.add_lesson(make_lesson("101A", 0))
+    timetable.add_lesson(make_lesson("101A", 1))
+
+    first, second = timetable.lessons
+    first.classroom = "IV-404"
+    first.startTime = "13:30:00"
+    first.hoursSpan = 3
+
+    assert isinstance(first, LessonView)
+    assert (
+        first.to_dict()
+        == make_lesson(
+            "101A", 0, classroom="IV-404", startTime="13:30:00", hoursSpan=3
+        ).to_dict()
+    )
+    assert second.to_dict() == make_lesson("101A", 1).to_dict()
+    with pytest.raises(AttributeError):
+        first.teacher
+    with pytest.raises(AttributeError):
+        first.teacher = "J. Smith"
+    # lessons are added by add_lesson only
+    with pytest.raises(AttributeError):
+        timetable.lessons.append(make_lesson("101A", 2))
+
+
+def test_group_rename_updates_lessons(make_lesson):
+    timetable = Timetable("101A")
+    for number in range(3):
+        timetable.add_lesson(make_lesson("101A", number))
+
+    timetable.group = "101B"
+
+    assert {lesson.group for lesson in timetable} == {"101B"}
+
+
+def test_strings_are_interned(make_lesson):
+    pool = StringPool()
+    assert pool.encode(None) == 0
+    assert pool.encode("J. Smith") == pool.encode("J. Smith") == 1
+    assert pool.decode(1) == "J. Smith"
+    assert len(pool) == 2
+
+    timetable = Timetable("101A")
+    timetable.add_lesson(make_lesson("101A", 0))
+    size = len(timetable.store.pool)
+    for _ in range(100):
+        timetable.add_lesson(make_lesson("101A", 0))
+    # repeated lessons add no strings, only codes
+    assert len(timetable.store.pool) == size
+    assert len(set(timetable.store.professor)) == 1
+
+
+def test_reset_string_pool_keeps_older_timetables(make_lesson, monkeypatch):
+    monkeypatch.setattr(timetable_module, "STRING_POOL", StringPool())
+    old = Timetable("101A")
+    old.add_lesson(make_lesson("101A", 0))
+    expected = old.to_dict()
+
+    # e.g. the next daemon run
+    timetable_module.reset_string_pool()
+    new = Timetable("101A")
+    new.add_lesson(make_lesson("101A", 1, professor="M. Jones"))
+
+    assert new.store.pool is timetable_module.STRING_POOL
+    assert old.store.pool is not new.store.pool
+    assert "M. Jones" not in old.store.pool.strings
+    assert old.to_dict() == expected
+    # stores of different pools are combined by strings, not by codes
+    combined = old + new
+    assert combined.store.pool is new.store.pool
+    assert combined.to_dict()["101A"] == expected["101A"] + new.to_dict()["101A"]
+    old.group = "101B"
+    assert {lesson.group for lesson in old} == {"101B"}
+
+
+def test_pickle_to_another_string_pool(make_lesson, monkeypatch):
+    timetable = Timetable("101A")
+    for number in range(3):
+        timetable.add_lesson(make_lesson("101A", number))
+    expected = timetable.to_dict()
+    data = pickle.dumps(timetable)
+
+    # a new process has its own pool, codes of this one aren't valid there
+    pool = StringPool()
+    pool.encode("Unrelated string")
+    monkeypatch.setattr(timetable_module, "STRING_POOL", pool)
+    loaded = pickle.loads(data)
+
+    assert loaded.to_dict() == expected
+    # only strings used by the timetable are sent
+    used = {value for lesson in expected["101A"] for value in lesson.values()}
+    assert set(pool.strings[2:]) <= used
+
+
+def test_pickle_through_process_pool(make_lesson):
+    timetable = Timetable("101A")
+    for number in range(5):
+        timetable.add_lesson(
+            make_lesson("101A", number, professor=f"Professor {number}")
+        )
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        # the process unpickles it into its own pool and sends it back
+        loaded = executor.submit(pickle.loads, pickle.dumps(timetable)).result()
+
+    assert loaded.to_dict() == timetable.to_dict()
+    assert isinstance(next(iter(loaded)), LessonView)
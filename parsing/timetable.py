@@ -0,0 +1,386 @@
+import threading
+
+from array import array
+from functools import lru_cache
+
+
+class Lesson:
+    __slots__ = [
+        "subjectName",
+        "group",
+        "subgroup",
+        "lessonType",
+        "professor",
+        "classroom",
+        "weekDay",
+        "startTime",
+        "hoursSpan",
+    ]
+
+    def __init__(
+        self,
+        subjectName="",
+        group="",
+        subgroup="",
+        lessonType="",
+        professor="",
+        classroom="",
+        weekDay="",
+        startTime="",
+        hoursSpan=0,
+    ):
+        self.subjectName = subjectName
+        self.group = group
+        self.subgroup = subgroup
+        self.lessonType = lessonType
+        self.professor = professor
+        self.classroom = classroom
+        self.weekDay = weekDay
+        self.startTime = startTime
+        self.hoursSpan = hoursSpan
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        return f"Lesson: {self.to_dict()}"
+
+    def __str__(self):
+        return f"Lesson: {self.to_dict()}"
+
+
+class StringPool:
+    """Dictionary encoding of repeated lesson strings, code 0 is None."""
+
+    __slots__ = ["codes", "strings", "lock"]
+
+    def __init__(self):
+        self.codes = {None: 0}
+        self.strings = [None]
+        # new strings may come from pages parsed in parallel threads
+        self.lock = threading.Lock()
+
+    def encode(self, string) -> int:
+        code = self.codes.get(string)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(string)
+                if code is None:
+                    code = len(self.strings)
+                    self.strings.append(string)
+                    self.codes[string] = code
+        return code
+
+    def decode(self, code: int):
+        return self.strings[code]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+# pool of new timetables, codes are not valid in other processes
+STRING_POOL = StringPool()
+
+
+def reset_string_pool():
+    """
+    Later timetables use a new pool, so strings of older runs don't pile up.
+
+    A store keeps its pool, the old one is freed with the last timetable using it.
+    """
+    global STRING_POOL
+    STRING_POOL = StringPool()
+
+
+NO_START_TIME = 0xFFFF
+
+
+@lru_cache(maxsize=None)
+def time_to_minutes(time: str) -> int:
+    if not time:
+        return NO_START_TIME
+    hours, minutes, _ = time.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@lru_cache(maxsize=None)
+def minutes_to_time(minutes: int) -> str:
+    if minutes == NO_START_TIME:
+        return ""
+    return f"{minutes // 60:02}:{minutes % 60:02}:00"
+
+
+class LessonStore:
+    """
+    Column-oriented storage of lessons.
+
+    String fields are stored as codes of `pool` (STRING_POOL when the store
+    is created), startTime as minutes since midnight.
+    """
+
+    STRING_FIELDS = (
+        "subjectName",
+        "group",
+        "subgroup",
+        "lessonType",
+        "professor",
+        "classroom",
+        "weekDay",
+    )
+    COLUMNS = (*STRING_FIELDS, "startTime", "hoursSpan")
+    __slots__ = [*COLUMNS, "pool"]
+
+    def __init__(self, pool: StringPool = None):
+        self.pool = STRING_POOL if pool is None else pool
+        self.subjectName = array("I")
+        self.group = array("I")
+        self.subgroup = array("I")
+        self.lessonType = array("I")
+        self.professor = array("I")
+        self.classroom = array("I")
+        self.weekDay = array("I")
+        self.startTime = array("H")
+        self.hoursSpan = array("H")
+
+    def __len__(self):
+        return len(self.startTime)
+
+    def append(self, lesson: Lesson):
+        encode = self.pool.encode
+        self.subjectName.append(encode(lesson.subjectName))
+        self.group.append(encode(lesson.group))
+        self.subgroup.append(encode(lesson.subgroup))
+        self.lessonType.append(encode(lesson.lessonType))
+        self.professor.append(encode(lesson.professor))
+        self.classroom.append(encode(lesson.classroom))
+        self.weekDay.append(encode(lesson.weekDay))
+        self.startTime.append(time_to_minutes(lesson.startTime))
+        self.hoursSpan.append(lesson.hoursSpan)
+
+    def extend(self, other: "LessonStore"):
+        for field in self.COLUMNS:
+            column = getattr(other, field)
+            if other.pool is not self.pool and field in self.STRING_FIELDS:
+                strings = other.pool.strings
+                column = [self.pool.encode(strings[code]) for code in column]
+            getattr(self, field).extend(column)
+
+    def take(self, indices: list[int]) -> "LessonStore":
+        store = LessonStore(self.pool)
+        for field in self.COLUMNS:
+            column = getattr(self, field)
+            getattr(store, field).extend([column[index] for index in indices])
+
+        return store
+
+    def get(self, field: str, index: int):
+        value = getattr(self, field)[index]
+        if field == "startTime":
+            return minutes_to_time(value)
+        if field == "hoursSpan":
+            return value
+        return self.pool.strings[value]
+
+    def set(self, field: str, index: int, value):
+        if field == "startTime":
+            value = time_to_minutes(value)
+        elif field != "hoursSpan":
+            value = self.pool.encode(value)
+        getattr(self, field)[index] = value
+
+    def records(self) -> list[dict]:
+        strings = self.pool.strings
+        return [
+            {
+                "subjectName": strings[subjectName],
+                "group": strings[group],
+                "subgroup": strings[subgroup],
+                "lessonType": strings[lessonType],
+                "professor": strings[professor],
+                "classroom": strings[classroom],
+                "weekDay": strings[weekDay],
+                "startTime": minutes_to_time(startTime),
+                "hoursSpan": hoursSpan,
+            }
+            for (
+                subjectName,
+                group,
+                subgroup,
+                lessonType,
+                professor,
+                classroom,
+                weekDay,
+                startTime,
+                hoursSpan,
+            ) in zip(*(getattr(self, field) for field in self.COLUMNS))
+        ]
+
+    def __getstate__(self):
+        # only strings used by this store are sent to the other process
+        local_codes = {}
+        strings = []
+        columns = {"startTime": self.startTime, "hoursSpan": self.hoursSpan}
+
+        for field in self.STRING_FIELDS:
+            column = array("I")
+            for code in getattr(self, field):
+                local_code = local_codes.get(code)
+                if local_code is None:
+                    local_code = local_codes[code] = len(strings)
+                    strings.append(self.pool.strings[code])
+                column.append(local_code)
+            columns[field] = column
+
+        return strings, columns
+
+    def __setstate__(self, state):
+        strings, columns = state
+        self.pool = STRING_POOL
+        codes = [self.pool.encode(string) for string in strings]
+
+        for field in self.STRING_FIELDS:
+            setattr(self, field, array("I", [codes[code] for code in columns[field]]))
+        self.startTime = columns["startTime"]
+        self.hoursSpan = columns["hoursSpan"]
+
+
+class LessonView:
+    """Lesson backed by a row of LessonStore, behaves like Lesson."""
+
+    __slots__ = ["store", "index"]
+
+    def __init__(self, store: LessonStore, index: int):
+        object.__setattr__(self, "store", store)
+        object.__setattr__(self, "index", index)
+
+    def __getattr__(self, field):
+        if field not in Lesson.__slots__:
+            raise AttributeError(field)
+        return self.store.get(field, self.index)
+
+    def __setattr__(self, field, value):
+        if field not in Lesson.__slots__:
+            raise AttributeError(field)
+        self.store.set(field, self.index, value)
+
+    def to_dict(self):
+        return {slot: self.store.get(slot, self.index) for slot in Lesson.__slots__}
+
+    def __repr__(self):
+        return f"Lesson: {self.to_dict()}"
+
+    def __str__(self):
+        return f"Lesson: {self.to_dict()}"
+
+
+class Timetable:
+    __slots__ = ["_group", "store"]
+
+    def __init__(self, group=""):
+        self._group = group
+        self.store = LessonStore()
+
+    def add_lesson(self, lesson: Lesson):
+        self.store.append(lesson)
+
+    @property
+    def lessons(self) -> tuple[LessonView, ...]:
+        """
+        Read-only: lessons are added by `add_lesson`, a lesson is changed
+        through its view.
+        """
+        return tuple(self)
+
+    @property
+    def group(self):
+        return self._group
+
+    @group.setter
+    def group(self, new_group):
+        if self.store:
+            self._update_group(new_group)
+
+        self._group = new_group
+
+    def _update_group(self, new_group):
+        code = self.store.pool.encode(new_group)
+        self.store.group = array("I", [code]) * len(self.store)
+
+    def __repr__(self):
+        return f"Timetable(group={self._group}, lessons={self.lessons})"
+
+    def __str__(self):
+        return f"Timetable(group={self._group}, lessons={self.lessons})"
+
+    def __iter__(self):
+        return (LessonView(self.store, index) for index in range(len(self.store)))
+
+    def __len__(self):
+        return len(self.store)
+
+    def _check_combinable(self, other):
+        if not isinstance(other, Timetable):
+            raise TypeError(
+                f"Unsupported operand type for +: 'Timetable' and {type(other)}"
+            )
+        if self.group != other.group:
+            raise ValueError("Timetables must have the same group to be combined.")
+
+    def __add__(self, other):
+        self._check_combinable(other)
+        combined_timetable = Timetable(group=self.group)
+        combined_timetable.store.extend(self.store)
+        combined_timetable.store.extend(other.store)
+        return combined_timetable
+
+    def __iadd__(self, other):
+        self._check_combinable(other)
+        self.store.extend(other.store)
+        return self
+
+    def to_dict(self):
+        return {self.group: self.store.records()}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, list[dict]]) -> "Timetable":
+        """Inverse of `to_dict`."""
+        ((group, lessons),) = data.items()
+        timetable = cls(group)
+        for lesson in lessons:
+            timetable.add_lesson(Lesson(**lesson))
+
+        return timetable
+
+    def combine_common_lessons(self):
+        store = self.store
+
+        # Group lessons by common fields
+        grouped_lessons = {}
+        keys = zip(
+            store.subjectName,
+            store.group,
+            store.subgroup,
+            store.lessonType,
+            store.weekDay,
+        )
+        for index, key in enumerate(keys):
+            if key not in grouped_lessons:
+                grouped_lessons[key] = []
+            grouped_lessons[key].append(index)
+
+        # Sort and combine lessons
+        start_times = store.startTime
+        hours_spans = store.hoursSpan
+        combined_lessons = []
+        for group in grouped_lessons.values():
+            group.sort(key=start_times.__getitem__)
+            combined_group = [group[0]]
+            for index in group[1:]:
+                last_index = combined_group[-1]
+                if start_times[index] - start_times[last_index] <= 60:
+                    hours_spans[last_index] += hours_spans[index]
+                else:
+                    combined_group.append(index)
+            combined_lessons.extend(combined_group)
+
+        self.store = store.take(combined_lessons)
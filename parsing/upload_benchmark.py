@@ -0,0 +1,85 @@
+"""
+Compares upload throughput of per-record POSTs and bulk uploads against fake_rest.
+
+Usage: python upload_benchmark.py timetable_page.html [--latency 0.005]
+"""
+
+import argparse
+import asyncio
+import logging as log
+import os
+import time
+
+for name, value in {
+    "USER_AGENT": "",
+    "ACCEPT": "",
+    "TAG_STRONG_GROUPS": "",
+    "TAG_STRONG_TEACHERS": "",
+    "TAG_STRONG_INFORMATICS": "",
+    "URL_LEQTORI": "",
+    "URL_REST": "",
+    "MAX_CONNECTIONS": "10",
+    "FORCE_TO_COLLECT": "true",
+    "N_FIRST_TABLES_TO_COLLECT": "-1",
+}.items():
+    os.environ.setdefault(name, value)
+
+from fake_rest import STORAGE, make_app, start_server
+from parser import Scraper
+from rest_client import Schedule_Service_API
+
+MODES = {
+    "per-record": {"bulk_upload": False},
+    "bulk-json": {"bulk_upload": True, "bulk_format": "json"},
+    "bulk-ndjson": {"bulk_upload": True, "bulk_format": "ndjson"},
+    "bulk-fallback": {"bulk_upload": True, "bulk_format": "json"},
+}
+
+
+async def measure(mode: str, timetables, headers, args) -> dict:
+    app = make_app(bulk=mode != "bulk-fallback", latency=args.latency)
+    runner, url = await start_server(app)
+
+    try:
+        options = MODES[mode]
+        async with Schedule_Service_API(
+            url, args.max_connections, bulk_chunk_size=args.chunk_size, **options
+        ) as api:
+            start_time = time.perf_counter()
+            await api.send_data_to_rest(timetables, headers)
+            elapsed = time.perf_counter() - start_time
+    finally:
+        await runner.cleanup()
+
+    storage = app[STORAGE]
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "requests": storage.requests,
+        "lessons": len(storage.lessons),
+        "lessons_per_second": len(storage.lessons) / elapsed,
+    }
+
+
+async def main(args):
+    timetables, headers = Scraper().get_timetables_from_file(args.file)
+
+    for mode in MODES:
+        result = await measure(mode, timetables, headers, args)
+        print(
+            f"{result['mode']:>14}: {result['seconds']:8.3f} s, "
+            f"{result['requests']:6} requests, {result['lessons']:6} lessons, "
+            f"{result['lessons_per_second']:10.1f} lessons/s"
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("file", help="saved timetable page")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    arg_parser.add_argument("--max-connections", type=int, default=10)
+    arg_parser.add_argument("--chunk-size", type=int, default=500)
+    args = arg_parser.parse_args()
+
+    log.basicConfig(level=log.WARNING, format="%(asctime)s: %(levelname)s: %(message)s")
+    asyncio.run(main(args))
@@ -5,6 +5,7 @@ from aiogram import Bot, Dispatcher
 from src.settings.config import BOT_TOKEN, LOG_LEVEL
 from src.middlewares.i18n import fsm_i18n
 from src.handlers import registration_router, base_router, menu_router
+from src.rest import start_client, close_client
 
 
 async def main():
@@ -12,6 +13,8 @@ async def main():
     dp = Dispatcher()
     dp.update.middleware(fsm_i18n)
     dp.include_routers(base_router, menu_router, registration_router)
+    dp.startup.register(start_client)
+    dp.shutdown.register(close_client)
 
     await dp.start_polling(bot)
 
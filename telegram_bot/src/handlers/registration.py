@@ -13,6 +13,7 @@ from ..keyboards.inline import (
     get_registration_keyboard,
 )
 from ..common.fsm import Form
+from ..rest import group_usage
 
 registration_router = Router()
 
@@ -34,6 +35,8 @@ async def handle_registration_process(
 
     if callback_data.id:
         await state.update_data({callback_data.title: callback_data.id})
+    if callback_data.title == "group" and callback_data.id:
+        group_usage.touch(callback_data.id)
 
     text, markup = await get_registration_keyboard(callback_data, state=state)
 
@@ -29,7 +29,7 @@ class LangCallBack(CallbackData, prefix="lang"):
 
 class LessonsCallBack(CallbackData, prefix="les"):
     day: date
-    group: str = ""
+    group: int
 
 
 def get_start_keyboard():
@@ -184,7 +184,7 @@ def get_language_keyboard(add_back_to_start=False):
     return keyboard.as_markup()
 
 
-def get_lesson_keyboard(current_day: date, group: str):
+def get_lesson_keyboard(current_day: date, group: int):
     keyboard = InlineKeyboardBuilder()
     prev = current_day + timedelta(days=-1)
     next = current_day + timedelta(days=1)
@@ -1,20 +1,57 @@
 import aiohttp
 import asyncio
 import logging as log
+from typing import Awaitable, Callable, Hashable
 
-from .settings.config import URL_REST, MAX_CONNECTIONS
+from .settings.config import (
+    URL_REST,
+    REST_POOL_SIZE,
+    REST_TIMEOUT,
+    REST_CONNECT_TIMEOUT,
+    REST_KEEPALIVE,
+    TIMETABLE_CHECK_INTERVAL,
+    CACHE_TTL,
+    WEEK_CACHE_SIZE,
+    WEEK_CACHE_TTL,
+    PREWARM,
+    PREWARM_CONCURRENCY,
+    USAGE_HALF_LIFE,
+    STATS_INTERVAL,
+)
+from .utils.cache import (
+    GroupUsage,
+    ScheduleCache,
+    ScheduleWarmer,
+    TimetableVersion,
+    VersionedCache,
+)
 
 
 class Schedule_Service_API:
-    def __init__(self, url_rest=URL_REST, max_connections=MAX_CONNECTIONS) -> None:
+    def __init__(self, url_rest=URL_REST, pool_size=REST_POOL_SIZE) -> None:
         self.url_rest = url_rest
-        self.session = aiohttp.ClientSession(auth=aiohttp.BasicAuth("admin", "admin"))
-        self.semaphore = asyncio.Semaphore(max_connections)
+        connector = aiohttp.TCPConnector(
+            limit=pool_size,
+            limit_per_host=pool_size,
+            keepalive_timeout=REST_KEEPALIVE,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=REST_TIMEOUT, sock_connect=REST_CONNECT_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth("admin", "admin"),
+            connector=connector,
+            timeout=timeout,
+        )
+        self.semaphore = asyncio.Semaphore(pool_size)
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
         await self.session.close()
 
     async def get_pathways(self):
@@ -108,27 +145,163 @@ class Schedule_Service_API:
                     )
 
 
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight request and its result.
+
+    A cancelled caller doesn't cancel the request for the others. The result is
+    the same object for all callers, it must not be modified.
+    """
+
+    def __init__(self) -> None:
+        self.calls: dict[Hashable, asyncio.Task] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.forget(key, task))
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # all callers may be gone, the error must not be reported as unretrieved
+        if not task.cancelled():
+            task.exception()
+
+
+# one pooled client for all handlers, see start_client and close_client
+api: Schedule_Service_API | None = None
+# identical requests of many users at the same time are sent once
+inflight = SingleFlight()
+# logs stats every STATS_INTERVAL while the client is started
+stats_task: asyncio.Task | None = None
+
+
+async def start_client():
+    """Dispatcher startup hook."""
+    global api, stats_task
+    if api is None:
+        api = Schedule_Service_API()
+        log.info("REST client has been started.")
+        if PREWARM == "true":
+            warmer.start()
+        if STATS_INTERVAL > 0:
+            stats_task = asyncio.create_task(report_stats(STATS_INTERVAL))
+
+
+async def close_client():
+    """Dispatcher shutdown hook."""
+    global api
+    if api is not None:
+        await warmer.stop()
+        await stop_stats()
+        week_cache.cancel_refreshes()
+        log_stats()
+        await api.close()
+        api = None
+        log.info("REST client has been closed.")
+
+
+def log_stats():
+    log.info(
+        f"Week schedule cache: {week_cache.stats()}, "
+        f"pathways and groups cache: {reference_cache.stats()}, "
+        f"shared requests: {inflight.shared}"
+    )
+
+
+async def report_stats(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        log_stats()
+
+
+async def stop_stats():
+    global stats_task
+    if stats_task is not None:
+        stats_task.cancel()
+        try:
+            await stats_task
+        except asyncio.CancelledError:
+            pass
+        stats_task = None
+
+
+async def get_client() -> Schedule_Service_API:
+    # helpers can be called without the dispatcher, e.g. by load tests
+    if api is None:
+        await start_client()
+    return api
+
+
+async def get_timetable_id():
+    client = await get_client()
+    data = await inflight.do("last_update", client.get_last_update)
+    return data["id"] if data is not None else None
+
+
+timetable_version = TimetableVersion(get_timetable_id, TIMETABLE_CHECK_INTERVAL)
+# pathways and groups, they change only with a new timetable
+reference_cache = VersionedCache(timetable_version, CACHE_TTL)
+# stale schedules are answered at once and refreshed in the background
+week_cache = ScheduleCache(timetable_version, WEEK_CACHE_SIZE, WEEK_CACHE_TTL)
+# groups of registered users, most requested are prefetched first
+group_usage = GroupUsage(USAGE_HALF_LIFE)
+
+
+async def fetch_lessons_week(group_id: int):
+    client = await get_client()
+    return await inflight.do(("week", group_id), client.get_lessons_week, group_id)
+
+
+warmer = ScheduleWarmer(
+    timetable_version,
+    week_cache,
+    group_usage,
+    fetch_lessons_week,
+    pending=lambda: len(inflight.calls),
+    concurrency=PREWARM_CONCURRENCY,
+    interval=TIMETABLE_CHECK_INTERVAL,
+)
+
+
 async def get_pathways():
-    async with Schedule_Service_API() as api:
-        return await api.get_pathways()
+    client = await get_client()
+    return await reference_cache.get(
+        "pathways", lambda: inflight.do("pathways", client.get_pathways)
+    )
 
 
 async def get_last_update():
-    async with Schedule_Service_API() as api:
-        data: dict[str, str] = await api.get_last_update()
-        return data["addDate"][:10], data["id"]
+    client = await get_client()
+    data: dict[str, str] = await inflight.do("last_update", client.get_last_update)
+    return data["addDate"][:10], data["id"]
 
 
 async def get_groups(pathway_id: int):
-    async with Schedule_Service_API() as api:
-        return await api.get_groups(pathway_id)
+    client = await get_client()
+    return await reference_cache.get(
+        ("groups", pathway_id),
+        lambda: inflight.do(("groups", pathway_id), client.get_groups, pathway_id),
+    )
 
 
 async def get_lessons_week(group_id: int):
-    async with Schedule_Service_API() as api:
-        return await api.get_lessons_week(group_id)
+    # ids from callback data or FSM storage may be strings, keys must be the same
+    group_id = int(group_id)
+    group_usage.touch(group_id)
+    return await week_cache.get(group_id, lambda: fetch_lessons_week(group_id))
 
 
 async def get_lessons_day(group_id: int):
-    async with Schedule_Service_API() as api:
-        return await api.get_lessons_day(group_id)
+    group_id = int(group_id)
+    group_usage.touch(group_id)
+    client = await get_client()
+    return await inflight.do(("day", group_id), client.get_lessons_day, group_id)
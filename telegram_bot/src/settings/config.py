@@ -12,7 +12,27 @@ BOT_TOKEN = os.environ["BOT_TOKEN"]
 
 # Rest
 URL_REST = os.environ["URL_REST"]
-MAX_CONNECTIONS = int(os.environ.get("MAX_CONNECTIONS", 1))
+# concurrent requests of the one client shared by all users
+REST_POOL_SIZE = int(os.environ.get("REST_POOL_SIZE", 32))
+# seconds, the whole request including reading of the response
+REST_TIMEOUT = float(os.environ.get("REST_TIMEOUT", 10))
+REST_CONNECT_TIMEOUT = float(os.environ.get("REST_CONNECT_TIMEOUT", 3))
+# idle connections of the shared client are kept open this long
+REST_KEEPALIVE = float(os.environ.get("REST_KEEPALIVE", 60))
+# seconds between checks of the timetable id, cached lists are dropped when it changes
+TIMETABLE_CHECK_INTERVAL = float(os.environ.get("TIMETABLE_CHECK_INTERVAL", 60))
+# pathways and groups are refetched at least this often
+CACHE_TTL = float(os.environ.get("CACHE_TTL", 60 * 60))
+# week schedules of this many groups are kept, older than the TTL are refreshed
+WEEK_CACHE_SIZE = int(os.environ.get("WEEK_CACHE_SIZE", 2048))
+WEEK_CACHE_TTL = float(os.environ.get("WEEK_CACHE_TTL", 10 * 60))
+# "true" - prefetch week schedules of used groups after a timetable update
+PREWARM = os.environ.get("PREWARM", "true")
+PREWARM_CONCURRENCY = int(os.environ.get("PREWARM_CONCURRENCY", 2))
+# a request of a group counts half after this many seconds when groups are ordered
+USAGE_HALF_LIFE = float(os.environ.get("USAGE_HALF_LIFE", 6 * 60 * 60))
+# seconds between logs of cache and shared request stats, 0 - only at shutdown
+STATS_INTERVAL = float(os.environ.get("STATS_INTERVAL", 15 * 60))
 
 # logging
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
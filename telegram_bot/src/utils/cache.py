@@ -0,0 +1,310 @@
+import asyncio
+import collections
+import logging as log
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class TimetableVersion:
+    """
+    Id of the current timetable in REST, checked at most once per `check_interval`.
+
+    Concurrent callers share one check, a failed check keeps the last known id.
+    """
+
+    def __init__(
+        self, fetch_version: Callable[[], Awaitable[Any]], check_interval: float
+    ) -> None:
+        self.fetch_version = fetch_version
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = None
+        self.lock = asyncio.Lock()
+
+    def is_fresh(self) -> bool:
+        return (
+            self.checked_at is not None
+            and time.monotonic() - self.checked_at < self.check_interval
+        )
+
+    async def get(self):
+        if self.is_fresh():
+            return self.version
+
+        async with self.lock:
+            if self.is_fresh():
+                return self.version
+            try:
+                version = await self.fetch_version()
+            except Exception as e:
+                version = None
+                log.warning(f"Timetable version has not been checked: {e!r}")
+
+            if version is not None and version != self.version:
+                if self.version is not None:
+                    log.info(f"Timetable version changed: {self.version} -> {version}")
+                self.version = version
+            self.checked_at = time.monotonic()
+
+        return self.version
+
+
+class VersionedCache:
+    """
+    Values which change only with a new timetable: pathways, groups.
+
+    Entries are dropped when the timetable version changes, `ttl` is a safety
+    net for updates which don't change the version. None is never cached.
+    """
+
+    def __init__(self, version: TimetableVersion, ttl: float) -> None:
+        self.version = version
+        self.ttl = ttl
+        # key -> (value, time it was stored)
+        self.entries: dict[Hashable, tuple[Any, float]] = {}
+        self.entries_version = None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        version = await self.version.get()
+        if version != self.entries_version:
+            self.entries.clear()
+            self.entries_version = version
+
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = await fetch()
+        # a newer version could be seen while fetching, then the value may be stale
+        if value is not None and version == self.entries_version:
+            self.entries[key] = (value, time.monotonic())
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+class ScheduleCache:
+    """
+    Schedules per group, at most `maxsize` of them, least recently used are evicted.
+
+    An entry of an older timetable version or older than `ttl` is stale: it's
+    returned at once and refreshed in the background, one refresh per key.
+    """
+
+    def __init__(self, version: TimetableVersion, maxsize: int, ttl: float) -> None:
+        self.version = version
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (value, timetable version, time it was stored)
+        self.entries: collections.OrderedDict[Hashable, tuple[Any, Any, float]] = (
+            collections.OrderedDict()
+        )
+        self.refreshing: dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]):
+        version = await self.version.get()
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            value = await fetch()
+            self.store(key, value, version)
+            return value
+
+        self.entries.move_to_end(key)
+        value = entry[0]
+        if self.is_fresh(key, version):
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            self.refresh(key, fetch, version)
+
+        return value
+
+    def is_fresh(self, key: Hashable, version) -> bool:
+        entry = self.entries.get(key)
+        return (
+            entry is not None
+            and entry[1] == version
+            and time.monotonic() - entry[2] < self.ttl
+        )
+
+    def store(self, key: Hashable, value, version):
+        if value is None:
+            return
+        self.entries[key] = (value, version, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def refresh(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], version):
+        if key in self.refreshing:
+            return
+        task = asyncio.create_task(self.refresh_entry(key, fetch, version))
+        self.refreshing[key] = task
+        task.add_done_callback(lambda _: self.refreshing.pop(key, None))
+
+    async def refresh_entry(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]], version
+    ):
+        try:
+            value = await fetch()
+        except Exception as e:
+            self.refresh_errors += 1
+            return log.warning(f"Cache entry {key!r} has not been refreshed: {e!r}")
+
+        if value is None:
+            self.refresh_errors += 1
+            return
+        self.refreshes += 1
+        self.store(key, value, version)
+
+    def cancel_refreshes(self):
+        for task in self.refreshing.values():
+            task.cancel()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "size": len(self.entries),
+        }
+
+
+class GroupUsage:
+    """Recent request frequency of groups, a request counts half after `half_life`."""
+
+    def __init__(self, half_life: float) -> None:
+        self.half_life = half_life
+        # key -> (score, time it was updated)
+        self.scores: dict[Hashable, tuple[float, float]] = {}
+
+    def decay(self, score: float, elapsed: float) -> float:
+        return score * 0.5 ** (elapsed / self.half_life)
+
+    def touch(self, key: Hashable):
+        now = time.monotonic()
+        score, touched_at = self.scores.get(key, (0.0, now))
+        self.scores[key] = (self.decay(score, now - touched_at) + 1, now)
+
+    def by_frequency(self) -> list[Hashable]:
+        now = time.monotonic()
+        return sorted(
+            self.scores,
+            key=lambda key: self.decay(self.scores[key][0], now - self.scores[key][1]),
+            reverse=True,
+        )
+
+
+class ScheduleWarmer:
+    """
+    Prefetches schedules of used groups into `cache` when the timetable version changes.
+
+    Most requested groups go first. It's a background job: at most `concurrency`
+    requests at a time, and before each of them it waits up to `max_yield`
+    seconds while user requests are in flight (`pending()` counts all of them).
+    """
+
+    IDLE_POLL = 0.05
+
+    def __init__(
+        self,
+        version: TimetableVersion,
+        cache: ScheduleCache,
+        usage: GroupUsage,
+        fetch: Callable[[Hashable], Awaitable[Any]],
+        pending: Callable[[], int],
+        concurrency: int,
+        interval: float,
+        max_yield: float = 1.0,
+    ) -> None:
+        self.version = version
+        self.cache = cache
+        self.usage = usage
+        self.fetch = fetch
+        self.pending = pending
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_yield = max_yield
+        self.warmed_version = None
+        self.active = 0
+        self.warmed = 0
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def run(self):
+        while True:
+            try:
+                version = await self.version.get()
+                if version is not None and version != self.warmed_version:
+                    await self.warm(version)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Schedules have not been prefetched: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    async def wait_idle(self):
+        waited = 0.0
+        while self.pending() > self.active and waited < self.max_yield:
+            await asyncio.sleep(self.IDLE_POLL)
+            waited += self.IDLE_POLL
+
+    async def warm(self, version):
+        keys = iter(self.usage.by_frequency()[: self.cache.maxsize])
+        warmed = self.warmed
+
+        async def worker():
+            for key in keys:
+                await self.wait_idle()
+                if self.version.version != version:
+                    return
+                # users could have fetched it while we were waiting
+                if self.cache.is_fresh(key, version):
+                    continue
+                self.active += 1
+                try:
+                    value = await self.fetch(key)
+                except Exception as e:
+                    log.warning(f"Schedule of {key!r} has not been prefetched: {e!r}")
+                    continue
+                finally:
+                    self.active -= 1
+                self.cache.store(key, value, version)
+                self.warmed += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        if self.version.version == version:
+            self.warmed_version = version
+            log.info(
+                f"{self.warmed - warmed} schedules prefetched for timetable {version}."
+            )
@@ -0,0 +1,61 @@
+import os
+import sys
+
+from types import SimpleNamespace
+
+import pytest
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BOT_DIR)
+
+# the bot reads its settings on import
+for name, value in {
+    "BOT_TOKEN": "bot-tests",
+    "URL_REST": "http://127.0.0.1:9",
+    "PREWARM": "false",
+}.items():
+    os.environ[name] = value
+
+from src.utils import cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Time of the cache module, it moves only by `clock.now += seconds`."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+class FakeVersion:
+    """Stands in for TimetableVersion, the version is set by the test."""
+
+    def __init__(self, version=1) -> None:
+        self.version = version
+
+    async def get(self):
+        return self.version
+
+
+@pytest.fixture
+def version():
+    return FakeVersion()
+
+
+@pytest.fixture
+def fetcher():
+    """`fetcher(key)` is a fetch function of the key, values are numbered by calls."""
+
+    class Fetcher:
+        def __init__(self) -> None:
+            self.calls = []
+
+        def __call__(self, key):
+            async def fetch():
+                self.calls.append(key)
+                return f"{key} #{len(self.calls)}"
+
+            return fetch
+
+    return Fetcher()
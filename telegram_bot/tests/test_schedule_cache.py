@@ -0,0 +1,123 @@
+import asyncio
+
+from src.utils.cache import ScheduleCache
+
+
+async def refreshed(cache: ScheduleCache):
+    await asyncio.gather(*cache.refreshing.values(), return_exceptions=True)
+
+
+def test_least_recently_used_entries_are_evicted(clock, version, fetcher):
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+
+        await cache.get(1, fetcher(1))
+        await cache.get(2, fetcher(2))
+        assert await cache.get(1, fetcher(1)) == "1 #1"
+        await cache.get(3, fetcher(3))
+
+        assert list(cache.entries) == [1, 3]
+        assert await cache.get(2, fetcher(2)) == "2 #4"
+        assert list(cache.entries) == [3, 2]
+        assert cache.stats() == {
+            "hits": 1,
+            "stale_hits": 0,
+            "misses": 4,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "size": 2,
+        }
+
+    asyncio.run(scenario())
+
+
+def test_stale_entry_is_returned_and_refreshed_once(clock, version, fetcher):
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+        await cache.get(1, fetcher(1))
+
+        clock.now += 600
+        # answered at once, one refresh for all callers of the key
+        stale = [await cache.get(1, fetcher(1)) for _ in range(3)]
+        assert stale == ["1 #1"] * 3
+        assert len(cache.refreshing) == 1
+        await refreshed(cache)
+
+        assert await cache.get(1, fetcher(1)) == "1 #2"
+        assert cache.refreshing == {}
+        assert fetcher.calls == [1, 1]
+        stats = cache.stats()
+        assert (stats["hits"], stats["stale_hits"], stats["refreshes"]) == (1, 3, 1)
+
+    asyncio.run(scenario())
+
+
+def test_entries_of_an_older_version_are_stale(clock, version, fetcher):
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+        await cache.get(1, fetcher(1))
+
+        version.version = 2
+        assert await cache.get(1, fetcher(1)) == "1 #1"
+        await refreshed(cache)
+
+        assert cache.is_fresh(1, 2)
+        assert await cache.get(1, fetcher(1)) == "1 #2"
+
+    asyncio.run(scenario())
+
+
+def test_failed_refresh_keeps_the_stale_entry(clock, version, fetcher):
+    async def failing_fetch():
+        raise RuntimeError("REST is down")
+
+    async def empty_fetch():
+        return None
+
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+        await cache.get(1, fetcher(1))
+        clock.now += 600
+
+        for fetch in (failing_fetch, empty_fetch):
+            assert await cache.get(1, fetch) == "1 #1"
+            await refreshed(cache)
+        assert cache.stats()["refresh_errors"] == 2
+
+        # the next request tries again
+        assert await cache.get(1, fetcher(1)) == "1 #1"
+        await refreshed(cache)
+        assert await cache.get(1, fetcher(1)) == "1 #2"
+
+    asyncio.run(scenario())
+
+
+def test_misses_are_not_cached_as_none(clock, version):
+    async def empty_fetch():
+        return None
+
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+
+        assert await cache.get(1, empty_fetch) is None
+        assert cache.entries == {}
+
+    asyncio.run(scenario())
+
+
+def test_refreshes_are_cancelled(clock, version, fetcher):
+    async def scenario():
+        cache = ScheduleCache(version, maxsize=2, ttl=600)
+        await cache.get(1, fetcher(1))
+        clock.now += 600
+
+        await cache.get(1, asyncio.Event().wait)
+        task = cache.refreshing[1]
+        cache.cancel_refreshes()
+        await refreshed(cache)
+
+        assert task.cancelled()
+        assert cache.refreshing == {}
+        assert cache.entries[1][0] == "1 #1"
+
+    asyncio.run(scenario())
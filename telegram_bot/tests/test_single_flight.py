@@ -0,0 +1,116 @@
+import asyncio
+import gc
+
+import pytest
+
+from src.rest import SingleFlight
+
+
+class Request:
+    """A REST read which waits for `release`, its calls are counted."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def __call__(self, group_id, error=None):
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        if error is not None:
+            raise error
+        return {"group": group_id}
+
+
+def test_concurrent_calls_share_one_request():
+    async def scenario():
+        inflight = SingleFlight()
+        request = Request()
+
+        callers = [
+            asyncio.create_task(inflight.do(("week", 1), request, 1)) for _ in range(3)
+        ]
+        other = asyncio.create_task(inflight.do(("week", 2), request, 2))
+        await request.started.wait()
+        request.release.set()
+        results = await asyncio.gather(*callers)
+
+        assert results == [{"group": 1}] * 3
+        assert results[0] is results[1] is results[2]
+        assert await other == {"group": 2}
+        assert (request.calls, inflight.shared) == (2, 2)
+        # finished requests aren't reused
+        assert inflight.calls == {}
+        await inflight.do(("week", 1), request, 1)
+        assert request.calls == 3
+
+    asyncio.run(scenario())
+
+
+def test_error_is_raised_to_all_callers():
+    async def scenario():
+        inflight = SingleFlight()
+        request = Request()
+        error = RuntimeError("REST is down")
+
+        callers = [
+            asyncio.create_task(inflight.do("pathways", request, None, error))
+            for _ in range(3)
+        ]
+        await request.started.wait()
+        request.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        assert results == [error] * 3
+        assert request.calls == 1
+        assert inflight.calls == {}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_the_request():
+    async def scenario():
+        inflight = SingleFlight()
+        request = Request()
+
+        leader = asyncio.create_task(inflight.do(("week", 1), request, 1))
+        await request.started.wait()
+        follower = asyncio.create_task(inflight.do(("week", 1), request, 1))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        request.release.set()
+
+        assert await follower == {"group": 1}
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert request.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_error_without_callers_is_not_reported():
+    errors = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+        inflight = SingleFlight()
+        request = Request()
+
+        caller = asyncio.create_task(
+            inflight.do("pathways", request, None, RuntimeError("REST is down"))
+        )
+        await request.started.wait()
+        # the user has gone, the request still finishes
+        caller.cancel()
+        request.release.set()
+        await asyncio.sleep(0.01)
+
+        assert inflight.calls == {}
+        gc.collect()
+
+    asyncio.run(scenario())
+    assert errors == []
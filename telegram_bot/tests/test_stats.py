@@ -0,0 +1,42 @@
+import asyncio
+import logging
+
+from src import rest
+
+
+def test_stats_are_logged_while_the_client_runs(monkeypatch, caplog):
+    monkeypatch.setattr(rest, "STATS_INTERVAL", 0.01)
+    monkeypatch.setattr(rest.inflight, "shared", 3)
+
+    async def scenario():
+        await rest.start_client()
+        await asyncio.sleep(0.05)
+        reports = caplog.text.count("Week schedule cache")
+        await rest.close_client()
+
+        # the last report is written at shutdown
+        assert reports >= 2
+        assert caplog.text.count("Week schedule cache") == reports + 1
+        assert rest.stats_task is None
+
+    with caplog.at_level(logging.INFO):
+        asyncio.run(scenario())
+
+    report = caplog.records[-2].getMessage()
+    assert "pathways and groups cache: {'hits': 0" in report
+    assert report.endswith("shared requests: 3")
+
+
+def test_stats_only_at_shutdown(monkeypatch, caplog):
+    monkeypatch.setattr(rest, "STATS_INTERVAL", 0)
+
+    async def scenario():
+        await rest.start_client()
+        assert rest.stats_task is None
+        await asyncio.sleep(0.02)
+        await rest.close_client()
+
+    with caplog.at_level(logging.INFO):
+        asyncio.run(scenario())
+
+    assert caplog.text.count("Week schedule cache") == 1
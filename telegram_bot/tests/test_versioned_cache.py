@@ -0,0 +1,105 @@
+import asyncio
+
+from src.utils.cache import TimetableVersion, VersionedCache
+
+
+def test_timetable_version_is_checked_once_per_interval(clock):
+    ids = [1, RuntimeError("REST is down"), None, 2]
+    checks = []
+
+    async def fetch_version():
+        checks.append(clock.now)
+        await asyncio.sleep(0)
+        result = ids.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def scenario():
+        version = TimetableVersion(fetch_version, check_interval=60)
+
+        # concurrent callers share one check
+        assert await asyncio.gather(*(version.get() for _ in range(5))) == [1] * 5
+        clock.now += 59
+        assert await version.get() == 1
+        assert len(checks) == 1
+
+        # failed checks keep the last known id
+        clock.now += 1
+        assert await version.get() == 1
+        clock.now += 60
+        assert await version.get() == 1
+        clock.now += 60
+        assert await version.get() == 2
+        assert len(checks) == 4
+
+    asyncio.run(scenario())
+
+
+def test_entries_are_kept_until_the_version_changes(clock, version, fetcher):
+    async def scenario():
+        cache = VersionedCache(version, ttl=3600)
+
+        assert await cache.get("pathways", fetcher("pathways")) == "pathways #1"
+        assert await cache.get(("groups", 1), fetcher("groups")) == "groups #2"
+        clock.now += 3599
+        assert await cache.get("pathways", fetcher("pathways")) == "pathways #1"
+        assert cache.stats() == {"hits": 1, "misses": 2, "size": 2}
+
+        version.version = 2
+        assert await cache.get("pathways", fetcher("pathways")) == "pathways #3"
+        assert cache.stats() == {"hits": 1, "misses": 3, "size": 1}
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_after_ttl(clock, version, fetcher):
+    async def scenario():
+        cache = VersionedCache(version, ttl=3600)
+
+        await cache.get("pathways", fetcher("pathways"))
+        clock.now += 3600
+        assert await cache.get("pathways", fetcher("pathways")) == "pathways #2"
+        assert fetcher.calls == ["pathways", "pathways"]
+
+    asyncio.run(scenario())
+
+
+def test_none_is_not_cached(clock, version):
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+
+    async def scenario():
+        cache = VersionedCache(version, ttl=3600)
+
+        assert await cache.get("pathways", fetch) is None
+        assert await cache.get("pathways", fetch) is None
+        assert len(calls) == 2 and cache.stats()["size"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_value_of_an_older_version_is_not_stored(clock, version, fetcher):
+    async def scenario():
+        cache = VersionedCache(version, ttl=3600)
+        fetched = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_fetch():
+            fetched.set()
+            await release.wait()
+            return "pathways of version 1"
+
+        slow = asyncio.create_task(cache.get("pathways", slow_fetch))
+        await fetched.wait()
+        # the timetable is updated while the old list is being fetched
+        version.version = 2
+        assert await cache.get("groups", fetcher("groups")) == "groups #1"
+        release.set()
+
+        assert await slow == "pathways of version 1"
+        assert await cache.get("pathways", fetcher("pathways")) == "pathways #2"
+
+    asyncio.run(scenario())
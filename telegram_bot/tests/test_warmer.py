@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+
+from src.utils.cache import GroupUsage, ScheduleCache, ScheduleWarmer
+
+
+def make_warmer(version, usage, fetch, pending=lambda: 0, **kwargs):
+    cache = ScheduleCache(version, maxsize=kwargs.pop("maxsize", 10), ttl=600)
+    warmer = ScheduleWarmer(
+        version,
+        cache,
+        usage,
+        fetch,
+        pending,
+        concurrency=kwargs.pop("concurrency", 1),
+        interval=kwargs.pop("interval", 60),
+        **kwargs,
+    )
+    return warmer, cache
+
+
+def test_usage_decays_by_half_life(clock):
+    usage = GroupUsage(half_life=3600)
+
+    for _ in range(3):
+        usage.touch(1)
+    usage.touch(2)
+    assert usage.by_frequency() == [1, 2]
+
+    # 3 requests two half-lives ago count as 0.75
+    clock.now += 2 * 3600
+    usage.touch(2)
+    assert usage.scores[2][0] == pytest.approx(1.25)
+    assert usage.by_frequency() == [2, 1]
+
+
+def test_most_used_groups_are_warmed_first(clock, version):
+    usage = GroupUsage(half_life=3600)
+    for group_id, requests in {1: 1, 2: 3, 3: 2, 4: 4}.items():
+        for _ in range(requests):
+            usage.touch(group_id)
+    fetched = []
+
+    async def fetch(group_id):
+        fetched.append(group_id)
+        return f"week of {group_id}"
+
+    async def scenario():
+        # only as many groups as the cache keeps
+        warmer, cache = make_warmer(version, usage, fetch, maxsize=3)
+        # a user has fetched it already
+        cache.store(2, "week of 2", version.version)
+
+        await warmer.warm(version.version)
+
+        assert fetched == [4, 3]
+        assert list(cache.entries) == [2, 4, 3]
+        assert all(cache.is_fresh(group_id, 1) for group_id in cache.entries)
+        assert (warmer.warmed, warmer.warmed_version) == (2, 1)
+
+    asyncio.run(scenario())
+
+
+def test_failed_fetch_does_not_stop_warming(clock, version):
+    usage = GroupUsage(half_life=3600)
+    usage.touch(1)
+    usage.touch(2)
+
+    async def fetch(group_id):
+        if group_id == 1:
+            raise RuntimeError("REST is down")
+        return f"week of {group_id}"
+
+    async def scenario():
+        warmer, cache = make_warmer(version, usage, fetch, concurrency=2)
+
+        await warmer.warm(version.version)
+
+        assert list(cache.entries) == [2]
+        assert (warmer.warmed, warmer.warmed_version, warmer.active) == (1, 1, 0)
+
+    asyncio.run(scenario())
+
+
+def test_warming_stops_on_a_newer_version(clock, version):
+    usage = GroupUsage(half_life=3600)
+    for group_id in range(3):
+        usage.touch(group_id)
+
+    async def fetch(group_id):
+        # the timetable is updated again during the warming
+        version.version = 2
+        return f"week of {group_id}"
+
+    async def scenario():
+        warmer, cache = make_warmer(version, usage, fetch)
+
+        await warmer.warm(1)
+
+        assert warmer.warmed == 1
+        assert warmer.warmed_version is None
+
+    asyncio.run(scenario())
+
+
+def test_warmer_yields_to_user_requests(clock, version):
+    usage = GroupUsage(half_life=3600)
+    usage.touch(1)
+    usage.touch(2)
+    users = {"pending": 1}
+    fetched = []
+
+    async def fetch(group_id):
+        fetched.append((group_id, users["pending"]))
+        return f"week of {group_id}"
+
+    async def scenario():
+        warmer, cache = make_warmer(
+            version, usage, fetch, pending=lambda: users["pending"], max_yield=1.0
+        )
+        task = asyncio.create_task(warmer.warm(version.version))
+
+        await asyncio.sleep(0.2)
+        assert fetched == []
+        users["pending"] = 0
+        await task
+
+        assert fetched == [(1, 0), (2, 0)]
+
+    asyncio.run(scenario())
+
+
+def test_warmer_waits_for_users_at_most_max_yield(clock, version):
+    usage = GroupUsage(half_life=3600)
+    usage.touch(1)
+    fetched = []
+
+    async def fetch(group_id):
+        fetched.append(group_id)
+
+    async def scenario():
+        warmer, cache = make_warmer(
+            version, usage, fetch, pending=lambda: 5, max_yield=0.1
+        )
+
+        await asyncio.wait_for(warmer.warm(version.version), timeout=1)
+        assert fetched == [1]
+
+    asyncio.run(scenario())
+
+
+def test_warmer_runs_on_every_new_version(clock, version):
+    usage = GroupUsage(half_life=3600)
+    usage.touch(1)
+    fetched = []
+
+    async def fetch(group_id):
+        fetched.append((group_id, version.version))
+        return f"week of {group_id}"
+
+    async def scenario():
+        warmer, cache = make_warmer(version, usage, fetch, interval=0.01)
+        warmer.start()
+        await asyncio.sleep(0.05)
+        assert fetched == [(1, 1)]
+
+        version.version = 2
+        await asyncio.sleep(0.05)
+        await warmer.stop()
+
+        assert fetched == [(1, 1), (1, 2)]
+        assert warmer.task is None
+
+    asyncio.run(scenario())